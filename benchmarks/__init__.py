@@ -0,0 +1,6 @@
+"""Benchmarks for the User Preferences service.
+
+Run a benchmark as a module from the repository root, e.g.::
+
+    python -m benchmarks.bench_upserts --users 2000
+"""
@@ -0,0 +1,71 @@
+"""Benchmark the notification audience stream on a seeded dataset.
+
+Compares streaming through a server-side cursor with loading the whole
+result at once, reporting throughput and peak Python memory for each
+channel.
+
+    python -m benchmarks.bench_audience --users 200000
+"""
+import asyncio
+import tracemalloc
+
+from .support import base_parser, print_table, seed_users, setup_database, timed
+
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.notification_types import notification_registry  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+
+
+async def stream_audience(service: SettingsService, channel: str, batch_size: int) -> int:
+    count = 0
+    async for user_ids in service.iter_notification_audience(channel, batch_size):
+        count += len(user_ids)
+    return count
+
+
+async def load_audience(service: SettingsService, channel: str, batch_size: int) -> int:
+    """Same query, but every user_id is materialized before returning."""
+    user_ids = []
+    async for chunk in service.iter_notification_audience(channel, batch_size):
+        user_ids.extend(chunk)
+    return len(user_ids)
+
+
+async def run(url: str, users: int, batch_size: int) -> None:
+    engine, session_factory = await setup_database(url)
+    with timed() as timing:
+        await seed_users(session_factory, users)
+    print(f"seeded {users} users in {timing['elapsed']:.1f}s")
+
+    rows = []
+    for channel in notification_registry.by_key:
+        for name, consume in (("stream", stream_audience), ("load all", load_audience)):
+            async with session_factory() as session:
+                service = SettingsService(session, cache=TTLCache(max_size=0, ttl_seconds=0))
+                tracemalloc.start()
+                with timed() as timing:
+                    count = await consume(service, channel, batch_size)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            rows.append([
+                channel,
+                name,
+                count,
+                f"{count / timing['elapsed']:.0f}",
+                f"{peak / 1024 / 1024:.1f}",
+            ])
+
+    await engine.dispose()
+    print_table(["channel", "mode", "user_ids", "ids/s", "peak MiB"], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark the bulk importer against per-row service writes.
+
+Generates export-format NDJSON records (a small share of them invalid),
+imports them through the staging-table path, and compares rows/s with
+writing the same records one by one through SettingsService.
+
+    python -m benchmarks.bench_import --rows 200000
+"""
+import asyncio
+import json
+import random
+
+from .support import base_parser, print_table, setup_database, timed
+
+from src.schemas import (  # noqa: E402
+    NotificationPreferencesUpdate,
+    ThemeSettingsUpdate,
+    UserSettingsUpdate,
+)
+from src.services.bulk_import import ImportReport, import_preferences  # noqa: E402
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+
+
+def generate_records(rows: int, invalid_ratio: float, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        record = {
+            "user_id": f"user-{i:08d}",
+            "language": rng.choice(["en", "fr", "de"]),
+            "timezone": rng.choice(["UTC", "Europe/Paris"]),
+            "locale": "en-US",
+            "email": rng.random() < 0.3,
+            "push": rng.random() < 0.8,
+            "assignments": rng.random() < 0.2,
+            "skillUpdates": rng.random() < 0.9,
+            "mode": rng.choice(["light", "dark", "system"]),
+            "accent_color": "#3b82f6",
+        }
+        if rng.random() < invalid_ratio:
+            record["mode"] = "neon"
+        records.append(record)
+    return records
+
+
+async def lines_of(records: list[dict]):
+    for record in records:
+        yield json.dumps(record)
+
+
+async def write_per_row(session_factory, records: list[dict]) -> None:
+    """What a client replaying PUT requests would cost."""
+    for record in records:
+        async with session_factory() as session:
+            service = SettingsService(session, cache=TTLCache(max_size=0, ttl_seconds=0))
+            user_id = record["user_id"]
+            await service.update_user_settings(user_id, UserSettingsUpdate(**record))
+            await service.update_notification_settings(
+                user_id,
+                NotificationPreferencesUpdate(
+                    preferences={
+                        key: record[key]
+                        for key in ("email", "push", "assignments", "skillUpdates")
+                    }
+                ),
+            )
+            await service.update_theme_settings(user_id, ThemeSettingsUpdate(**record))
+            await session.commit()
+
+
+async def run(url: str, rows: int, per_row_rows: int, batch_size: int, invalid_ratio: float) -> None:
+    records = generate_records(rows, invalid_ratio)
+    results = []
+
+    engine, _ = await setup_database(url)
+    report = ImportReport()
+    await import_preferences(lines_of(records), "ndjson", batch_size, report, bind=engine)
+    await engine.dispose()
+    results.append([
+        "bulk import",
+        report.rows,
+        report.rejected,
+        f"{report.rows_per_second:.0f}",
+    ])
+
+    engine, session_factory = await setup_database(url)
+    valid = [record for record in records[:per_row_rows] if record["mode"] != "neon"]
+    with timed() as timing:
+        await write_per_row(session_factory, valid)
+    await engine.dispose()
+    results.append(["per-row PUTs", len(valid), 0, f"{len(valid) / timing['elapsed']:.0f}"])
+
+    print_table(["strategy", "rows", "rejected", "rows/s"], results)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-row-rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--invalid-ratio", type=float, default=0.01)
+    args = parser.parse_args()
+    asyncio.run(
+        run(args.database_url, args.rows, args.per_row_rows, args.batch_size, args.invalid_ratio)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Measure the per-request overhead of the Prometheus instrumentation.
+
+Each hook is timed bare and instrumented in isolation:
+
+- the metrics middleware around a trivial ASGI app,
+- a session that checks out a connection and runs one primary key
+  lookup, which pays the checkout-wait and statement hooks. This runs on
+  the synchronous SQLite driver, where the hooks' cost is not lost in
+  the noise of aiosqlite's thread hand-off.
+
+A cache-miss request is one middleware pass plus one such session, so
+their summed overhead is compared to ``--budget-us``. The exit status
+is 1 when it is over budget.
+
+    python -m benchmarks.bench_instrumentation --rounds 20
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from .support import print_table
+
+# Only after .support, which points DATABASE_URL at SQLite before
+# src.database creates its module-level engine
+from src.database import Base  # noqa: E402
+from src.instrumentation import (  # noqa: E402
+    MetricsMiddleware,
+    _operation,
+    _after_cursor_execute,
+    _before_cursor_execute,
+    _transaction_began,
+    _transaction_created,
+)
+from src.models import UserSettings  # noqa: E402
+
+
+class _Route:
+    path = "/api/v1/user-preferences"
+
+
+async def _asgi_app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def per_call_us(iterations: int, fn) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(iterations: int, rounds: int, budget_us: float) -> bool:
+    # The hooks are synchronous callbacks; with aiosqlite the thread hop
+    # per statement is ~1ms of scheduler noise, far more than the hooks
+    # cost, so the database side runs on the sync driver.
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(UserSettings(user_id="user-1"))
+        session.commit()
+
+    operation = _operation.set("get_section")
+
+    async def lookup():
+        with Session(engine) as session:
+            session.execute(select(UserSettings).where(UserSettings.user_id == "user-1"))
+
+    scope = {"type": "http", "method": "GET", "path": "/"}
+    middleware = MetricsMiddleware(_asgi_app)
+    hooks = [
+        (engine, "before_cursor_execute", _before_cursor_execute),
+        (engine, "after_cursor_execute", _after_cursor_execute),
+        (Session, "after_transaction_create", _transaction_created),
+        (Session, "after_begin", _transaction_began),
+    ]
+
+    def toggle_hooks(on: bool) -> None:
+        for target, name, fn in hooks:
+            if on and not event.contains(target, name, fn):
+                event.listen(target, name, fn)
+            elif not on and event.contains(target, name, fn):
+                event.remove(target, name, fn)
+
+    async def measure():
+        # Alternate bare and instrumented rounds and keep the best of each,
+        # so drift and scheduler noise do not land on one side only
+        bare = {"request": float("inf"), "query": float("inf")}
+        instrumented = dict(bare)
+        for _ in range(rounds):
+            toggle_hooks(False)
+            bare["request"] = min(
+                bare["request"],
+                await per_call_us(iterations, lambda: _asgi_app(scope, _receive, _send)),
+            )
+            bare["query"] = min(bare["query"], await per_call_us(iterations, lookup))
+            toggle_hooks(True)
+            instrumented["request"] = min(
+                instrumented["request"],
+                await per_call_us(iterations, lambda: middleware(scope, _receive, _send)),
+            )
+            instrumented["query"] = min(
+                instrumented["query"], await per_call_us(iterations, lookup)
+            )
+        return bare, instrumented
+
+    bare, instrumented = asyncio.run(measure())
+    _operation.reset(operation)
+    engine.dispose()
+
+    rows = []
+    overhead = 0.0
+    for key, label in (("request", "middleware"), ("query", "session + query")):
+        extra = instrumented[key] - bare[key]
+        overhead += extra
+        rows.append([label, f"{bare[key]:.1f}", f"{instrumented[key]:.1f}", f"{extra:.1f}"])
+    print_table(["hook", "bare µs", "instrumented µs", "overhead µs"], rows)
+
+    within = overhead <= budget_us
+    print(
+        f"\nper-request overhead: {overhead:.1f}µs "
+        f"({'within' if within else 'OVER'} the {budget_us:.0f}µs budget)"
+    )
+    return within
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--budget-us", type=float, default=50.0)
+    args = parser.parse_args()
+    within = run(args.iterations, args.rounds, args.budget_us)
+    sys.exit(0 if within else 1)
+
+
+if __name__ == "__main__":
+    main()
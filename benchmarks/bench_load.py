@@ -0,0 +1,271 @@
+"""Load-test the HTTP API with a mixed read/write workload.
+
+Seeds ``--users`` users into a fresh schema, boots ``src.main:app`` under
+uvicorn in a subprocess and drives it with ``--concurrency`` httpx
+clients until ``--requests`` requests have completed. Endpoints and users
+are drawn from a seeded RNG, so runs are repeatable. The database is
+reset first, so point ``--database-url`` only at a scratch database.
+
+Reports RPS and p50/p95/p99 latency per endpoint and, with ``--output``,
+writes them as JSON together with the commit and settings used. Pass an
+earlier result as ``--baseline`` to print the change against it.
+
+    python -m benchmarks.bench_load --users 10000 --concurrency 32 --output load.json
+    python -m benchmarks.bench_load --baseline load.json
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .support import base_parser, print_table, seed_users, setup_database
+
+import httpx  # noqa: E402
+
+PREFIX = "/api/v1/user-preferences"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Workload entry -> (method, path, weight in the default mix)
+ENDPOINTS = {
+    "GET settings": ("GET", "", 30),
+    "GET notifications": ("GET", "/notifications", 20),
+    "GET theme": ("GET", "/theme", 20),
+    "GET all": ("GET", "/all", 15),
+    "PUT settings": ("PUT", "", 5),
+    "PUT notifications": ("PUT", "/notifications", 5),
+    "PUT theme": ("PUT", "/theme", 5),
+}
+
+
+def request_body(endpoint: str, rng: random.Random) -> dict | None:
+    if endpoint == "PUT settings":
+        return {"language": rng.choice(["en", "fr", "de", "vi"])}
+    if endpoint == "PUT notifications":
+        return {"preferences": {rng.choice(["email", "push", "assignments"]): rng.random() < 0.5}}
+    if endpoint == "PUT theme":
+        return {"mode": rng.choice(["light", "dark", "system"])}
+    return None
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / elapsed, 1),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not become healthy")
+        await asyncio.sleep(0.1)
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    users: int,
+    requests: int,
+    concurrency: int,
+    weights: dict[str, int],
+    seed: int,
+) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    """Run the workload and return latencies and errors per endpoint."""
+    latencies = {endpoint: [] for endpoint in weights}
+    errors = {endpoint: 0 for endpoint in weights}
+    names, cumulative = list(weights), []
+    total = 0
+    for weight in weights.values():
+        total += weight
+        cumulative.append(total)
+    remaining = requests
+
+    async def worker(number: int) -> None:
+        nonlocal remaining
+        rng = random.Random(seed * 1000 + number)
+        while remaining > 0:
+            remaining -= 1
+            endpoint = rng.choices(names, cum_weights=cumulative)[0]
+            method, path, _ = ENDPOINTS[endpoint]
+            headers = {"X-User-ID": f"user-{rng.randrange(users):08d}"}
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, PREFIX + path, headers=headers, json=request_body(endpoint, rng)
+                )
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies[endpoint].append(time.perf_counter() - start)
+            errors[endpoint] += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args) -> dict:
+    weights = {
+        endpoint: weight
+        for endpoint, (_, _, weight) in ENDPOINTS.items()
+        if not args.read_only or endpoint.startswith("GET")
+    }
+
+    engine, session_factory = await setup_database(args.database_url)
+    await seed_users(session_factory, args.users, seed=args.seed)
+    await engine.dispose()
+
+    port = free_port()
+    # The schema was just created from the models, without Alembic
+    env = {
+        **os.environ,
+        "DATABASE_URL": args.database_url,
+        "DATABASE_SCHEMA_STARTUP": "skip",
+    }
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "src.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log",
+        ],
+        cwd=REPO_ROOT,
+        env=env,
+        stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    try:
+        limits = httpx.Limits(
+            max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+        )
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30.0
+        ) as client:
+            await wait_until_healthy(client)
+            if args.warmup:
+                await drive(
+                    client, args.users, args.warmup, args.concurrency, weights, args.seed + 1
+                )
+            latencies, errors, elapsed = await drive(
+                client, args.users, args.requests, args.concurrency, weights, args.seed
+            )
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": args.database_url.split(":", 1)[0],
+            "users": args.users,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "elapsed_s": round(elapsed, 3),
+        },
+        "endpoints": {
+            endpoint: summarize(latencies[endpoint], errors[endpoint], elapsed)
+            for endpoint in weights
+        },
+        "overall": summarize(
+            [value for values in latencies.values() for value in values],
+            sum(errors.values()),
+            elapsed,
+        ),
+    }
+
+
+def print_results(results: dict, baseline: dict | None) -> None:
+    metrics = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"]
+    rows = []
+    for name, summary in [*results["endpoints"].items(), ("overall", results["overall"])]:
+        row = [name]
+        for metric in metrics:
+            value = summary[metric]
+            previous = None
+            if baseline:
+                previous = (
+                    baseline["overall"] if name == "overall" else baseline["endpoints"].get(name)
+                )
+            if previous and metric not in ("requests", "errors") and previous[metric]:
+                change = (value - previous[metric]) / previous[metric] * 100
+                row.append(f"{value} ({change:+.0f}%)")
+            else:
+                row.append(value)
+        rows.append(row)
+    print_table(["endpoint", *metrics], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.set_defaults(
+        database_url=f"sqlite+aiosqlite:///{tempfile.gettempdir()}/preferences-load.db"
+    )
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=1000, help="Unmeasured requests first")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--read-only", action="store_true", help="Only GET endpoints")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+
+
+if __name__ == "__main__":
+    main()
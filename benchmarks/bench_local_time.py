@@ -0,0 +1,83 @@
+"""Benchmark finding the users at a local hour on a seeded dataset.
+
+Compares the timezone-bucketed stream behind ``/local-hours``, which
+matches users on the zones at the right UTC offset through the timezone
+index, with scanning every user's settings and converting each timezone.
+Reports the time for each local hour of the day at the same instant.
+
+    python -m benchmarks.bench_local_time --users 200000
+"""
+import asyncio
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
+
+from .support import base_parser, print_table, seed_users, setup_database, timed
+
+from src.models import UserSettings  # noqa: E402
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+
+
+async def bucketed(service: SettingsService, hour: int, now: datetime, batch_size: int) -> int:
+    count = 0
+    async for user_ids in service.iter_users_at_local_hours({hour}, batch_size, now):
+        count += len(user_ids)
+    return count
+
+
+async def scan(service: SettingsService, hour: int, now: datetime, batch_size: int) -> int:
+    """Every settings row, with the user's local time computed in Python."""
+    count = 0
+    result = await service.db.stream(
+        select(UserSettings.user_id, UserSettings.timezone),
+        execution_options={"yield_per": batch_size},
+    )
+    async for rows in result.partitions():
+        count += sum(now.astimezone(ZoneInfo(zone)).hour == hour for _, zone in rows)
+    return count
+
+
+async def run(url: str, users: int, batch_size: int) -> None:
+    engine, session_factory = await setup_database(url)
+    with timed() as timing:
+        await seed_users(session_factory, users, coverage=1.0)
+    print(f"seeded {users} users in {timing['elapsed']:.1f}s")
+
+    now = datetime.now(timezone.utc)
+    totals = {"bucketed": 0.0, "scan + convert": 0.0}
+    rows = []
+    for hour in range(24):
+        counts = {}
+        for name, find in (("bucketed", bucketed), ("scan + convert", scan)):
+            async with session_factory() as session:
+                service = SettingsService(session, cache=TTLCache(max_size=0, ttl_seconds=0))
+                with timed() as timing:
+                    counts[name] = await find(service, hour, now, batch_size)
+            totals[name] += timing["elapsed"]
+        assert counts["bucketed"] == counts["scan + convert"], f"hour {hour} disagrees"
+        rows.append([hour, counts["bucketed"]])
+
+    await engine.dispose()
+    print_table(["local hour", "user_ids"], [row for row in rows if row[1]])
+    print()
+    print_table(
+        ["mode", "ms per hour", "total ms"],
+        [
+            [name, f"{elapsed / 24 * 1000:.1f}", f"{elapsed * 1000:.0f}"]
+            for name, elapsed in totals.items()
+        ],
+    )
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
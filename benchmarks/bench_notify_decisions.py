@@ -0,0 +1,99 @@
+"""Benchmark bulk should-notify decisions on a seeded dataset.
+
+Decides the same random (user, notification type) pairs three ways: one
+``NotificationSettingsResponse`` per distinct user, as the dispatcher
+does today; the chunked ``/batch`` stream with a Python lookup per pair;
+and the vectorized ``should_notify`` plus bitmap encoding behind
+``/should-notify``. Reports wall time and pairs decided per second.
+
+    python -m benchmarks.bench_notify_decisions --users 100000 --pairs 200000
+"""
+import asyncio
+import random
+
+import numpy as np
+
+from .support import base_parser, print_table, seed_users, setup_database, timed
+
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.encoding import encode_decisions  # noqa: E402
+from src.services.notification_types import notification_registry  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+
+
+async def per_user(service: SettingsService, user_ids: list[str], keys: list[str]) -> np.ndarray:
+    preferences = {}
+    for user_id in dict.fromkeys(user_ids):
+        preferences[user_id] = (await service.get_notification_settings(user_id)).preferences
+    return np.array([preferences[user_id][key] for user_id, key in zip(user_ids, keys)])
+
+
+async def batch_lookup(
+    service: SettingsService, user_ids: list[str], keys: list[str], chunk_size: int
+) -> np.ndarray:
+    preferences = {}
+    async for chunk in service.iter_preferences_batch(
+        user_ids, ["notifications"], chunk_size=chunk_size
+    ):
+        for item in chunk:
+            preferences[item["user_id"]] = item["notifications"]
+    return np.array([preferences[user_id][key] for user_id, key in zip(user_ids, keys)])
+
+
+async def vectorized(
+    service: SettingsService, user_ids: list[str], keys: list[str], chunk_size: int
+) -> np.ndarray:
+    allowed = await service.should_notify(user_ids, keys, chunk_size=chunk_size)
+    encode_decisions(allowed, user_ids, keys, "bitmap")
+    return allowed
+
+
+async def run(url: str, users: int, pairs: int, chunk_size: int) -> None:
+    engine, session_factory = await setup_database(url)
+    with timed() as timing:
+        await seed_users(session_factory, users)
+    print(f"seeded {users} users in {timing['elapsed']:.1f}s")
+
+    # A tenth of the requested users have never been seeded, so they rely
+    # on the defaults
+    rng = random.Random(7)
+    user_ids = [f"user-{rng.randrange(int(users * 1.1)):08d}" for _ in range(pairs)]
+    keys = [rng.choice(list(notification_registry.by_key)) for _ in range(pairs)]
+
+    rows = []
+    expected = None
+    for name, decide in (
+        ("per user", lambda service: per_user(service, user_ids, keys)),
+        ("batch + lookup", lambda service: batch_lookup(service, user_ids, keys, chunk_size)),
+        ("vectorized", lambda service: vectorized(service, user_ids, keys, chunk_size)),
+    ):
+        async with session_factory() as session:
+            service = SettingsService(session, cache=TTLCache(max_size=0, ttl_seconds=0))
+            with timed() as timing:
+                allowed = await decide(service)
+        if expected is None:
+            expected = allowed
+        assert np.array_equal(allowed, expected), f"{name} disagrees with per user"
+        rows.append([
+            name,
+            pairs,
+            int(np.count_nonzero(allowed)),
+            f"{timing['elapsed'] * 1000:.0f}",
+            f"{pairs / timing['elapsed']:.0f}",
+        ])
+
+    await engine.dispose()
+    print_table(["mode", "pairs", "allowed", "ms", "pairs/s"], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--pairs", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users, args.pairs, args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
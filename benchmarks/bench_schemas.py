@@ -0,0 +1,130 @@
+"""Validation and dump cost of the settings schemas.
+
+Covers every schema in ``src.schemas.settings`` with the inputs the
+service actually feeds it: request bodies as parsed JSON, ORM instances
+and RETURNING rows loaded from an in-memory database (``from_attributes``),
+and ``ThemeSettingsResponse`` populated by alias and by field name and
+dumped both ways. Reports time per call with the peak memory each call
+allocates, as ``bench_service`` does.
+
+    python -m benchmarks.bench_schemas --iterations 50000
+"""
+import asyncio
+
+from .support import base_parser, print_table, profile_calls, seed_users, setup_database
+
+from sqlalchemy import select  # noqa: E402
+
+from src.models import ThemeSettings, UserSettings  # noqa: E402
+from src.schemas import (  # noqa: E402
+    AllPreferencesResponse,
+    BatchPreferencesRequest,
+    NotificationItem,
+    NotificationPreferencesUpdate,
+    NotificationSettingsResponse,
+    ThemeSettingsResponse,
+    ThemeSettingsUpdate,
+    UserSettingsResponse,
+    UserSettingsUpdate,
+)
+from src.services.notification_types import notification_registry  # noqa: E402
+
+ITEM = {"key": "email", "label": "Email Notifications", "description": "Receive email"}
+NOTIFICATIONS = {
+    "items": [item.model_dump() for item in notification_registry.items],
+    "preferences": notification_registry.defaults,
+}
+
+
+async def load_rows(url: str) -> dict:
+    """ORM instances and plain rows for one seeded user of each table."""
+    engine, session_factory = await setup_database(url)
+    await seed_users(session_factory, 10, coverage=1.0)
+    async with session_factory() as session:
+        rows = {}
+        for name, model in (("settings", UserSettings), ("theme", ThemeSettings)):
+            rows[f"{name} orm"] = (await session.execute(select(model).limit(1))).scalar_one()
+            rows[f"{name} row"] = (
+                await session.execute(select(*model.__table__.c).limit(1))
+            ).one()
+    await engine.dispose()
+    return rows
+
+
+def cases(rows: dict) -> dict:
+    settings = UserSettingsResponse(language="fr", timezone="Europe/Paris", locale="fr-FR")
+    notifications = NotificationSettingsResponse.model_validate(NOTIFICATIONS)
+    theme = ThemeSettingsResponse(mode="dark", accent_color="#000000")
+    batch = {
+        "user_ids": [f"user-{i:08d}" for i in range(100)],
+        "sections": ["settings", "theme"],
+    }
+    return {
+        "UserSettingsResponse dict": lambda: UserSettingsResponse.model_validate(
+            {"language": "fr", "timezone": "Europe/Paris", "locale": "fr-FR"}
+        ),
+        "UserSettingsResponse orm": lambda: UserSettingsResponse.model_validate(
+            rows["settings orm"]
+        ),
+        "UserSettingsResponse row": lambda: UserSettingsResponse.model_validate(
+            rows["settings row"]
+        ),
+        "UserSettingsUpdate": lambda: UserSettingsUpdate.model_validate(
+            {"language": "fr", "timezone": "Europe/Paris"}
+        ),
+        "NotificationItem": lambda: NotificationItem.model_validate(ITEM),
+        "NotificationPreferencesUpdate": lambda: NotificationPreferencesUpdate.model_validate(
+            {"preferences": {"email": True, "push": False}}
+        ),
+        "NotificationSettingsResponse": lambda: NotificationSettingsResponse.model_validate(
+            NOTIFICATIONS
+        ),
+        "ThemeSettingsResponse alias": lambda: ThemeSettingsResponse.model_validate(
+            {"mode": "dark", "accent_color": "#000000"}
+        ),
+        "ThemeSettingsResponse name": lambda: ThemeSettingsResponse.model_validate(
+            {"mode": "dark", "accentColor": "#000000"}
+        ),
+        "ThemeSettingsResponse orm": lambda: ThemeSettingsResponse.model_validate(
+            rows["theme orm"]
+        ),
+        "ThemeSettingsResponse row": lambda: ThemeSettingsResponse.model_validate(
+            rows["theme row"]
+        ),
+        "ThemeSettingsResponse dump": lambda: theme.model_dump(),
+        "ThemeSettingsResponse dump alias": lambda: theme.model_dump(by_alias=True),
+        "ThemeSettingsUpdate alias": lambda: ThemeSettingsUpdate.model_validate(
+            {"mode": "light", "accent_color": "#ffffff"}
+        ),
+        "ThemeSettingsUpdate name": lambda: ThemeSettingsUpdate.model_validate(
+            {"mode": "light", "accentColor": "#ffffff"}
+        ),
+        "AllPreferencesResponse models": lambda: AllPreferencesResponse(
+            settings=settings, notifications=notifications, theme=theme
+        ),
+        "BatchPreferencesRequest 100 ids": lambda: BatchPreferencesRequest.model_validate(
+            batch
+        ),
+    }
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    for name, fn in cases(asyncio.run(load_rows(args.database_url))).items():
+        profile = profile_calls(fn, args.iterations, args.rounds)
+        rows.append([
+            name,
+            f"{profile.us:.2f}",
+            f"{profile.peak_bytes:.0f}",
+            f"{profile.retained_bytes:.1f}",
+        ])
+    print_table(["schema", "µs/call", "peak B/call", "retained B/call"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure response serialization cost per endpoint.
+
+"response_model" is what FastAPI does with a returned model: validate it
+against the route's ``response_model`` and encode it with ``json``.
+"pre-encoded" is the path the routes use now (``services.encoding``).
+Each is timed for a user on defaults (version 0) and a user with saved
+settings; no database or HTTP is involved.
+
+    python -m benchmarks.bench_serialization --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from . import support  # noqa: F401  (points the app at SQLite)
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import APIRoute, serialize_response  # noqa: E402
+
+from src.main import app  # noqa: E402
+from src.schemas import (  # noqa: E402
+    AllPreferencesResponse,
+    NotificationSettingsResponse,
+    ThemeSettingsResponse,
+    UserSettingsResponse,
+)
+from src.services.encoding import encode_section, encode_sections  # noqa: E402
+from src.services.notification_types import notification_registry  # noqa: E402
+from src.services.settings_service import SECTION_RESPONSES, Versioned  # noqa: E402
+
+PREFIX = "/api/v1/user-preferences"
+ENDPOINTS = {"settings": "", "notifications": "/notifications", "theme": "/theme"}
+
+SAVED = {
+    "settings": UserSettingsResponse(language="fr", timezone="Europe/Paris", locale="fr-FR"),
+    "notifications": NotificationSettingsResponse(
+        items=notification_registry.items,
+        preferences={"email": True, "push": False, "assignments": True, "skillUpdates": True},
+    ),
+    "theme": ThemeSettingsResponse(mode="dark", accent_color="#000000"),
+}
+
+
+def response_field(path: str):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+async def per_call_us(iterations: int, fn) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def run(iterations: int) -> None:
+    cases = {}
+    for section, path in ENDPOINTS.items():
+        for state, versioned in (
+            ("defaults", Versioned(0, SECTION_RESPONSES[section](None))),
+            ("saved", Versioned(1, SAVED[section])),
+        ):
+            cases[(path or "/", state)] = (
+                response_field(PREFIX + path),
+                versioned.value,
+                lambda s=section, v=versioned: encode_section(s, v),
+            )
+    for state, values in (
+        ("defaults", {s: (0, SECTION_RESPONSES[s](None)) for s in ENDPOINTS}),
+        ("saved", {s: (1, SAVED[s]) for s in ENDPOINTS}),
+    ):
+        sections = {s: Versioned(*value) for s, value in values.items()}
+        cases[("/all", state)] = (
+            response_field(PREFIX + "/all"),
+            AllPreferencesResponse(**{s: v.value for s, v in sections.items()}),
+            lambda sections=sections: encode_sections(sections),
+        )
+
+    rows = []
+    for (path, state), (field, model, encode) in cases.items():
+        async def legacy(field=field, model=model):
+            content = await serialize_response(
+                field=field, response_content=model, is_coroutine=True
+            )
+            return JSONResponse(content).body
+
+        async def fast(encode=encode):
+            return encode()
+
+        # Both paths must produce the same bytes
+        assert await legacy() == await fast(), path
+
+        before = await per_call_us(iterations, legacy)
+        after = await per_call_us(iterations, fast)
+        rows.append([path, state, f"{before:.1f}", f"{after:.1f}", f"{before / after:.1f}x"])
+
+    support.print_table(
+        ["endpoint", "user", "response_model µs", "pre-encoded µs", "speedup"], rows
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
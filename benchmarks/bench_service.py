@@ -0,0 +1,135 @@
+"""Per-method cost of SettingsService on an in-memory database.
+
+Every public method is called in a loop against a seeded in-memory SQLite
+database, reads both with the cache warm and with caching disabled, and
+reported as time per call (best of ``--rounds``) together with the peak
+Python memory each call allocates and what it leaves behind. The
+dataset and the users picked are fixed by ``--seed``, so two runs on the
+same commit allocate the same; a jump in peak bytes usually means a hot
+path started copying.
+
+The scans (batch, audience and export) cover ``--users`` users per call
+and run ``--iterations / 100`` times.
+
+    python -m benchmarks.bench_service --storage document
+"""
+import asyncio
+import random
+
+from .support import (
+    base_parser,
+    print_table,
+    profile_async_calls,
+    seed_users,
+    setup_database,
+    simulate_round_trips,
+)
+
+from src.schemas import (  # noqa: E402
+    NotificationPreferencesUpdate,
+    ThemeSettingsUpdate,
+    UserSettingsUpdate,
+)
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.document_backfill import backfill_documents  # noqa: E402
+from src.services.settings_service import SECTION_MODELS, SettingsService  # noqa: E402
+from src.services.singleflight import SingleFlight  # noqa: E402
+
+UPDATES = {
+    "settings": lambda rng: UserSettingsUpdate(language=rng.choice(["en", "fr", "de"])),
+    "notifications": lambda rng: NotificationPreferencesUpdate(
+        preferences={"email": rng.random() < 0.5}
+    ),
+    "theme": lambda rng: ThemeSettingsUpdate(mode=rng.choice(["light", "dark"])),
+}
+
+
+async def drain(items) -> None:
+    async for _ in items:
+        pass
+
+
+async def run(args) -> None:
+    engine, session_factory = await setup_database(args.database_url)
+    await seed_users(session_factory, args.users, seed=args.seed)
+    if args.storage != "tables":
+        await backfill_documents(bind=engine)
+    simulate_round_trips(engine, args.rtt_ms)
+
+    rng = random.Random(args.seed)
+    user_ids = [f"user-{i:08d}" for i in range(args.users)]
+    scan_iterations = max(1, args.iterations // 100)
+
+    async with session_factory() as session:
+        warm = SettingsService(session, TTLCache(10_000, 3600), SingleFlight(), args.storage)
+        cold = SettingsService(session, TTLCache(0, 0), SingleFlight(), args.storage)
+
+        def next_user() -> str:
+            return rng.choice(user_ids)
+
+        async def put(section: str, conditional: bool = False) -> None:
+            user_id = next_user()
+            expected = None
+            if conditional:
+                expected = await cold.get_section_version(user_id, section)
+            await cold.put_section(user_id, section, UPDATES[section](rng), expected)
+            await session.commit()
+
+        cases = {}
+        for section in SECTION_MODELS:
+            cases[f"get_section {section} (cached)"] = (
+                lambda s=section: warm.get_section(user_ids[0], s)
+            )
+            cases[f"get_section {section}"] = (
+                lambda s=section: cold.get_section(next_user(), s)
+            )
+        cases["get_section_version"] = lambda: cold.get_section_version(next_user(), "theme")
+        cases["get_all_sections (cached)"] = lambda: warm.get_all_sections(user_ids[0])
+        cases["get_all_sections"] = lambda: cold.get_all_sections(next_user())
+        cases["get_all_preferences"] = lambda: cold.get_all_preferences(next_user())
+        for section in SECTION_MODELS:
+            cases[f"put_section {section}"] = lambda s=section: put(s)
+        cases["put_section settings (If-Match)"] = lambda: put("settings", conditional=True)
+        cases["get_changes (page of 100)"] = lambda: cold.get_changes(None, 100)
+
+        # Each scan covers every user, so it gets fewer iterations
+        scans = {
+            f"iter_preferences_batch ({args.users} users)": (
+                lambda: drain(cold.iter_preferences_batch(user_ids))
+            ),
+            "iter_notification_audience push": (
+                lambda: drain(cold.iter_notification_audience("push"))
+            ),
+            "iter_export_rows": lambda: drain(cold.iter_export_rows()),
+        }
+
+        rows = []
+        for name, fn in {**cases, **scans}.items():
+            iterations = scan_iterations if name in scans else args.iterations
+            profile = await profile_async_calls(fn, iterations, args.rounds)
+            rows.append([
+                name,
+                f"{profile.us:.1f}",
+                f"{profile.peak_bytes / 1024:.1f}",
+                f"{profile.retained_bytes:.0f}",
+            ])
+
+    await engine.dispose()
+    print_table(["method", "µs/call", "peak KiB/call", "retained B/call"], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument(
+        "--storage", choices=["tables", "dual", "document"], default="tables"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
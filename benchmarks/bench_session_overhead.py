@@ -0,0 +1,133 @@
+"""Per-request session overhead of get_db versus open_read_session.
+
+Drives a committing session and the read-only one GET routes use (as
+``get_user_read_db`` opens it) the way FastAPI does for a GET, with both
+a cache hit and a cache miss behind them, and reports time per request,
+connection checkouts per request and how long each checkout holds its
+connection (the pool pressure a request creates).
+
+The read session saves the round trips of BEGIN and COMMIT, so on a
+cache miss it only wins when those cost something: run it with
+--rtt-ms. Without it, in-memory SQLite makes them nearly free, while
+switching the connection to autocommit on checkout and back on checkin
+is not, and a miss measured about 1500us per request on the read
+session against 1130us on get_db (2700us against 3600us at 0.5ms).
+
+    python -m benchmarks.bench_session_overhead --requests 2000 --rtt-ms 0.5
+"""
+import asyncio
+import time
+
+from .support import base_parser, print_table, seed_users, simulate_round_trips
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from src import database  # noqa: E402
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+from src.services.singleflight import SingleFlight  # noqa: E402
+
+
+async def legacy_get_db():
+    """The previous dependency: always commits, even for reads."""
+    async with database.async_session() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+class PoolMonitor:
+    """Counts checkouts and measures how long connections stay checked out."""
+
+    def __init__(self, engine):
+        self.checkouts = 0
+        self.held = 0.0
+        self._since = {}
+        event.listen(engine.sync_engine.pool, "checkout", self._checkout)
+        event.listen(engine.sync_engine.pool, "checkin", self._checkin)
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.held = 0.0
+
+    def _checkout(self, dbapi_connection, record, proxy) -> None:
+        self.checkouts += 1
+        self._since[id(record)] = time.perf_counter()
+
+    def _checkin(self, dbapi_connection, record) -> None:
+        started = self._since.pop(id(record), None)
+        if started is not None:
+            self.held += time.perf_counter() - started
+
+
+async def read_session():
+    """The read-only session as GET routes open it."""
+    async with database.open_read_session() as session:
+        yield session
+
+
+async def one_request(dependency, cache: TTLCache, user_id: str) -> None:
+    agen = dependency()
+    db: AsyncSession = await agen.__anext__()
+    await SettingsService(db, cache, SingleFlight()).get_section(user_id, "theme")
+    try:
+        await agen.__anext__()
+    except StopAsyncIteration:
+        pass
+
+
+async def run(requests: int, rtt_ms: float) -> None:
+    engine = database.engine
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    await seed_users(database.async_session, 1000, coverage=1.0)
+    simulate_round_trips(engine, rtt_ms)
+    monitor = PoolMonitor(engine)
+
+    rows = []
+    for path, cache in (
+        ("cache hit", TTLCache(max_size=10_000, ttl_seconds=3600)),
+        ("cache miss", TTLCache(max_size=0, ttl_seconds=0)),
+    ):
+        for name, dependency in (
+            ("get_db (before)", legacy_get_db),
+            ("open_read_session", read_session),
+        ):
+            await one_request(dependency, cache, "user-00000001")  # warm up
+            monitor.reset()
+            start = time.perf_counter()
+            for i in range(requests):
+                await one_request(dependency, cache, "user-00000001")
+            elapsed = time.perf_counter() - start
+            rows.append([
+                path,
+                name,
+                f"{elapsed / requests * 1e6:.0f}",
+                f"{monitor.checkouts / requests:.2f}",
+                f"{monitor.held / max(monitor.checkouts, 1) * 1e6:.0f}",
+            ])
+
+    await engine.dispose()
+    print_table(
+        ["path", "dependency", "us/request", "checkouts/request", "us held/checkout"],
+        rows,
+    )
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    if args.database_url != "sqlite+aiosqlite://":
+        parser.error("uses the service's own engine; set DATABASE_URL instead")
+    asyncio.run(run(args.requests, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
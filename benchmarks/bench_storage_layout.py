@@ -0,0 +1,120 @@
+"""Compare insert throughput and on-disk size of the two storage layouts.
+
+"uuid-pk" is the previous layout: a random UUID primary key plus a unique
+index on user_id. "user_id-pk" is the current one, keyed by user_id alone.
+Rows are inserted in batches in random user order, as they arrive in
+production, and sizes are read from ``dbstat`` (SQLite) or the Postgres
+relation size functions afterwards.
+
+    python -m benchmarks.bench_storage_layout --users 200000
+"""
+import asyncio
+import random
+import uuid
+
+from .support import base_parser, print_table, simulate_round_trips, timed
+
+from sqlalchemy import Column, Index, MetaData, String, Table, Uuid, text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from src.models import NotificationPreferences, ThemeSettings, UserSettings  # noqa: E402
+
+TABLES = [model.__table__ for model in (UserSettings, NotificationPreferences, ThemeSettings)]
+
+
+def current_layout() -> tuple[MetaData, list[Table]]:
+    metadata = MetaData()
+    return metadata, [table.to_metadata(metadata) for table in TABLES]
+
+
+def legacy_layout() -> tuple[MetaData, list[Table]]:
+    metadata = MetaData()
+    tables = []
+    for table in TABLES:
+        legacy = Table(
+            table.name,
+            metadata,
+            Column("id", Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4),
+            Column("user_id", String(255), nullable=False, unique=True, index=True),
+            *(column._copy() for column in table.columns if column.name != "user_id"),
+        )
+        # Keep the indexes both layouts share, e.g. the change_version indexes
+        for index in table.indexes:
+            Index(
+                index.name,
+                *(legacy.c[column.name] for column in index.columns),
+                **index.dialect_kwargs,
+            )
+        tables.append(legacy)
+    return metadata, tables
+
+
+async def relation_sizes(conn, table: Table) -> tuple[int, int]:
+    """Return (heap bytes, index bytes) for a table."""
+    if conn.dialect.name == "postgresql":
+        row = (await conn.execute(
+            text("SELECT pg_relation_size(:t), pg_indexes_size(:t)"), {"t": table.name}
+        )).one()
+        return row[0], row[1]
+
+    indexes = (await conn.execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"),
+        {"t": table.name},
+    )).scalars().all()
+    sizes = dict((await conn.execute(
+        text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+    )).all())
+    return sizes.get(table.name, 0), sum(sizes.get(name, 0) for name in indexes)
+
+
+async def run(url: str, users: int, batch_size: int, rtt_ms: float) -> None:
+    user_ids = [f"user-{i:08d}" for i in range(users)]
+    random.Random(42).shuffle(user_ids)
+
+    rows = []
+    for name, layout in (("uuid-pk", legacy_layout), ("user_id-pk", current_layout)):
+        metadata, tables = layout()
+        engine = create_async_engine(url)
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+            await conn.run_sync(metadata.create_all)
+        simulate_round_trips(engine, rtt_ms)
+
+        with timed() as timing:
+            for start in range(0, users, batch_size):
+                batch = [{"user_id": user_id} for user_id in user_ids[start:start + batch_size]]
+                async with engine.begin() as conn:
+                    for table in tables:
+                        await conn.execute(table.insert(), batch)
+
+        heap = index = 0
+        async with engine.connect() as conn:
+            for table in tables:
+                table_heap, table_index = await relation_sizes(conn, table)
+                heap += table_heap
+                index += table_index
+            await conn.run_sync(metadata.drop_all)
+        await engine.dispose()
+
+        inserted = users * len(tables)
+        rows.append([
+            name,
+            inserted,
+            f"{inserted / timing['elapsed']:.0f}",
+            f"{heap / 2**20:.1f}",
+            f"{index / 2**20:.1f}",
+        ])
+
+    print_table(["layout", "rows", "rows/s", "heap MiB", "index MiB"], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users, args.batch_size, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
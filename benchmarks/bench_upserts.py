@@ -0,0 +1,89 @@
+"""Compare select-then-mutate writes with single-statement upserts.
+
+Each simulated PUT runs in its own session and commits, like a request
+through ``get_db``. Every user gets a first write (insert) and a second
+write (update) so both paths of the old implementation are exercised.
+
+    python -m benchmarks.bench_upserts --users 2000 --rtt-ms 0.5
+"""
+import asyncio
+
+from .support import (
+    StatementCounter,
+    base_parser,
+    print_table,
+    setup_database,
+    simulate_round_trips,
+    timed,
+)
+
+from sqlalchemy import select  # noqa: E402
+
+from src.models import ThemeSettings  # noqa: E402
+from src.schemas import ThemeSettingsUpdate  # noqa: E402
+from src.services.cache import TTLCache  # noqa: E402
+from src.services.settings_service import SettingsService  # noqa: E402
+
+
+async def legacy_update_theme(session, user_id: str, update: ThemeSettingsUpdate) -> None:
+    """The previous SELECT, mutate, flush implementation."""
+    result = await session.execute(
+        select(ThemeSettings).where(ThemeSettings.user_id == user_id)
+    )
+    theme = result.scalar_one_or_none()
+    if not theme:
+        theme = ThemeSettings(
+            user_id=user_id,
+            mode=update.mode or "system",
+            accent_color=update.accentColor or "#3b82f6",
+        )
+        session.add(theme)
+    else:
+        if update.mode is not None:
+            theme.mode = update.mode
+        if update.accentColor is not None:
+            theme.accent_color = update.accentColor
+    await session.flush()
+
+
+async def upsert_update_theme(session, user_id: str, update: ThemeSettingsUpdate) -> None:
+    service = SettingsService(session, cache=TTLCache(max_size=0, ttl_seconds=0))
+    await service.update_theme_settings(user_id, update)
+
+
+async def run(url: str, users: int, rtt_ms: float) -> None:
+    updates = [ThemeSettingsUpdate(mode="dark"), ThemeSettingsUpdate(accent_color="#000000")]
+    rows = []
+    for name, write in (("select+flush", legacy_update_theme), ("upsert", upsert_update_theme)):
+        engine, session_factory = await setup_database(url)
+        simulate_round_trips(engine, rtt_ms)
+        counter = StatementCounter(engine)
+        with counter.counting(), timed() as timing:
+            for update in updates:
+                for i in range(users):
+                    async with session_factory() as session:
+                        await write(session, f"user-{i}", update)
+                        await session.commit()
+        await engine.dispose()
+
+        writes = users * len(updates)
+        rows.append([
+            name,
+            writes,
+            counter.count,
+            f"{counter.count / writes:.2f}",
+            f"{writes / timing['elapsed']:.0f}",
+        ])
+
+    print_table(["strategy", "writes", "statements", "stmts/write", "writes/s"], rows)
+
+
+def main() -> None:
+    parser = base_parser(__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.database_url, args.users, args.rtt_ms))
+
+
+if __name__ == "__main__":
+    main()
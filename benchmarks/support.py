@@ -0,0 +1,267 @@
+"""Shared helpers for the benchmark scripts.
+
+Import this module before anything from ``src`` so that the service's
+module-level engine points at the benchmark database instead of the
+configured Postgres instance.
+"""
+import argparse
+import gc
+import os
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Awaitable, Callable, NamedTuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from src.database import Base  # noqa: E402
+from src.models import (  # noqa: E402
+    NotificationPreferences,
+    ThemeSettings,
+    UserSettings,
+)
+from src.services.notification_types import notification_registry  # noqa: E402
+
+
+# Zones seeded users are spread over, across both hemispheres' DST rules
+# and offsets that are not whole hours
+TIMEZONES = [
+    "UTC",
+    "Europe/London",
+    "Europe/Paris",
+    "America/New_York",
+    "America/Los_Angeles",
+    "America/Sao_Paulo",
+    "Asia/Kolkata",
+    "Asia/Ho_Chi_Minh",
+    "Asia/Tokyo",
+    "Australia/Sydney",
+    "Australia/Adelaide",
+    "Pacific/Auckland",
+]
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    """Argument parser with the options every benchmark accepts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--database-url",
+        default="sqlite+aiosqlite://",
+        help="Database to run against (default: in-memory SQLite)",
+    )
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.0,
+        help="Simulated network round trip added to every statement",
+    )
+    return parser
+
+
+def simulate_round_trips(engine: AsyncEngine, rtt_ms: float) -> None:
+    """Add a fixed delay to every round trip, approximating a remote database.
+
+    In-memory SQLite has no network hop, which hides exactly the cost that
+    fewer round trips save. Statements always pay the delay; BEGIN, COMMIT
+    and ROLLBACK only do outside autocommit mode, as with asyncpg.
+    """
+    if rtt_ms <= 0:
+        return
+
+    def delay(*args) -> None:
+        time.sleep(rtt_ms / 1000)
+
+    def delay_transactional(conn, *args) -> None:
+        if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            delay()
+
+    event.listen(engine.sync_engine, "before_cursor_execute", delay)
+    for name in ("begin", "commit", "rollback"):
+        event.listen(engine.sync_engine, name, delay_transactional)
+
+
+async def setup_database(url: str) -> tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
+    """Create an engine with a freshly created schema and a session factory."""
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def seed_users(
+    session_factory: async_sessionmaker[AsyncSession],
+    users: int,
+    coverage: float = 0.7,
+    batch_size: int = 5000,
+    seed: int = 42,
+) -> None:
+    """Insert ``users`` users with randomized preferences.
+
+    Each table gets a row for roughly ``coverage`` of the users, so the
+    dataset also contains users who rely on defaults for some sections.
+    """
+    rng = random.Random(seed)
+    for start in range(0, users, batch_size):
+        settings_rows, prefs_rows, theme_rows = [], [], []
+        for i in range(start, min(start + batch_size, users)):
+            user_id = f"user-{i:08d}"
+            if rng.random() < coverage:
+                settings_rows.append({
+                    "user_id": user_id,
+                    "language": rng.choice(["en", "fr", "de", "vi"]),
+                    "timezone": rng.choice(TIMEZONES),
+                    "locale": "en-US",
+                })
+            if rng.random() < coverage:
+                enabled_mask, set_mask = notification_registry.masks({
+                    "email": rng.random() < 0.3,
+                    "push": rng.random() < 0.8,
+                    "assignments": rng.random() < 0.2,
+                    "skillUpdates": rng.random() < 0.9,
+                })
+                prefs_rows.append({
+                    "user_id": user_id,
+                    "enabled_mask": enabled_mask,
+                    "set_mask": set_mask,
+                })
+            if rng.random() < coverage:
+                theme_rows.append({
+                    "user_id": user_id,
+                    "mode": rng.choice(["light", "dark", "system"]),
+                    "accent_color": "#3b82f6",
+                })
+
+        async with session_factory() as session:
+            for model, rows in (
+                (UserSettings, settings_rows),
+                (NotificationPreferences, prefs_rows),
+                (ThemeSettings, theme_rows),
+            ):
+                if rows:
+                    await session.execute(model.__table__.insert(), rows)
+            await session.commit()
+
+
+class StatementCounter:
+    """Counts SQL statements sent to the database by an engine."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args) -> None:
+        self.count += 1
+
+    @contextmanager
+    def counting(self):
+        self.count = 0
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self._on_execute)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def timed():
+    """Yield a dict whose ``elapsed`` key is set to the block's wall time."""
+    timing = {}
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing["elapsed"] = time.perf_counter() - start
+
+
+class CallProfile(NamedTuple):
+    """Cost of one call: best-of-rounds time and Python allocations."""
+
+    us: float
+    # Mean of each call's peak traced memory above where it started
+    peak_bytes: float
+    # Memory still held after the calls, per call (caches, leaks)
+    retained_bytes: float
+
+
+def profile_calls(fn: Callable[[], object], iterations: int, rounds: int = 5) -> CallProfile:
+    """Time ``fn`` and measure what each call allocates.
+
+    Timing runs without tracing and keeps the fastest round; allocations
+    are traced in a separate pass, since tracemalloc slows every
+    allocation down. ``fn`` is called once first so that lazily built
+    state (compiled statements, cache entries) is not charged to it.
+    """
+    fn()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - start)
+
+    peaks = 0
+    with _tracing() as retained:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peaks += tracemalloc.get_traced_memory()[1] - before
+    return CallProfile(best / iterations * 1e6, peaks / iterations, retained[0] / iterations)
+
+
+async def profile_async_calls(
+    fn: Callable[[], Awaitable], iterations: int, rounds: int = 5
+) -> CallProfile:
+    """:func:`profile_calls` for a coroutine function."""
+    await fn()
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await fn()
+        best = min(best, time.perf_counter() - start)
+
+    peaks = 0
+    with _tracing() as retained:
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await fn()
+            peaks += tracemalloc.get_traced_memory()[1] - before
+    return CallProfile(best / iterations * 1e6, peaks / iterations, retained[0] / iterations)
+
+
+@contextmanager
+def _tracing():
+    """Trace allocations in the block; yields a list set to the bytes kept."""
+    retained = [0]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        yield retained
+        gc.collect()
+        retained[0] = max(tracemalloc.get_traced_memory()[0] - baseline, 0)
+    finally:
+        tracemalloc.stop()
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    """Print rows as a fixed-width table."""
+    widths = [
+        max(len(str(value)) for value in [header, *(row[i] for row in rows)])
+        for i, header in enumerate(headers)
+    ]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,47 @@
+"""Partial indexes for notification audience queries.
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "002"
+down_revision: Union[str, None] = "001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANNEL_COLUMNS = (
+    "email_enabled",
+    "push_enabled",
+    "assignments_enabled",
+    "skill_updates_enabled",
+)
+
+
+def upgrade() -> None:
+    # Built concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for column in CHANNEL_COLUMNS:
+            op.create_index(
+                f"ix_notification_preferences_{column}",
+                "notification_preferences",
+                ["user_id"],
+                postgresql_where=sa.text(column),
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in CHANNEL_COLUMNS:
+            op.drop_index(
+                f"ix_notification_preferences_{column}",
+                table_name="notification_preferences",
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,33 @@
+"""Row version counters for ETags and conditional writes.
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("user_settings", "notification_preferences", "theme_settings")
+
+
+def upgrade() -> None:
+    # A constant server default makes this a metadata-only change on Postgres
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1"),
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_column(table, "version")
@@ -0,0 +1,106 @@
+"""Make user_id the primary key and drop the surrogate UUID ids.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17
+
+Every lookup goes by user_id, so the UUID primary key index only cost
+space and write time. On Postgres the existing unique index on user_id
+is promoted to the primary key in place (ADD PRIMARY KEY USING INDEX),
+and dropping a column is metadata-only, so no table is rewritten and
+locks are held only briefly. If the unique index is missing it is first
+built CONCURRENTLY. Other databases rebuild each table with batch mode.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("user_settings", "notification_preferences", "theme_settings")
+
+# Fail fast instead of queueing behind long transactions (and blocking
+# every query queued behind us) while taking the brief exclusive locks
+LOCK_TIMEOUT = "5s"
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _has_valid_index(name: str) -> bool:
+    return bool(
+        op.get_bind().scalar(
+            sa.text(
+                "SELECT indisvalid AND indisunique FROM pg_index "
+                "WHERE indexrelid = to_regclass(:name)"
+            ),
+            {"name": name},
+        )
+    )
+
+
+def upgrade() -> None:
+    if not _is_postgresql():
+        for table in TABLES:
+            with op.batch_alter_table(table, recreate="always") as batch_op:
+                batch_op.drop_index(f"ix_{table}_user_id")
+                batch_op.drop_column("id")
+                batch_op.create_primary_key(f"{table}_pkey", ["user_id"])
+        return
+
+    for table in TABLES:
+        index = f"ix_{table}_user_id"
+        if not _has_valid_index(index):
+            with op.get_context().autocommit_block():
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+                op.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {index} ON {table} (user_id)")
+
+    op.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+    for table in TABLES:
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        # Renames the index to the constraint name
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey "
+            f"PRIMARY KEY USING INDEX ix_{table}_user_id"
+        )
+        op.drop_column(table, "id")
+
+
+def downgrade() -> None:
+    if not _is_postgresql():
+        for table in TABLES:
+            with op.batch_alter_table(table, recreate="always") as batch_op:
+                batch_op.drop_constraint(f"{table}_pkey", type_="primary")
+                batch_op.add_column(sa.Column("id", sa.Uuid(as_uuid=True), nullable=True))
+            op.execute(
+                f"UPDATE {table} SET id = lower(hex(randomblob(16))) WHERE id IS NULL"
+            )
+            with op.batch_alter_table(table, recreate="always") as batch_op:
+                batch_op.alter_column("id", nullable=False)
+                batch_op.create_primary_key(f"{table}_pkey", ["id"])
+                batch_op.create_index(f"ix_{table}_user_id", ["user_id"], unique=True)
+        return
+
+    for table in TABLES:
+        # The volatile default fills existing rows, rewriting the table
+        op.add_column(
+            table,
+            sa.Column(
+                "id",
+                postgresql.UUID(as_uuid=True),
+                nullable=False,
+                server_default=sa.text("gen_random_uuid()"),
+            ),
+        )
+        op.alter_column(table, "id", server_default=None)
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.create_primary_key(f"{table}_pkey", table, ["id"])
+        op.create_index(f"ix_{table}_user_id", table, ["user_id"], unique=True)
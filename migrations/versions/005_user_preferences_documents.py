@@ -0,0 +1,143 @@
+"""Consolidated user_preferences table, backfilled from the section tables.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17
+
+The copy runs in user_id order in batches that each commit on their own,
+so no long transaction or lock is held. Writes made between this
+migration and switching PREFERENCES_STORAGE to "dual" are picked up by
+``python -m src.cli backfill-documents``, which is safe to re-run.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+CHANNEL_COLUMNS = (
+    "email_enabled",
+    "push_enabled",
+    "assignments_enabled",
+    "skill_updates_enabled",
+)
+
+# Section table -> (document version column, copied columns and their defaults)
+SECTIONS = {
+    "user_settings": (
+        "settings_version",
+        {"language": "en", "timezone": "UTC", "locale": "en-US"},
+    ),
+    "notification_preferences": (
+        "notifications_version",
+        {
+            "email_enabled": sa.false(),
+            "push_enabled": sa.true(),
+            "assignments_enabled": sa.false(),
+            "skill_updates_enabled": sa.true(),
+        },
+    ),
+    "theme_settings": ("theme_version", {"mode": "system", "accent_color": "#3b82f6"}),
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_preferences",
+        sa.Column("user_id", sa.String(255), primary_key=True),
+        sa.Column("language", sa.String(10), nullable=False, server_default="en"),
+        sa.Column("timezone", sa.String(50), nullable=False, server_default="UTC"),
+        sa.Column("locale", sa.String(10), nullable=False, server_default="en-US"),
+        sa.Column("settings_version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("email_enabled", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("push_enabled", sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column(
+            "assignments_enabled", sa.Boolean(), nullable=False, server_default=sa.false()
+        ),
+        sa.Column(
+            "skill_updates_enabled", sa.Boolean(), nullable=False, server_default=sa.true()
+        ),
+        sa.Column("notifications_version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("mode", sa.String(10), nullable=False, server_default="system"),
+        sa.Column("accent_color", sa.String(20), nullable=False, server_default="#3b82f6"),
+        sa.Column("theme_version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+    )
+    # The table is new and empty, so these need not be built concurrently
+    for column in CHANNEL_COLUMNS:
+        op.create_index(
+            f"ix_user_preferences_{column}",
+            "user_preferences",
+            ["user_id"],
+            postgresql_where=sa.text(column),
+            sqlite_where=sa.text(column),
+        )
+
+    tables = {
+        name: sa.table(name, *map(sa.column, ["user_id", "version", *defaults]))
+        for name, (_, defaults) in SECTIONS.items()
+    }
+    target_columns = ["user_id"]
+    for name, (version, defaults) in SECTIONS.items():
+        target_columns += [*defaults, version]
+    target = sa.table("user_preferences", *map(sa.column, target_columns))
+
+    bind = op.get_bind()
+    last = ""
+    with op.get_context().autocommit_block():
+        while True:
+            user_ids = bind.execute(
+                sa.union(
+                    *(
+                        sa.select(table.c.user_id).where(table.c.user_id > last)
+                        for table in tables.values()
+                    )
+                )
+                .order_by("user_id")
+                .limit(BATCH_SIZE)
+            ).scalars().all()
+            if not user_ids:
+                break
+
+            users = sa.union(
+                *(
+                    sa.select(table.c.user_id).where(table.c.user_id.in_(user_ids))
+                    for table in tables.values()
+                )
+            ).subquery()
+            source = sa.select(users.c.user_id).select_from(users)
+            for name, (version, defaults) in SECTIONS.items():
+                table = tables[name]
+                source = source.outerjoin(table, table.c.user_id == users.c.user_id)
+                source = source.add_columns(
+                    *(
+                        sa.func.coalesce(table.c[column], default)
+                        for column, default in defaults.items()
+                    ),
+                    sa.func.coalesce(table.c.version, 0),
+                )
+            bind.execute(sa.insert(target).from_select(target_columns, source))
+            last = user_ids[-1]
+
+
+def downgrade() -> None:
+    op.drop_table("user_preferences")
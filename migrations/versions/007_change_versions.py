@@ -0,0 +1,56 @@
+"""Change versions and indexes for the incremental changes feed.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = (
+    "user_settings",
+    "notification_preferences",
+    "theme_settings",
+    "user_preferences",
+)
+
+
+def upgrade() -> None:
+    # Existing rows start at 0, so a sync from the beginning returns them
+    # before any change made after the migration
+    for table in TABLES:
+        op.add_column(
+            table,
+            sa.Column("change_version", sa.BigInteger(), nullable=False, server_default="0"),
+        )
+
+    # Built concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f"ix_{table}_change_version",
+                table,
+                ["change_version", "user_id"],
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(
+                f"ix_{table}_change_version",
+                table_name=table,
+                postgresql_concurrently=True,
+            )
+    for table in TABLES:
+        op.drop_column(table, "change_version")
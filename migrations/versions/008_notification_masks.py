@@ -0,0 +1,158 @@
+"""Notification preferences as bitmasks over the notification type registry.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+Replaces the per-channel boolean columns of notification_preferences and
+user_preferences with ``enabled_mask`` and ``set_mask``. Stored rows held
+a value for every channel, so each converted row has all four channels
+marked as set; documents whose notifications were never saved stay empty
+and keep following the defaults.
+
+The masks are filled in user_id batches that each commit on their own.
+Stop the previous release before upgrading: whatever it writes to the
+boolean columns after a user's batch has been converted is lost when the
+columns are dropped.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+# Channel column -> (bit in the registry, default for users who never chose)
+CHANNELS = {
+    "email_enabled": (0, False),
+    "push_enabled": (1, True),
+    "assignments_enabled": (2, False),
+    "skill_updates_enabled": (3, True),
+}
+ALL_CHANNELS = sum(1 << bit for bit, _ in CHANNELS.values())
+
+# Table -> condition that its row holds saved notification preferences
+TABLES = {
+    "notification_preferences": lambda table: sa.true(),
+    "user_preferences": lambda table: table.c.notifications_version > 0,
+}
+
+
+def _table(name: str) -> sa.table:
+    return sa.table(
+        name,
+        *map(sa.column, ["user_id", "notifications_version", "enabled_mask", "set_mask"]),
+        *(sa.column(column, sa.Boolean) for column in CHANNELS),
+    )
+
+
+def _in_batches(table: sa.table, values: dict) -> None:
+    """Update every row of ``table`` with ``values``, one batch per commit."""
+    bind = op.get_bind()
+    last = ""
+    with op.get_context().autocommit_block():
+        while True:
+            user_ids = bind.execute(
+                sa.select(table.c.user_id)
+                .where(table.c.user_id > last)
+                .order_by(table.c.user_id)
+                .limit(BATCH_SIZE)
+            ).scalars().all()
+            if not user_ids:
+                break
+            bind.execute(
+                sa.update(table)
+                .where(table.c.user_id > last, table.c.user_id <= user_ids[-1])
+                .values(values)
+            )
+            last = user_ids[-1]
+
+
+def _drop_channel_indexes(name: str) -> None:
+    with op.get_context().autocommit_block():
+        for column in CHANNELS:
+            op.drop_index(
+                f"ix_{name}_{column}", table_name=name, postgresql_concurrently=True
+            )
+
+
+def _create_channel_indexes(name: str) -> None:
+    # Built concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for column in CHANNELS:
+            op.create_index(
+                f"ix_{name}_{column}",
+                name,
+                ["user_id"],
+                postgresql_where=sa.text(column),
+                sqlite_where=sa.text(column),
+                postgresql_concurrently=True,
+            )
+
+
+def upgrade() -> None:
+    for name, saved in TABLES.items():
+        # A constant server default makes these metadata-only on Postgres
+        op.add_column(
+            name, sa.Column("enabled_mask", sa.BigInteger(), nullable=False, server_default="0")
+        )
+        op.add_column(
+            name, sa.Column("set_mask", sa.BigInteger(), nullable=False, server_default="0")
+        )
+
+        table = _table(name)
+        enabled_mask = sum(
+            sa.case((table.c[column], 1 << bit), else_=0)
+            for column, (bit, _) in CHANNELS.items()
+        )
+        _in_batches(
+            table,
+            {
+                "enabled_mask": sa.case((saved(table), enabled_mask), else_=0),
+                "set_mask": sa.case((saved(table), ALL_CHANNELS), else_=0),
+            },
+        )
+
+        _drop_channel_indexes(name)
+        for column in CHANNELS:
+            op.drop_column(name, column)
+
+
+def downgrade() -> None:
+    for name in TABLES:
+        for column, (_, default) in CHANNELS.items():
+            op.add_column(
+                name,
+                sa.Column(
+                    column,
+                    sa.Boolean(),
+                    nullable=False,
+                    server_default=sa.true() if default else sa.false(),
+                ),
+            )
+
+        # Types added to the registry after this migration have no column
+        # to go back to and are dropped
+        table = _table(name)
+        values = {
+            column: sa.case(
+                (
+                    table.c.set_mask.bitwise_and(1 << bit) != 0,
+                    table.c.enabled_mask.bitwise_and(1 << bit) != 0,
+                ),
+                else_=sa.true() if default else sa.false(),
+            )
+            for column, (bit, default) in CHANNELS.items()
+        }
+        _in_batches(table, values)
+
+        _create_channel_indexes(name)
+        op.drop_column(name, "set_mask")
+        op.drop_column(name, "enabled_mask")
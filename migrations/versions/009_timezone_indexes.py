@@ -0,0 +1,41 @@
+"""Timezone indexes for local-time scheduled sends.
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("user_settings", "user_preferences")
+
+
+def upgrade() -> None:
+    # (timezone, user_id) so finding the users in a set of zones is an
+    # index-only scan; built concurrently to keep the tables writable
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f"ix_{table}_timezone",
+                table,
+                ["timezone", "user_id"],
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(
+                f"ix_{table}_timezone",
+                table_name=table,
+                postgresql_concurrently=True,
+            )
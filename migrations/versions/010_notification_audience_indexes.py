@@ -0,0 +1,63 @@
+"""Partial indexes for notification audiences over the masks.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+008 dropped the per-channel indexes along with the boolean columns. These
+replace them for the four built-in channels: one partial index on user_id
+per bit, over the rows the channel is on for. The predicates are the
+conditions audience queries build, which inline the mask so the planner
+can match them. Types added to the registry later get no index and their
+audiences are found with a sequential scan.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("notification_preferences", "user_preferences")
+
+# Bit of each built-in channel -> whether it is on by default, as in the
+# registry when this revision was written (kept in models as
+# AUDIENCE_INDEX_BITS, which startup checks against the registry)
+CHANNEL_BITS = {0: False, 1: True, 2: False, 3: True}
+
+
+def _predicate(bit: int, default: bool) -> str:
+    enabled = f"(enabled_mask & {1 << bit}) != 0"
+    return f"{enabled} OR (set_mask & {1 << bit}) = 0" if default else enabled
+
+
+def upgrade() -> None:
+    # Built concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            for bit, default in CHANNEL_BITS.items():
+                predicate = sa.text(_predicate(bit, default))
+                op.create_index(
+                    f"ix_{table}_audience_bit{bit}",
+                    table,
+                    ["user_id"],
+                    postgresql_where=predicate,
+                    sqlite_where=predicate,
+                    postgresql_concurrently=True,
+                )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            for bit in CHANNEL_BITS:
+                op.drop_index(
+                    f"ix_{table}_audience_bit{bit}",
+                    table_name=table,
+                    postgresql_concurrently=True,
+                )
@@ -0,0 +1,131 @@
+"""Command-line tools for operating the User Preferences service.
+
+Usage:
+  python -m src.cli export --format csv --gzip --output preferences.csv.gz
+  python -m src.cli import preferences.csv.gz --format csv
+  python -m src.cli backfill-documents
+"""
+import argparse
+import asyncio
+import sys
+
+import structlog
+
+from .config import get_settings
+from .database import engine
+
+
+async def _export(args: argparse.Namespace) -> None:
+    from .services.export import ExportStats, export_preferences
+
+    stats = ExportStats()
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in export_preferences(
+            args.format, args.gzip, args.batch_size, stats
+        ):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        await engine.dispose()
+
+    print(
+        f"Exported {stats.rows} users in {stats.elapsed:.2f}s "
+        f"({stats.rows_per_second:.0f} rows/s)",
+        file=sys.stderr,
+    )
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 20):
+    """Yield a file's bytes in chunks without blocking on the whole file."""
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def _import(args: argparse.Namespace) -> None:
+    from .services.broker import change_broker
+    from .services.bulk_import import ImportReport, import_preferences, iter_lines
+
+    def progress(report: ImportReport) -> None:
+        print(
+            f"{report.rows} rows, {report.imported} imported, "
+            f"{report.rejected} rejected ({report.rows_per_second:.0f} rows/s)",
+            file=sys.stderr,
+        )
+
+    compressed = args.gzip or args.input.endswith(".gz")
+    # Running workers hear of the imported changes through the broker
+    await change_broker.connect()
+    try:
+        report = await import_preferences(
+            iter_lines(_read_file(args.input), gzip=compressed),
+            args.format,
+            args.batch_size,
+            progress=progress,
+        )
+    finally:
+        await change_broker.close()
+        await engine.dispose()
+
+    for error in report.errors:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(
+        f"Imported {report.imported} of {report.rows} rows in {report.elapsed:.2f}s "
+        f"({report.rows_per_second:.0f} rows/s), {report.rejected} rejected",
+        file=sys.stderr,
+    )
+    if not report.complete:
+        sys.exit("Import stopped early: the rest of the input could not be read")
+
+
+async def _backfill_documents(args: argparse.Namespace) -> None:
+    from .services.document_backfill import backfill_documents
+
+    def progress(users: int) -> None:
+        print(f"{users} users synced", file=sys.stderr)
+
+    try:
+        users = await backfill_documents(args.batch_size, progress=progress)
+    finally:
+        await engine.dispose()
+
+    print(f"Backfilled documents for {users} users", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Parse arguments and run the requested command."""
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Export all preferences")
+    export.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    export.add_argument("--gzip", action="store_true", help="Gzip the output")
+    export.add_argument("--output", "-o", help="Output file (default: stdout)")
+    export.add_argument("--batch-size", type=int, default=settings.stream_batch_size)
+    export.set_defaults(handler=_export)
+
+    import_ = commands.add_parser("import", help="Import preferences in the export format")
+    import_.add_argument("input", help="NDJSON or CSV file, optionally gzipped")
+    import_.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    import_.add_argument("--gzip", action="store_true", help="Input is gzipped")
+    import_.add_argument("--batch-size", type=int, default=settings.stream_batch_size)
+    import_.set_defaults(handler=_import)
+
+    backfill = commands.add_parser(
+        "backfill-documents",
+        help="Copy table rows newer than the consolidated documents into them",
+    )
+    backfill.add_argument("--batch-size", type=int, default=settings.stream_batch_size)
+    backfill.set_defaults(handler=_backfill_documents)
+
+    args = parser.parse_args(argv)
+    # Keep stdout clean for exported data
+    structlog.configure(logger_factory=structlog.PrintLoggerFactory(sys.stderr))
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,39 @@
 """Database configuration and session management."""
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+import itertools
+import time
+from typing import Callable
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
+from sqlalchemy.orm import DeclarativeBase, Session
 
 from .config import get_settings
 
 settings = get_settings()
+logger = structlog.get_logger()
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    # SQLite (used for tests and local benchmarks) does not take pool sizing
+    pool_options = (
+        {}
+        if url.startswith("sqlite")
+        else {
+            "pool_size": settings.database_pool_size,
+            "max_overflow": settings.database_max_overflow,
+        }
+    )
+    return create_async_engine(url, echo=settings.debug, **pool_options)
+
 
 # Create async engine
-engine = create_async_engine(
-    settings.database_url,
-    pool_size=settings.database_pool_size,
-    max_overflow=settings.database_max_overflow,
-    echo=settings.debug,
-)
+engine = _create_engine(settings.database_url)
 
 # Create async session factory
 async_session = async_sessionmaker(
@@ -21,6 +42,124 @@ async_session = async_sessionmaker(
     expire_on_commit=False,
 )
 
+# Read-only work runs in autocommit mode on the same pool: a lone SELECT
+# needs no BEGIN/COMMIT round trips, and the connection goes back to the
+# pool as soon as the statement finishes. Server-side cursors still need
+# a transaction, so streaming reads keep using async_session.
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+class ReplicaSet:
+    """Round-robin choice among read replicas, skipping failed ones.
+
+    A replica that raised a connection error is left out for
+    ``retry_seconds`` before it is tried again.
+    """
+
+    def __init__(self, engines: list[AsyncEngine], retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._failed_until: dict[AsyncEngine, float] = {}
+        self._next = itertools.cycle(engines)
+
+    def pick(self) -> AsyncEngine | None:
+        """Return the next healthy replica, or None to use the primary."""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            replica = next(self._next)
+            if self._failed_until.get(replica, 0.0) <= now:
+                return replica
+        return None
+
+    def mark_failed(self, replica: AsyncEngine) -> None:
+        self._failed_until[replica] = time.monotonic() + self.retry_seconds
+        logger.warning(
+            "Read replica failed, falling back to primary",
+            replica=replica.url.render_as_string(hide_password=True),
+            retry_seconds=self.retry_seconds,
+        )
+
+
+class RecentWrites:
+    """Users who wrote within the last ``window_seconds`` in this process.
+
+    Their reads go to the primary so they never see replica lag.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._expires: dict[str, float] = {}
+
+    def mark(self, user_id: str) -> None:
+        now = time.monotonic()
+        self._expires[user_id] = now + self.window_seconds
+        # Expired entries are dropped whenever the map grows large
+        if len(self._expires) > 10000:
+            self._expires = {u: t for u, t in self._expires.items() if t > now}
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._expires.get(user_id, 0.0) > time.monotonic()
+
+
+replicas = ReplicaSet(
+    [_create_engine(url) for url in settings.database_replica_urls],
+    retry_seconds=settings.replica_retry_seconds,
+)
+recent_writes = RecentWrites(settings.read_your_writes_seconds)
+
+
+def open_read_session(prefer_primary: bool = False) -> AsyncSession:
+    """Open an autocommit session on a healthy replica, or on the primary."""
+    if prefer_primary:
+        session = read_session()
+        # Tells the service to skip this process's cache, which another
+        # worker's write may have left stale
+        session.info["read_your_writes"] = True
+        return session
+    replica = replicas.pick()
+    if replica is None:
+        return read_session()
+    session = read_session(bind=replica.execution_options(isolation_level="AUTOCOMMIT"))
+    session.info["replica"] = replica
+    return session
+
+
+def open_stream_session() -> AsyncSession:
+    """Open a transactional session for server-side cursor reads.
+
+    Uses a healthy replica when one is configured.
+    """
+    replica = replicas.pick()
+    if replica is None:
+        return async_session()
+    session = async_session(bind=replica)
+    session.info["replica"] = replica
+    # Cursors need a transaction, so fall back to the transactional engine
+    session.info["primary"] = engine
+    return session
+
+
+async def fall_back_to_primary(session: AsyncSession) -> bool:
+    """Re-point a replica session at the primary after the replica failed.
+
+    Returns False if the session was not on a replica, in which case the
+    caller should re-raise.
+    """
+    replica = session.info.pop("replica", None)
+    if replica is None:
+        return False
+    replicas.mark_failed(replica)
+    await session.rollback()
+    primary = session.info.pop("primary", read_engine)
+    session.bind = primary
+    session.sync_session.bind = primary.sync_engine
+    return True
+
 
 class Base(DeclarativeBase):
     """Base class for SQLAlchemy models."""
@@ -28,13 +167,37 @@ class Base(DeclarativeBase):
 
 
 async def get_db() -> AsyncSession:
-    """Dependency to get database session."""
+    """Dependency to get database session.
+
+    No connection is checked out until the first statement runs, and
+    requests that never touched the database skip the commit.
+    """
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
+            if session.in_transaction():
+                await session.commit()
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
+
+
+def run_after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run a callback once the session's current transaction has committed.
+
+    Callbacks are discarded if the transaction rolls back instead.
+    """
+    session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session: Session) -> None:
+    for callback in session.info.pop("after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit_callbacks(session: Session) -> None:
+    session.info.pop("after_commit", None)
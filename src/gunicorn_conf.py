@@ -0,0 +1,56 @@
+"""Gunicorn settings for running the service with several worker processes.
+
+    gunicorn -c python:src.gunicorn_conf src.main:app
+
+Runs one uvicorn worker per CPU unless WEB_CONCURRENCY says otherwise
+(in containers with a CPU quota, set it to the quota). Workers share
+Prometheus samples through PROMETHEUS_MULTIPROC_DIR, and each sizes its
+connection pool to its share of DATABASE_MAX_CONNECTIONS (less the one
+connection its "postgres" change broker listens on). Writes reach the
+other workers' caches and streams through the change broker (see
+services/broker.py); with more than one worker and the "local" broker
+backend, the read cache is turned off.
+"""
+import os
+import shutil
+
+from .config import Settings
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+# Not get_settings(): workers are forked from this process and must load
+# their settings after WEB_CONCURRENCY is exported below
+_settings = Settings()
+
+workers = _settings.web_concurrency or _cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"{_settings.host}:{_settings.port}"
+# Slow shutdowns (draining streams) get this long before being killed
+graceful_timeout = 30
+accesslog = None
+
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-multiproc")
+
+# Only now: prometheus_client picks its storage when first imported, and
+# the workers forked from this process must see the directory set above.
+# Not imported inside child_exit either, which runs from a signal handler
+# and can interrupt that same import.
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server) -> None:
+    # Samples left by a previous run would be aggregated as live workers
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker) -> None:
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,204 @@
+"""Request, database and connection pool instrumentation.
+
+Requests are timed by an ASGI middleware and statements by SQLAlchemy
+cursor events, so neither the routes nor the queries need changes. Which
+``SettingsService`` method a statement belongs to is carried in a
+context variable set by ``db_operation``. Pool gauges are read from the
+engine's pool only when ``/metrics`` is scraped, except under multiple
+workers, where gauges must be written as they change (see ``metrics``).
+"""
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from .metrics import (
+    DB_QUERY_DURATION,
+    DB_ROWS,
+    MULTIPROCESS,
+    POOL_CHECKED_OUT,
+    POOL_CHECKOUT_WAIT,
+    POOL_OVERFLOW,
+    POOL_SIZE,
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+)
+
+# Anything else is reported as "OTHER" so clients cannot create label values
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+_operation: ContextVar[str] = ContextVar("db_operation", default="other")
+
+
+class _Children(dict):
+    """A metric's labelled children by label values.
+
+    ``labels()`` takes a lock and rebuilds the key on every call, which is
+    most of the cost of an observation; label sets are bounded, so each
+    child is looked up once and kept.
+    """
+
+    def __init__(self, metric):
+        super().__init__()
+        self.metric = metric
+
+    def __missing__(self, key: tuple):
+        child = self[key] = self.metric.labels(*key)
+        return child
+
+
+_request_latency = _Children(REQUEST_LATENCY)
+_query_duration = _Children(DB_QUERY_DURATION)
+_statement_rows = _Children(DB_ROWS)
+
+
+class MetricsMiddleware:
+    """Records latency per route template and the number of in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+        self.in_flight = 0
+        if not MULTIPROCESS:
+            # Read at scrape time; a plain counter avoids the gauge's lock
+            REQUESTS_IN_FLIGHT.set_function(lambda: self.in_flight)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight += 1
+        if MULTIPROCESS:
+            REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.in_flight -= 1
+            if MULTIPROCESS:
+                REQUESTS_IN_FLIGHT.dec()
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            method = scope["method"]
+            _request_latency[
+                method if method in HTTP_METHODS else "OTHER",
+                getattr(route, "path", "unmatched"),
+                status,
+            ].observe(time.perf_counter() - start)
+
+
+def db_operation(fn):
+    """Attribute the statements a service method issues to its name.
+
+    Works for coroutines and async generators; for the latter the name is
+    only set while the generator is producing its next item.
+    """
+    name = fn.__name__
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def generator(*args, **kwargs):
+            items = fn(*args, **kwargs)
+            try:
+                while True:
+                    token = _operation.set(name)
+                    try:
+                        item = await items.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    finally:
+                        _operation.reset(token)
+                    yield item
+            finally:
+                await items.aclose()
+
+        return generator
+
+    @functools.wraps(fn)
+    async def coroutine(*args, **kwargs):
+        token = _operation.set(name)
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            _operation.reset(token)
+
+    return coroutine
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    operation = _operation.get()
+    _query_duration[(operation,)].observe(time.perf_counter() - context._metrics_started_at)
+    # The async drivers buffer a whole result during execute; streamed
+    # results are only fetched later and are not counted
+    buffered = None
+    if not context.execution_options.get("stream_results"):
+        buffered = getattr(cursor, "_rows", None)
+
+    if context.isinsert or context.isupdate or context.isdelete:
+        # Some drivers report no rowcount for statements with RETURNING
+        rows = cursor.rowcount
+        if rows < 0 and buffered is not None:
+            rows = len(buffered)
+        if rows >= 0:
+            _statement_rows[operation, "affected"].observe(rows)
+    elif buffered is not None:
+        _statement_rows[operation, "returned"].observe(len(buffered))
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Time an engine's statements and export its pool state as ``name``."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+    pool = engine.pool
+    # Only queue pools have a size; SQLite's static and null pools do not
+    if not hasattr(pool, "checkedout"):
+        return
+    size = POOL_SIZE.labels(pool=name)
+    checked_out = POOL_CHECKED_OUT.labels(pool=name)
+    overflow = POOL_OVERFLOW.labels(pool=name)
+    if not MULTIPROCESS:
+        size.set_function(pool.size)
+        checked_out.set_function(pool.checkedout)
+        overflow.set_function(pool.overflow)
+        return
+
+    # Another worker may serve the scrape, so follow the pool's own
+    # accounting through its events instead
+    size.set(pool.size())
+    overflow.set(pool.overflow())
+    event.listen(pool, "checkout", lambda *args: checked_out.inc())
+    event.listen(pool, "checkin", lambda *args: checked_out.dec())
+    event.listen(pool, "connect", lambda *args: overflow.inc())
+    event.listen(pool, "close", lambda *args: overflow.dec())
+
+
+# A session's transaction is created before it asks the pool for a
+# connection and begins once it has one; the gap is the checkout wait.
+@event.listens_for(Session, "after_transaction_create")
+def _transaction_created(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        session.info["checkout_started_at"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_begin")
+def _transaction_began(session: Session, transaction, connection) -> None:
+    started_at = session.info.pop("checkout_started_at", None)
+    if started_at is not None:
+        POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started_at)
@@ -5,19 +5,42 @@ Associated Frontend Files:
   - web/app/src/pages/settings/NotificationSettings.tsx (notification settings UI)
   - web/app/src/config/notificationConfig.ts (notification API client)
 """
-from contextlib import asynccontextmanager
+import time
 
-import structlog
-from fastapi import FastAPI, Request, status
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from prometheus_client import make_asgi_app
+# Startup is timed from here: loading the configuration, then the rest of
+# the imports, then the database work in lifespan
+_started_at = time.perf_counter()
 
-from .config import get_settings
-from .database import engine, Base
-from .routes import health_router, settings_router
+from .config import get_settings  # noqa: E402
 
 settings = get_settings()
+_config_loaded_at = time.perf_counter()
+
+from contextlib import asynccontextmanager  # noqa: E402
+
+import structlog  # noqa: E402
+from fastapi import FastAPI, Request, status  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from prometheus_client import make_asgi_app  # noqa: E402
+
+from .database import engine, replicas, Base  # noqa: E402
+from .instrumentation import MetricsMiddleware, instrument_engine  # noqa: E402
+from .metrics import collector_registry  # noqa: E402
+from .routes import health_router, settings_router  # noqa: E402
+from .services.broker import change_broker  # noqa: E402
+from .services.notification_types import notification_registry  # noqa: E402
+from .services.outbox import outbox_relay  # noqa: E402
+from .startup import (  # noqa: E402
+    StartupTimer,
+    check_audience_indexes,
+    check_schema_revision,
+    warm_up_pools,
+)
+
+startup_timer = StartupTimer(_started_at)
+startup_timer.mark("config", at=_config_loaded_at)
+startup_timer.mark("imports")
 
 # Configure structured logging
 structlog.configure(
@@ -51,15 +74,33 @@ async def lifespan(app: FastAPI):
         version=settings.app_version,
     )
 
-    # Create database tables (for development - use migrations in production)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    check_audience_indexes(notification_registry)
+    if settings.database_schema_startup == "create_all":
+        # Development only; deployments migrate with Alembic
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    elif settings.database_schema_startup == "check":
+        await check_schema_revision(engine)
+    startup_timer.mark("database_check")
+
+    await warm_up_pools()
+    startup_timer.mark("warm_up")
+    startup_timer.report()
+
+    await change_broker.connect()
+    if outbox_relay is not None:
+        outbox_relay.start()
 
     yield
 
     # Shutdown
     logger.info("Shutting down User Preferences service")
+    await change_broker.close()
+    if outbox_relay is not None:
+        await outbox_relay.stop()
     await engine.dispose()
+    for replica in replicas.engines:
+        await replica.dispose()
 
 
 # Create FastAPI application
@@ -76,7 +117,9 @@ app = FastAPI(
 
     ## Authentication
 
-    All endpoints require the `X-User-ID` header (set by API Gateway after JWT validation).
+    User endpoints require the `X-User-ID` header (set by API Gateway after JWT validation).
+    Internal (service-to-service) endpoints instead require a bearer JWT signed with the
+    shared secret whose `scope` includes `preferences:internal`.
     """,
     version=settings.app_version,
     lifespan=lifespan,
@@ -91,8 +134,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request metrics; added last so it also times the other middleware
+app.add_middleware(MetricsMiddleware)
+
+# Statement timings and pool gauges for every engine
+instrument_engine(engine, "primary")
+for number, replica in enumerate(replicas.engines):
+    instrument_engine(replica, f"replica-{number}")
+
 # Mount Prometheus metrics endpoint
-metrics_app = make_asgi_app()
+metrics_app = make_asgi_app(collector_registry())
 app.mount("/metrics", metrics_app)
 
 
@@ -0,0 +1,149 @@
+"""Prometheus metrics exported through the /metrics mount.
+
+Under gunicorn every worker writes its samples to files in
+``PROMETHEUS_MULTIPROC_DIR`` and ``/metrics`` aggregates them, whichever
+worker serves the scrape. Gauges state how their per-worker values are
+combined; "live" modes drop workers that have exited.
+"""
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Read cache
+CACHE_HITS = Counter(
+    "preferences_cache_hits_total",
+    "Preference reads served from the in-process cache",
+    ["section"],
+)
+CACHE_MISSES = Counter(
+    "preferences_cache_misses_total",
+    "Preference reads that had to query the database",
+    ["section"],
+)
+CACHE_EVICTIONS = Counter(
+    "preferences_cache_evictions_total",
+    "Entries removed from the in-process cache",
+    ["reason"],
+)
+
+# Request coalescing
+SINGLEFLIGHT_COALESCED = Counter(
+    "preferences_singleflight_coalesced_total",
+    "Reads that shared another in-flight query for the same user and section",
+    ["section"],
+)
+
+# HTTP requests, labelled by route template (never by user or raw path)
+REQUEST_LATENCY = Histogram(
+    "preferences_http_request_duration_seconds",
+    "Time from receiving a request to finishing its response",
+    ["method", "route", "status"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "preferences_http_requests_in_flight",
+    "Requests currently being handled",
+    multiprocess_mode="livesum",
+)
+
+# Database statements, labelled by the SettingsService method issuing them
+DB_QUERY_DURATION = Histogram(
+    "preferences_db_query_duration_seconds",
+    "Time spent executing a SQL statement",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0),
+)
+DB_ROWS = Histogram(
+    "preferences_db_rows",
+    "Rows returned by a query or affected by a write, per statement",
+    ["operation", "kind"],
+    buckets=(0, 1, 3, 10, 100, 1000, 10000),
+)
+
+# Connection pool
+POOL_CHECKOUT_WAIT = Histogram(
+    "preferences_db_pool_checkout_wait_seconds",
+    "Time a session waited for a pooled connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+POOL_SIZE = Gauge(
+    "preferences_db_pool_size",
+    "Configured number of persistent connections",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_CHECKED_OUT = Gauge(
+    "preferences_db_pool_checked_out",
+    "Connections currently checked out",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+POOL_OVERFLOW = Gauge(
+    "preferences_db_pool_overflow",
+    "Connections open beyond the pool size (negative while the pool fills)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+# Server-sent event streams of preference changes
+STREAM_SUBSCRIBERS = Gauge(
+    "preferences_stream_subscribers",
+    "Open /stream connections",
+    multiprocess_mode="livesum",
+)
+STREAM_RESYNCS = Counter(
+    "preferences_stream_resyncs_total",
+    "Times a stream fell too far behind and its queued changes were dropped",
+)
+BROKER_DISCONNECTS = Counter(
+    "preferences_broker_disconnects_total",
+    "Times the shared change broker lost its connection (streams resync)",
+)
+
+# Change event outbox
+OUTBOX_BATCH_SIZE = Histogram(
+    "preferences_outbox_batch_size",
+    "Events published per relay batch",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000),
+)
+OUTBOX_PUBLISH_LAG = Histogram(
+    "preferences_outbox_publish_lag_seconds",
+    "Time from a change committing to its event being published",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+OUTBOX_BACKLOG = Gauge(
+    "preferences_outbox_backlog",
+    "Events in the outbox not yet published, as of the last count",
+    multiprocess_mode="livemax",
+)
+OUTBOX_PUBLISH_FAILURES = Counter(
+    "preferences_outbox_publish_failures_total",
+    "Relay batches the sink failed to accept (retried on the next pass)",
+)
+
+# Startup
+STARTUP_DURATION = Gauge(
+    "preferences_startup_phase_seconds",
+    "Time a worker spent in each startup phase (the slowest live worker)",
+    ["phase"],
+    multiprocess_mode="livemax",
+)
+
+
+def collector_registry() -> CollectorRegistry:
+    """Registry for /metrics: every worker's samples, or this process's."""
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
@@ -2,5 +2,13 @@
 from .user_settings import UserSettings
 from .notification_preferences import NotificationPreferences
 from .theme_settings import ThemeSettings
+from .user_preferences import UserPreferences
+from .outbox_event import OutboxEvent
 
-__all__ = ["UserSettings", "NotificationPreferences", "ThemeSettings"]
+__all__ = [
+    "UserSettings",
+    "NotificationPreferences",
+    "ThemeSettings",
+    "UserPreferences",
+    "OutboxEvent",
+]
@@ -1,47 +1,79 @@
 """Notification preferences model."""
-import uuid
 from datetime import datetime
-from sqlalchemy import String, Boolean, DateTime, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Integer, String, DateTime, Index, func, text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..database import Base
 
+# Bits of the notification types with a partial audience index, and
+# whether each is on by default: the four built-in channels (migration
+# 010). Audience queries for other types scan the whole table. Startup
+# fails if the registry's defaults no longer match these.
+AUDIENCE_INDEX_BITS = {0: False, 1: True, 2: False, 3: True}
+
+
+def audience_indexes(table: str) -> list[Index]:
+    """Partial indexes of the users each indexed type is on for.
+
+    Predicates must stay the condition audience queries build
+    (``_notification_enabled``), with the mask inlined, or the planner
+    cannot use them.
+    """
+    indexes = []
+    for bit, default in AUDIENCE_INDEX_BITS.items():
+        enabled = f"(enabled_mask & {1 << bit}) != 0"
+        predicate = text(f"{enabled} OR (set_mask & {1 << bit}) = 0" if default else enabled)
+        indexes.append(
+            Index(
+                f"ix_{table}_audience_bit{bit}",
+                "user_id",
+                postgresql_where=predicate,
+                sqlite_where=predicate,
+            )
+        )
+    return indexes
+
 
 class NotificationPreferences(Base):
     """User notification preferences."""
 
     __tablename__ = "notification_preferences"
-
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True),
-        primary_key=True,
-        default=uuid.uuid4,
+    __table_args__ = (
+        # Range scans for the /changes feed
+        Index("ix_notification_preferences_change_version", "change_version", "user_id"),
+        # Users a notification type is on for (/audience)
+        *audience_indexes("notification_preferences"),
     )
+
     user_id: Mapped[str] = mapped_column(
         String(255),
-        unique=True,
-        nullable=False,
-        index=True,
+        primary_key=True,
     )
-    email_enabled: Mapped[bool] = mapped_column(
-        Boolean,
-        default=False,
+    # Bits of notification types (see services/notification_types.py):
+    # those the user chose, and which of them are on
+    enabled_mask: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
         nullable=False,
     )
-    push_enabled: Mapped[bool] = mapped_column(
-        Boolean,
-        default=True,
+    set_mask: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
         nullable=False,
     )
-    assignments_enabled: Mapped[bool] = mapped_column(
-        Boolean,
-        default=False,
+    version: Mapped[int] = mapped_column(
+        Integer,
+        default=1,
+        server_default="1",
         nullable=False,
     )
-    skill_updates_enabled: Mapped[bool] = mapped_column(
-        Boolean,
-        default=True,
+    # Transaction that last changed the row, for the /changes feed
+    change_version: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
         nullable=False,
     )
     created_at: Mapped[datetime] = mapped_column(
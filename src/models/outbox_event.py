@@ -0,0 +1,45 @@
+"""Transactional outbox of preference changes."""
+from datetime import datetime
+from sqlalchemy import JSON, BigInteger, Integer, String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+
+
+class OutboxEvent(Base):
+    """A committed preference change waiting to be published downstream.
+
+    Written in the same transaction as the change itself and deleted by
+    the relay (``services.outbox``) once the sink has accepted it.
+    """
+
+    __tablename__ = "preference_outbox"
+    # Published rows are deleted; never hand their ids out again
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    # SQLite only auto-increments INTEGER PRIMARY KEY columns
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    user_id: Mapped[str] = mapped_column(
+        String(255),
+        nullable=False,
+    )
+    section: Mapped[str] = mapped_column(
+        String(20),
+        nullable=False,
+    )
+    version: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+    changes: Mapped[dict] = mapped_column(
+        JSON,
+        nullable=False,
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
@@ -0,0 +1,119 @@
+"""Consolidated per-user preferences model."""
+from datetime import datetime
+from sqlalchemy import BigInteger, Integer, String, DateTime, Index, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database import Base
+from .notification_preferences import audience_indexes
+
+
+class UserPreferences(Base):
+    """All of a user's preferences in one row.
+
+    Used instead of the per-section tables when ``preferences_storage`` is
+    ``document`` (and alongside them when it is ``dual``). Each section
+    keeps its own version; a version of 0 means the user never saved that
+    section and its columns hold the defaults.
+    """
+
+    __tablename__ = "user_preferences"
+    __table_args__ = (
+        # Range scans for the /changes feed
+        Index("ix_user_preferences_change_version", "change_version", "user_id"),
+        # Users in a set of timezones, for local-time scheduled sends
+        Index("ix_user_preferences_timezone", "timezone", "user_id"),
+        # Users a notification type is on for (/audience)
+        *audience_indexes("user_preferences"),
+    )
+
+    user_id: Mapped[str] = mapped_column(
+        String(255),
+        primary_key=True,
+    )
+
+    # General settings
+    language: Mapped[str] = mapped_column(
+        String(10),
+        default="en",
+        server_default="en",
+        nullable=False,
+    )
+    timezone: Mapped[str] = mapped_column(
+        String(50),
+        default="UTC",
+        server_default="UTC",
+        nullable=False,
+    )
+    locale: Mapped[str] = mapped_column(
+        String(10),
+        default="en-US",
+        server_default="en-US",
+        nullable=False,
+    )
+    settings_version: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+
+    # Notification preferences: bits of notification types (see
+    # services/notification_types.py) the user chose, and which are on
+    enabled_mask: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+    set_mask: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+    notifications_version: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+
+    # Theme settings
+    mode: Mapped[str] = mapped_column(
+        String(10),
+        default="system",
+        server_default="system",
+        nullable=False,
+    )
+    accent_color: Mapped[str] = mapped_column(
+        String(20),
+        default="#3b82f6",
+        server_default="#3b82f6",
+        nullable=False,
+    )
+    theme_version: Mapped[int] = mapped_column(
+        Integer,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+
+    # Transaction that last changed the row, for the /changes feed
+    change_version: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
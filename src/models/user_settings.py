@@ -1,8 +1,6 @@
 """User general settings model."""
-import uuid
 from datetime import datetime
-from sqlalchemy import String, DateTime, func
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Index, Integer, String, DateTime, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from ..database import Base
@@ -12,17 +10,16 @@ class UserSettings(Base):
     """User general settings (language, timezone, locale)."""
 
     __tablename__ = "user_settings"
-
-    id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True),
-        primary_key=True,
-        default=uuid.uuid4,
+    __table_args__ = (
+        # Range scans for the /changes feed
+        Index("ix_user_settings_change_version", "change_version", "user_id"),
+        # Users in a set of timezones, for local-time scheduled sends
+        Index("ix_user_settings_timezone", "timezone", "user_id"),
     )
+
     user_id: Mapped[str] = mapped_column(
         String(255),
-        unique=True,
-        nullable=False,
-        index=True,
+        primary_key=True,
     )
     language: Mapped[str] = mapped_column(
         String(10),
@@ -39,6 +36,19 @@ class UserSettings(Base):
         default="en-US",
         nullable=False,
     )
+    version: Mapped[int] = mapped_column(
+        Integer,
+        default=1,
+        server_default="1",
+        nullable=False,
+    )
+    # Transaction that last changed the row, for the /changes feed
+    change_version: Mapped[int] = mapped_column(
+        BigInteger,
+        default=0,
+        server_default="0",
+        nullable=False,
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
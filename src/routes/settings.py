@@ -5,21 +5,63 @@ Associated Frontend Files:
   - web/app/src/pages/settings/NotificationSettings.tsx (notification toggle UI)
   - web/app/src/config/notificationConfig.ts (API calls for notifications)
 """
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+import asyncio
+import json
+import math
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..config import get_settings as get_app_settings
+from ..database import (
+    get_db,
+    open_read_session,
+    open_stream_session,
+    recent_writes,
+)
 from ..schemas import (
+    AllPreferencesResponse,
+    BatchPreferencesRequest,
     UserSettingsResponse,
     UserSettingsUpdate,
     NotificationSettingsResponse,
     NotificationPreferencesUpdate,
+    NotifyDecisionRequest,
     ThemeSettingsResponse,
     ThemeSettingsUpdate,
 )
-from ..services import SettingsService
+from ..services import (
+    ChangeCursor,
+    InvalidTimezoneError,
+    PreconditionFailedError,
+    SettingsService,
+)
+from ..services.broker import change_broker
+from ..services.bulk_import import ImportFormat, import_preferences, iter_lines
+from ..services.encoding import (
+    DecisionFormat,
+    encode_change,
+    encode_decisions,
+    encode_preferences,
+    encode_section,
+    encode_sections,
+)
+from ..services.export import ExportFormat, export_preferences
+from ..services.notification_types import notification_registry
+from ..services.timezones import window_hours
 
 router = APIRouter(prefix="/api/v1/user-preferences", tags=["User Preferences"])
+app_settings = get_app_settings()
+
+# Set after every write so that, for the read-your-writes window, the
+# client's reads go to the primary and skip the per-process cache, which
+# a write handled by another worker may have left stale
+RECENT_WRITE_COOKIE = "prefs_recent_write"
+
+# Scope a service token needs for the internal (service-to-service) endpoints
+INTERNAL_SCOPE = "preferences:internal"
 
 
 async def get_user_id(x_user_id: str = Header(None, alias="X-User-ID")) -> str:
@@ -37,6 +79,173 @@ async def get_user_id(x_user_id: str = Header(None, alias="X-User-ID")) -> str:
     return x_user_id
 
 
+async def require_internal_caller(
+    authorization: str | None = Header(None, alias="Authorization"),
+) -> str:
+    """Check the service token of an internal caller and return its subject.
+
+    Internal endpoints read or write every user's preferences, so instead
+    of X-User-ID they take a bearer JWT signed with the shared
+    ``jwt_secret`` whose ``scope`` includes ``preferences:internal``.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    try:
+        if scheme.lower() != "bearer" or not token:
+            raise JWTError("Missing bearer token")
+        claims = jwt.decode(
+            token, app_settings.jwt_secret, algorithms=[app_settings.jwt_algorithm]
+        )
+    except JWTError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={
+                "error": {
+                    "code": "UNAUTHORIZED",
+                    "message": "A valid service token is required",
+                }
+            },
+        ) from exc
+    if INTERNAL_SCOPE not in str(claims.get("scope", "")).split():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail={
+                "error": {
+                    "code": "FORBIDDEN",
+                    "message": f"The service token lacks the {INTERNAL_SCOPE} scope",
+                }
+            },
+        )
+    return claims.get("sub", "")
+
+
+async def get_user_read_db(
+    request: Request, user_id: str = Depends(get_user_id)
+) -> AsyncSession:
+    """Read session for a user's own preferences.
+
+    Served by a replica (and the cache) unless the user wrote recently, in
+    which case the primary is read directly so the write is always
+    visible, with or without replicas.
+    """
+    prefer_primary = RECENT_WRITE_COOKIE in request.cookies or user_id in recent_writes
+    async with open_read_session(prefer_primary=prefer_primary) as session:
+        yield session
+
+
+def _json(body: bytes, response: Response) -> Response:
+    """Send a pre-encoded JSON body with the headers set on ``response``.
+
+    Returning a Response makes FastAPI skip ``response_model`` validation
+    and encoding, which the bodies built by the service do not need.
+    """
+    encoded = Response(content=body, media_type="application/json")
+    encoded.headers.raw.extend(response.headers.raw)
+    return encoded
+
+
+def _etag_suffix(section: str) -> str:
+    # Notification responses also depend on the registered types
+    if section in ("notifications", "all"):
+        return f"-{notification_registry.fingerprint}"
+    return ""
+
+
+def _etag_value(section: str, version: int | str) -> str:
+    """Unquoted ETag of a section at a given row version."""
+    return f"{section}-{version}{_etag_suffix(section)}"
+
+
+def make_etag(section: str, version: int | str) -> str:
+    """Strong ETag for a section at a given row version."""
+    return f'"{_etag_value(section, version)}"'
+
+
+def _etag_listed(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists the ETag (or ``*``)."""
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _precondition_failed(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail={
+            "error": {
+                "code": "PRECONDITION_FAILED",
+                "message": message,
+            }
+        },
+    )
+
+
+def _expected_version(if_match: str | None, section: str) -> int | None:
+    """Version a PUT's If-Match header requires, or None if unconditional.
+
+    ETags from before a notification registry change match no version.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    prefix = f'"{section}-'
+    suffix = f'{_etag_suffix(section)}"'
+    etag = if_match.strip()
+    if etag.startswith(prefix) and etag.endswith(suffix):
+        version = etag[len(prefix):-len(suffix)]
+        if version.isdigit():
+            return int(version)
+    raise _precondition_failed("If-Match does not match any version of this resource")
+
+
+async def _conditional_get(
+    service: SettingsService,
+    user_id: str,
+    section: str,
+    if_none_match: str | None,
+    response: Response,
+):
+    """Serve a section, or 304 if the client's ETag is still current.
+
+    The ETag check only needs the row version, which comes from the cache
+    or a version-only query rather than loading the full row.
+    """
+    if if_none_match:
+        etag = make_etag(section, await service.get_section_version(user_id, section))
+        if _etag_listed(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    current = await service.get_section(user_id, section)
+    response.headers["ETag"] = make_etag(section, current.version)
+    return _json(encode_section(section, current), response)
+
+
+async def _conditional_put(
+    service: SettingsService,
+    user_id: str,
+    section: str,
+    update,
+    if_match: str | None,
+    response: Response,
+):
+    """Apply an update, honouring If-Match for optimistic concurrency.
+
+    Returns the written section; the caller encodes the response.
+    """
+    try:
+        written = await service.put_section(
+            user_id, section, update, _expected_version(if_match, section)
+        )
+    except PreconditionFailedError as exc:
+        raise _precondition_failed(str(exc)) from exc
+
+    response.headers["ETag"] = make_etag(section, written.version)
+    response.set_cookie(
+        RECENT_WRITE_COOKIE,
+        "1",
+        max_age=math.ceil(app_settings.read_your_writes_seconds),
+        httponly=True,
+    )
+    return written
+
+
 # ============================================
 # General Settings Endpoints
 # ============================================
@@ -44,23 +253,64 @@ async def get_user_id(x_user_id: str = Header(None, alias="X-User-ID")) -> str:
 
 @router.get("", response_model=UserSettingsResponse)
 async def get_settings(
+    response: Response,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    db: AsyncSession = Depends(get_user_read_db),
 ) -> UserSettingsResponse:
     """Get user's general settings (language, timezone, locale)."""
     service = SettingsService(db)
-    return await service.get_user_settings(user_id)
+    return await _conditional_get(service, user_id, "settings", if_none_match, response)
 
 
 @router.put("", response_model=UserSettingsResponse)
 async def update_settings(
     update: UserSettingsUpdate,
+    response: Response,
     user_id: str = Depends(get_user_id),
+    if_match: str | None = Header(None, alias="If-Match"),
     db: AsyncSession = Depends(get_db),
 ) -> UserSettingsResponse:
     """Update user's general settings."""
     service = SettingsService(db)
-    return await service.update_user_settings(user_id, update)
+    try:
+        written = await _conditional_put(
+            service, user_id, "settings", update, if_match, response
+        )
+    except InvalidTimezoneError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "INVALID_TIMEZONE",
+                    "message": f"{exc}; expected an IANA name such as 'Europe/Paris'",
+                }
+            },
+        ) from exc
+    return _json(encode_section("settings", written), response)
+
+
+# ============================================
+# Combined Endpoints
+# ============================================
+
+
+@router.get("/all", response_model=AllPreferencesResponse)
+async def get_all_preferences(
+    response: Response,
+    user_id: str = Depends(get_user_id),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    db: AsyncSession = Depends(get_user_read_db),
+) -> AllPreferencesResponse:
+    """Get general, notification and theme settings in a single request."""
+    service = SettingsService(db)
+    sections = await service.get_all_sections(user_id)
+    etag = make_etag("all", ".".join(str(s.version) for s in sections.values()))
+    if if_none_match and _etag_listed(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return _json(encode_sections(sections), response)
 
 
 # ============================================
@@ -70,24 +320,32 @@ async def update_settings(
 
 @router.get("/notifications", response_model=NotificationSettingsResponse)
 async def get_notification_settings(
+    response: Response,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    db: AsyncSession = Depends(get_user_read_db),
 ) -> NotificationSettingsResponse:
     """Get notification settings with available items and user preferences."""
     service = SettingsService(db)
-    return await service.get_notification_settings(user_id)
+    return await _conditional_get(
+        service, user_id, "notifications", if_none_match, response
+    )
 
 
 @router.put("/notifications")
 async def update_notification_settings(
     update: NotificationPreferencesUpdate,
+    response: Response,
     user_id: str = Depends(get_user_id),
+    if_match: str | None = Header(None, alias="If-Match"),
     db: AsyncSession = Depends(get_db),
 ):
     """Update notification preferences."""
     service = SettingsService(db)
-    preferences = await service.update_notification_settings(user_id, update)
-    return {"preferences": preferences}
+    written = await _conditional_put(
+        service, user_id, "notifications", update, if_match, response
+    )
+    return _json(encode_preferences(written.value.preferences), response)
 
 
 # ============================================
@@ -97,18 +355,22 @@ async def update_notification_settings(
 
 @router.get("/theme", response_model=ThemeSettingsResponse)
 async def get_theme_settings(
+    response: Response,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
+    db: AsyncSession = Depends(get_user_read_db),
 ) -> ThemeSettingsResponse:
     """Get user's theme settings (mode, accent color)."""
     service = SettingsService(db)
-    return await service.get_theme_settings(user_id)
+    return await _conditional_get(service, user_id, "theme", if_none_match, response)
 
 
 @router.put("/theme", response_model=ThemeSettingsResponse)
 async def update_theme_settings(
     update: ThemeSettingsUpdate,
+    response: Response,
     user_id: str = Depends(get_user_id),
+    if_match: str | None = Header(None, alias="If-Match"),
     db: AsyncSession = Depends(get_db),
 ) -> ThemeSettingsResponse:
     """Update user's theme settings."""
@@ -125,4 +387,270 @@ async def update_theme_settings(
         )
 
     service = SettingsService(db)
-    return await service.update_theme_settings(user_id, update)
+    written = await _conditional_put(service, user_id, "theme", update, if_match, response)
+    return _json(encode_section("theme", written), response)
+
+
+# ============================================
+# Change Stream Endpoints
+# ============================================
+
+
+@router.get("/stream")
+async def stream_preference_changes(
+    user_id: str = Depends(get_user_id),
+) -> StreamingResponse:
+    """Push the user's preference changes as server-sent events.
+
+    Each ``change`` event carries the section, its new version (the
+    section's ETag, unquoted, is the event id) and only the fields that
+    were set. A ``resync`` event means the client fell behind
+    and changes were dropped, so it should re-read its preferences.
+    Comment lines are sent while idle to keep the connection open.
+
+    Behind several workers with the local broker backend, writes handled
+    by other workers never reach this stream; idle periods then end with a
+    ``resync`` instead of a comment, so clients re-read at least that often.
+    """
+    partial = (
+        not change_broker.backend.shared and (app_settings.web_concurrency or 1) > 1
+    )
+
+    async def events():
+        with change_broker.subscribe(user_id) as subscription:
+            while True:
+                try:
+                    change = await asyncio.wait_for(
+                        subscription.get(), app_settings.stream_heartbeat_seconds
+                    )
+                except asyncio.TimeoutError:
+                    yield b"event: resync\ndata: {}\n\n" if partial else b": keep-alive\n\n"
+                    continue
+                if change is None:
+                    yield b"event: resync\ndata: {}\n\n"
+                else:
+                    yield b"id: %s\nevent: change\ndata: %s\n\n" % (
+                        _etag_value(change.section, change.version).encode(),
+                        encode_change(change),
+                    )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ============================================
+# Internal (service-to-service) Endpoints
+# ============================================
+
+
+@router.post("/batch", dependencies=[Depends(require_internal_caller)])
+async def get_preferences_batch(request: BatchPreferencesRequest) -> StreamingResponse:
+    """Stream preferences for many users as NDJSON, one user per line.
+
+    Intended for internal callers such as the notification dispatcher.
+    """
+    if len(request.user_ids) > app_settings.batch_max_user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "BATCH_TOO_LARGE",
+                    "message": (
+                        f"At most {app_settings.batch_max_user_ids} user_ids "
+                        "may be requested at once"
+                    ),
+                }
+            },
+        )
+
+    async def stream():
+        # The response outlives the request's dependencies, so the stream
+        # owns its session.
+        async with open_read_session() as db:
+            service = SettingsService(db)
+            async for chunk in service.iter_preferences_batch(
+                request.user_ids,
+                request.sections,
+                chunk_size=app_settings.batch_chunk_size,
+            ):
+                yield "".join(json.dumps(item) + "\n" for item in chunk)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/audience/{channel}", dependencies=[Depends(require_internal_caller)])
+async def stream_notification_audience(channel: str) -> StreamingResponse:
+    """Stream every user_id opted into a notification channel as NDJSON.
+
+    Users without saved notification preferences count according to the
+    channel's default.
+    """
+    if channel not in notification_registry:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error": {
+                    "code": "UNKNOWN_CHANNEL",
+                    "message": f"Unknown notification channel '{channel}'",
+                }
+            },
+        )
+
+    async def stream():
+        async with open_stream_session() as db:
+            service = SettingsService(db)
+            async for user_ids in service.iter_notification_audience(
+                channel, batch_size=app_settings.stream_batch_size
+            ):
+                yield "".join(
+                    json.dumps({"user_id": user_id}) + "\n" for user_id in user_ids
+                )
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/local-hours", dependencies=[Depends(require_internal_caller)])
+async def stream_users_at_local_hours(
+    start: int = Query(ge=0, le=23),
+    end: int | None = Query(None, ge=1, le=24),
+) -> StreamingResponse:
+    """Stream every user_id whose local time is now in [start, end) as NDJSON.
+
+    Hours are local to each user's timezone; ``end`` defaults to
+    ``start + 1`` and a window ending at or before ``start`` wraps past
+    midnight. Users without saved general settings are on UTC.
+    """
+    hours = window_hours(start, start + 1 if end is None else end)
+
+    async def stream():
+        async with open_stream_session() as db:
+            service = SettingsService(db)
+            async for user_ids in service.iter_users_at_local_hours(
+                hours, batch_size=app_settings.stream_batch_size
+            ):
+                yield "".join(
+                    json.dumps({"user_id": user_id}) + "\n" for user_id in user_ids
+                )
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.post("/should-notify", dependencies=[Depends(require_internal_caller)])
+async def decide_notifications(
+    request: NotifyDecisionRequest,
+    fmt: DecisionFormat = Query("bitmap", alias="format"),
+) -> Response:
+    """Decide which (user_ids[i], keys[i]) pairs may be notified.
+
+    Returns a bitmap with one bit per pair, or with ``format=pairs`` the
+    list of allowed pairs. Users without saved notification preferences
+    get each type's default.
+    """
+    if len(request.user_ids) > app_settings.notify_max_pairs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "BATCH_TOO_LARGE",
+                    "message": (
+                        f"At most {app_settings.notify_max_pairs} pairs "
+                        "may be decided at once"
+                    ),
+                }
+            },
+        )
+    unknown = set(request.keys).difference(notification_registry.key_masks)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "UNKNOWN_CHANNEL",
+                    "message": f"Unknown notification channel '{min(unknown)}'",
+                }
+            },
+        )
+
+    async with open_read_session() as db:
+        allowed = await SettingsService(db).should_notify(
+            request.user_ids, request.keys, chunk_size=app_settings.notify_chunk_size
+        )
+    return Response(
+        content=encode_decisions(allowed, request.user_ids, request.keys, fmt),
+        media_type="application/json",
+    )
+
+
+@router.get("/export", dependencies=[Depends(require_internal_caller)])
+async def export_all_preferences(
+    fmt: ExportFormat = Query("ndjson", alias="format"),
+    gzip: bool = False,
+) -> StreamingResponse:
+    """Stream every user's merged preferences as NDJSON or CSV."""
+    filename = f"preferences.{fmt}" + (".gz" if gzip else "")
+    media_type = {"ndjson": "application/x-ndjson", "csv": "text/csv"}[fmt]
+    return StreamingResponse(
+        export_preferences(fmt, gzip, batch_size=app_settings.stream_batch_size),
+        media_type="application/gzip" if gzip else media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/changes", dependencies=[Depends(require_internal_caller)])
+async def get_preference_changes(
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1),
+):
+    """Page through the sections changed since a cursor, oldest first.
+
+    For services mirroring preferences: start without a cursor and follow
+    ``next_cursor`` while ``has_more`` is true; polling later with the last
+    cursor returns only what changed since.
+    """
+    try:
+        after = ChangeCursor.decode(cursor) if cursor is not None else None
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "INVALID_CURSOR",
+                    "message": "cursor must be a next_cursor returned by this endpoint",
+                }
+            },
+        ) from exc
+
+    async with open_read_session() as db:
+        page = await SettingsService(db).get_changes(
+            after, min(limit or app_settings.changes_page_size, app_settings.changes_page_size)
+        )
+    return {
+        "items": page.items,
+        "next_cursor": page.cursor.encode() if page.cursor is not None else None,
+        "has_more": page.has_more,
+    }
+
+
+@router.post("/import", dependencies=[Depends(require_internal_caller)])
+async def import_all_preferences(
+    request: Request,
+    fmt: ImportFormat = Query("ndjson", alias="format"),
+    content_encoding: str | None = Header(None, alias="Content-Encoding"),
+):
+    """Bulk import preferences sent as NDJSON or CSV in the export format.
+
+    The body is streamed, validated and loaded in batches; invalid rows
+    are reported in the response instead of failing the import. A body
+    that stops being readable (corrupt gzip, non-UTF-8 text) ends the
+    import there, with ``complete`` false in the report.
+    """
+    report = await import_preferences(
+        iter_lines(request.stream(), gzip=content_encoding == "gzip"),
+        fmt,
+        batch_size=app_settings.stream_batch_size,
+    )
+    return report.to_dict()
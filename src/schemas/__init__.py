@@ -7,6 +7,10 @@ from .settings import (
     NotificationItem,
     ThemeSettingsResponse,
     ThemeSettingsUpdate,
+    AllPreferencesResponse,
+    BatchPreferencesRequest,
+    NotifyDecisionRequest,
+    PreferenceSection,
 )
 
 __all__ = [
@@ -17,4 +21,8 @@ __all__ = [
     "NotificationItem",
     "ThemeSettingsResponse",
     "ThemeSettingsUpdate",
+    "AllPreferencesResponse",
+    "BatchPreferencesRequest",
+    "NotifyDecisionRequest",
+    "PreferenceSection",
 ]
@@ -1,6 +1,8 @@
 """Pydantic schemas for settings endpoints."""
 from typing import Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+PreferenceSection = Literal["settings", "notifications", "theme"]
 
 
 class UserSettingsResponse(BaseModel):
@@ -75,3 +77,43 @@ class ThemeSettingsUpdate(BaseModel):
 
     class Config:
         populate_by_name = True
+
+
+class AllPreferencesResponse(BaseModel):
+    """Response schema for all of a user's preferences."""
+
+    settings: UserSettingsResponse = Field(description="General settings")
+    notifications: NotificationSettingsResponse = Field(
+        description="Notification settings"
+    )
+    theme: ThemeSettingsResponse = Field(description="Theme settings")
+
+
+class BatchPreferencesRequest(BaseModel):
+    """Request schema for looking up many users' preferences at once."""
+
+    user_ids: list[str] = Field(min_length=1, description="Users to look up")
+    sections: set[PreferenceSection] | None = Field(
+        default=None,
+        description="Sections to include (default: all)",
+    )
+
+
+class NotifyDecisionRequest(BaseModel):
+    """Request schema for deciding many (user, notification type) pairs.
+
+    Pairs are given as two aligned lists: pair ``i`` is ``user_ids[i]``
+    with ``keys[i]``.
+    """
+
+    user_ids: list[str] = Field(min_length=1, description="User of each pair")
+    keys: list[str] = Field(
+        min_length=1,
+        description="Notification type key of each pair",
+    )
+
+    @model_validator(mode="after")
+    def _aligned(self) -> "NotifyDecisionRequest":
+        if len(self.user_ids) != len(self.keys):
+            raise ValueError("user_ids and keys must have the same length")
+        return self
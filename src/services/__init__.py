@@ -1,4 +1,18 @@
 """Business logic services."""
-from .settings_service import SettingsService
+from .settings_service import (
+    ChangeCursor,
+    ChangesPage,
+    PreconditionFailedError,
+    SettingsService,
+    Versioned,
+)
+from .timezones import InvalidTimezoneError
 
-__all__ = ["SettingsService"]
+__all__ = [
+    "ChangeCursor",
+    "ChangesPage",
+    "InvalidTimezoneError",
+    "PreconditionFailedError",
+    "SettingsService",
+    "Versioned",
+]
@@ -0,0 +1,295 @@
+"""Fan-out of committed preference changes to live subscribers.
+
+``SettingsService`` publishes a ``PreferenceChange`` once a write has
+committed; the broker hands it to its backend, and the backend delivers
+every change published anywhere back to the broker, which queues it for
+that user's subscribers (the ``/stream`` endpoint).
+
+``LocalBackend`` only reaches subscribers in the same process, so behind
+several workers a stream would only see writes its own worker handled;
+``PostgresBackend`` shares changes between workers (and instances) with
+``LISTEN``/``NOTIFY``. Changes arriving from other processes are also
+passed to the broker's remote listeners, which keep per-process state
+such as the read cache in step.
+"""
+import asyncio
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, NamedTuple
+
+import asyncpg
+import orjson
+import structlog
+from sqlalchemy.engine import make_url
+
+from ..config import get_settings
+from ..metrics import BROKER_DISCONNECTS, STREAM_RESYNCS, STREAM_SUBSCRIBERS
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+
+class PreferenceChange(NamedTuple):
+    """A committed write: the section's new version and the fields set.
+
+    ``changes`` is keyed as in the section's API response.
+    """
+
+    user_id: str
+    section: str
+    version: int
+    changes: dict[str, Any]
+
+
+class BrokerBackend:
+    """Transport between publishers and the broker's subscribers.
+
+    Implementations must eventually pass every change published in this
+    process to :meth:`ChangeBroker.deliver`, and every change published
+    elsewhere to :meth:`ChangeBroker.receive`, on the event loop. When
+    changes from elsewhere may have been lost, they call
+    :meth:`ChangeBroker.resync`.
+    """
+
+    # Whether changes published by other processes arrive here too
+    shared = False
+
+    def start(self, broker: "ChangeBroker") -> None:
+        self._broker = broker
+
+    def publish(self, change: PreferenceChange) -> None:
+        raise NotImplementedError
+
+    async def connect(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalBackend(BrokerBackend):
+    """Delivers changes straight to this process's subscribers."""
+
+    def publish(self, change: PreferenceChange) -> None:
+        self._broker.deliver(change)
+
+
+# NOTIFY payloads must stay under 8000 bytes
+MAX_NOTIFY_BYTES = 7500
+
+# Errors meaning the broker's connection is gone
+_CONNECTION_ERRORS = (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError)
+
+
+def notify_payloads(changes: list[PreferenceChange]) -> Iterator[str]:
+    """Pack changes into as few JSON-array NOTIFY payloads as fit."""
+    batch: list[bytes] = []
+    size = 0
+    for change in changes:
+        encoded = orjson.dumps(tuple(change))
+        if batch and size + len(encoded) + 1 > MAX_NOTIFY_BYTES:
+            yield (b"[" + b",".join(batch) + b"]").decode()
+            batch, size = [], 0
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        yield (b"[" + b",".join(batch) + b"]").decode()
+
+
+class PostgresBackend(BrokerBackend):
+    """Shares changes between processes through Postgres ``LISTEN``/``NOTIFY``.
+
+    Each process holds one dedicated asyncpg connection, listening on
+    ``channel`` and used to send its own notifications. Changes are
+    delivered locally at once and notified in batches; notifications this
+    connection sent itself are skipped when they come back. If the
+    connection drops, it is reopened with backoff, unsent changes are
+    retried, and subscribers are told to resync since changes from other
+    processes may have been missed meanwhile. Until :meth:`connect` has
+    first succeeded, changes are only delivered locally.
+    """
+
+    shared = True
+
+    def __init__(self, dsn: str, channel: str = "preference_changes"):
+        self.dsn = dsn
+        self.channel = channel
+        self._connection = None
+        self._pending: list[PreferenceChange] = []
+        self._flushing: asyncio.Task | None = None
+        self._reconnecting: asyncio.Task | None = None
+        self._connected = False
+        self._closed = False
+
+    async def connect(self) -> None:
+        self._connection = await asyncpg.connect(self.dsn)
+        await self._connection.add_listener(self.channel, self._on_notification)
+        self._connection.add_termination_listener(self._on_termination)
+        self._connected = True
+
+    def publish(self, change: PreferenceChange) -> None:
+        self._broker.deliver(change)
+        if not self._connected:
+            # Never connected, so nothing would ever send them
+            return
+        self._pending.append(change)
+        if self._flushing is None or self._flushing.done():
+            self._flushing = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._pending and self._connection is not None:
+            changes, self._pending = self._pending, []
+            try:
+                await self._connection.executemany(
+                    "SELECT pg_notify($1, $2)",
+                    [(self.channel, payload) for payload in notify_payloads(changes)],
+                )
+            except _CONNECTION_ERRORS as exc:
+                # Sent again once reconnected
+                self._pending[:0] = changes
+                logger.warning("Could not notify other workers", error=str(exc))
+                return
+            except Exception:
+                logger.warning("Dropped change notifications", count=len(changes), exc_info=True)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str) -> None:
+        if pid == connection.get_server_pid():
+            return
+        for user_id, section, version, changes in orjson.loads(payload):
+            self._broker.receive(PreferenceChange(user_id, section, version, changes))
+
+    def _on_termination(self, connection) -> None:
+        if self._closed or connection is not self._connection:
+            return
+        BROKER_DISCONNECTS.inc()
+        logger.warning("Change broker connection lost, reconnecting")
+        self._connection = None
+        self._reconnecting = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = 0.5
+        while not self._closed:
+            try:
+                await self.connect()
+            except (*_CONNECTION_ERRORS, asyncio.TimeoutError) as exc:
+                logger.warning("Change broker reconnect failed", error=str(exc), retry_in=delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            self._broker.resync()
+            if self._pending:
+                self._flushing = asyncio.create_task(self._flush())
+            return
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._connection is not None and self._flushing is not None:
+            # Send what was published before closing
+            await self._flushing
+        for task in (self._reconnecting, self._flushing):
+            if task is not None and not task.done():
+                task.cancel()
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+
+class Subscription:
+    """A bounded queue of one user's changes for a single stream.
+
+    When the consumer falls ``max_size`` changes behind, the queued
+    changes are dropped and replaced by one ``None``, which tells it to
+    re-read the user's preferences instead.
+    """
+
+    def __init__(self, user_id: str, max_size: int):
+        self.user_id = user_id
+        self._queue: asyncio.Queue[PreferenceChange | None] = asyncio.Queue(max_size)
+
+    def deliver(self, change: PreferenceChange) -> None:
+        try:
+            self._queue.put_nowait(change)
+        except asyncio.QueueFull:
+            self.resync()
+
+    def resync(self) -> None:
+        """Drop the queued changes and tell the consumer to re-read."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+        STREAM_RESYNCS.inc()
+
+    async def get(self) -> PreferenceChange | None:
+        """Wait for the next change, or None if some were dropped."""
+        return await self._queue.get()
+
+
+class ChangeBroker:
+    """Routes published changes to the subscriptions of their user."""
+
+    def __init__(self, backend: BrokerBackend, queue_size: int):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscriptions: dict[str, set[Subscription]] = {}
+        # Called with each change from another process, or None when some
+        # may have been missed
+        self._remote_listeners: list[Callable[[PreferenceChange | None], None]] = []
+        backend.start(self)
+
+    async def connect(self) -> None:
+        await self.backend.connect()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    def publish(self, change: PreferenceChange) -> None:
+        self.backend.publish(change)
+
+    def on_remote_change(self, listener: Callable[[PreferenceChange | None], None]) -> None:
+        """Register a callback for changes committed by other processes."""
+        self._remote_listeners.append(listener)
+
+    def deliver(self, change: PreferenceChange) -> None:
+        """Queue a change for its user's subscriptions."""
+        for subscription in self._subscriptions.get(change.user_id, ()):
+            subscription.deliver(change)
+
+    def receive(self, change: PreferenceChange) -> None:
+        """Handle a change another process published."""
+        for listener in self._remote_listeners:
+            listener(change)
+        self.deliver(change)
+
+    def resync(self) -> None:
+        """Tell subscriptions and remote listeners changes may have been missed."""
+        for listener in self._remote_listeners:
+            listener(None)
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                subscription.resync()
+
+    @contextmanager
+    def subscribe(self, user_id: str) -> Iterator[Subscription]:
+        """Receive the user's changes for the duration of the block."""
+        subscription = Subscription(user_id, self.queue_size)
+        self._subscriptions.setdefault(user_id, set()).add(subscription)
+        STREAM_SUBSCRIBERS.inc()
+        try:
+            yield subscription
+        finally:
+            STREAM_SUBSCRIBERS.dec()
+            subscriptions = self._subscriptions[user_id]
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[user_id]
+
+
+def _configured_backend() -> BrokerBackend:
+    if settings.broker_backend == "postgres":
+        # asyncpg takes a plain postgresql:// DSN
+        url = make_url(settings.database_url).set(drivername="postgresql")
+        return PostgresBackend(url.render_as_string(hide_password=False))
+    return LocalBackend()
+
+
+# Shared by every SettingsService and stream in this process
+change_broker = ChangeBroker(_configured_backend(), queue_size=settings.stream_queue_size)
@@ -0,0 +1,578 @@
+"""High-throughput bulk import of preferences in the export format."""
+import csv
+import json
+import operator
+import time
+import zlib
+from collections import deque
+from functools import reduce
+from typing import AsyncIterator, Callable, Literal
+
+import structlog
+from pydantic import ValidationError
+from sqlalchemy import (
+    Boolean,
+    Column,
+    MetaData,
+    String,
+    Table,
+    case,
+    delete,
+    exists,
+    func,
+    insert,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from ..config import get_settings
+from ..database import engine
+from ..models import (
+    NotificationPreferences,
+    OutboxEvent,
+    ThemeSettings,
+    UserPreferences,
+    UserSettings,
+)
+from ..schemas import NotificationPreferencesUpdate, ThemeSettingsUpdate, UserSettingsUpdate
+from .broker import ChangeBroker, PreferenceChange, change_broker
+from .cache import preferences_cache
+from .notification_types import notification_registry
+from .outbox import OutboxRelay, outbox_relay, outbox_values
+from .settings_service import (
+    DOCUMENT_COLUMNS,
+    _change_fields,
+    change_version,
+    document_sync_statement,
+)
+from .timezones import check_timezone
+
+logger = structlog.get_logger()
+
+ImportFormat = Literal["ndjson", "csv"]
+
+# Section -> fields of the export format it is imported from; one per
+# notification type
+STAGED_FIELDS = {
+    "settings": ("language", "timezone", "locale"),
+    "notifications": tuple(type_.key for type_ in notification_registry.types),
+    "theme": ("mode", "accent_color"),
+}
+
+# Per-connection staging table rows are loaded into before merging.
+# NULL means "not present in the input", so existing values are kept.
+staging = Table(
+    "preferences_import",
+    MetaData(),
+    Column("user_id", String(255), primary_key=True),
+    Column("language", String(10)),
+    Column("timezone", String(50)),
+    Column("locale", String(10)),
+    *(Column(key, Boolean) for key in STAGED_FIELDS["notifications"]),
+    Column("mode", String(10)),
+    Column("accent_color", String(20)),
+    prefixes=["TEMPORARY"],
+)
+STAGING_COLUMNS = [column.name for column in staging.columns]
+
+# Target table -> section merged into it
+MERGE_TARGETS = {
+    UserSettings.__table__: "settings",
+    NotificationPreferences.__table__: "notifications",
+    ThemeSettings.__table__: "theme",
+}
+
+
+class ImportInputError(ValueError):
+    """Raised when the input stream itself cannot be read."""
+
+
+class ImportReport:
+    """Progress, rejected rows and throughput of a running import."""
+
+    def __init__(self, max_errors: int = 100):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors: list[dict] = []
+        self.max_errors = max_errors
+        # False once unreadable input stopped the import early
+        self.complete = True
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed or time.perf_counter() - self.started_at
+        return self.rows / elapsed if elapsed else 0.0
+
+    def reject(self, line: int, user_id: str | None, error: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "user_id": user_id, "error": error})
+
+    def stop(self, line: int, error: str) -> None:
+        """Record that the rest of the input could not be read."""
+        self.complete = False
+        self.errors.append({"line": line, "user_id": None, "error": error})
+
+    def to_dict(self) -> dict:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "complete": self.complete,
+            "errors": self.errors,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second),
+        }
+
+
+def _decode(line: bytes) -> str:
+    try:
+        return line.decode()
+    except UnicodeDecodeError as exc:
+        raise ImportInputError(f"input is not valid UTF-8: {exc.reason}") from None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], gzip: bool = False) -> AsyncIterator[str]:
+    """Split a stream of (optionally gzipped) UTF-8 bytes into text lines.
+
+    Raises ``ImportInputError`` for corrupt or truncated gzip data and for
+    lines that are not UTF-8.
+    """
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16) if gzip else None
+    pending = b""
+    try:
+        async for chunk in chunks:
+            pending += decompressor.decompress(chunk) if decompressor else chunk
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                yield _decode(line)
+        if decompressor:
+            pending += decompressor.flush()
+    except zlib.error as exc:
+        raise ImportInputError(f"input is not valid gzip: {exc}") from None
+    if decompressor and not decompressor.eof:
+        raise ImportInputError("gzip input is truncated")
+    if pending:
+        yield _decode(pending)
+
+
+class _CsvFeed:
+    """Physical lines waiting for the import's CSV reader."""
+
+    def __init__(self):
+        self.lines: deque[str] = deque()
+        self.first_line = 0
+        self.size = 0
+        # Whether the buffered lines end inside a quoted field
+        self.quoted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+    def append(self, line_number: int, line: str) -> None:
+        if not self.lines:
+            self.first_line = line_number
+            self.size = 0
+        self.size += len(line)
+        # The reader keeps a quoted field's newlines only if lines end in one
+        self.lines.append(line + "\n")
+        if self.quoted or '"' in line:
+            self.quoted = _ends_quoted(line, self.quoted)
+
+
+def _ends_quoted(line: str, quoted: bool) -> bool:
+    """Whether a CSV record is inside a quoted field after ``line``.
+
+    Follows the csv module's default dialect: a quote only opens a field
+    at its start, and a doubled quote inside one is literal.
+    """
+    start, unquoted, inside, closed = range(4)
+    state = inside if quoted else start
+    for char in line:
+        if state == inside:
+            if char == '"':
+                state = closed
+        elif char == ",":
+            state = start
+        elif char == '"' and state in (start, closed):
+            state = inside
+        else:
+            state = unquoted
+    return state == inside
+
+
+def _describe(exc: ValidationError) -> str:
+    """Condense a pydantic validation error to one line."""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+def validate_record(record: dict) -> dict:
+    """Validate one export-format record into a staging row.
+
+    Each section is checked with the same schema its PUT endpoint uses,
+    and timezones against zoneinfo as on the PUT.
+    Raises ``ValueError`` (including pydantic's ``ValidationError``).
+    """
+    record = {key: value for key, value in record.items() if value not in ("", None)}
+    user_id = record.get("user_id")
+    if not isinstance(user_id, str) or not 0 < len(user_id) <= 255:
+        raise ValueError("user_id must be a non-empty string of at most 255 characters")
+
+    general = UserSettingsUpdate.model_validate(
+        {key: record.get(key) for key in ("language", "timezone", "locale")}
+    )
+    if general.timezone is not None:
+        check_timezone(general.timezone)
+    notifications = NotificationPreferencesUpdate.model_validate(
+        {
+            "preferences": {
+                key: record[key] for key in STAGED_FIELDS["notifications"] if key in record
+            }
+        }
+    )
+    theme = ThemeSettingsUpdate.model_validate(
+        {"mode": record.get("mode"), "accent_color": record.get("accent_color")}
+    )
+
+    row = dict.fromkeys(STAGING_COLUMNS)
+    row.update(general.model_dump(), user_id=user_id, mode=theme.mode)
+    row["accent_color"] = theme.accentColor
+    row.update(notifications.preferences)
+    return row
+
+
+async def _load_staging(conn: AsyncConnection, rows: list[dict]) -> None:
+    """Replace the staging table's contents with ``rows``."""
+    # Also makes the driver open its transaction before COPY runs
+    await conn.execute(delete(staging))
+
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            staging.name,
+            records=[tuple(row[column] for column in STAGING_COLUMNS) for row in rows],
+            columns=STAGING_COLUMNS,
+        )
+    else:
+        await conn.execute(insert(staging), rows)
+
+
+def _provided(section: str):
+    """Condition that a staged row provides any of a section's fields."""
+    return or_(*(staging.c[field].is_not(None) for field in STAGED_FIELDS[section]))
+
+
+def _staged_mask(chosen):
+    """Mask of the notification types whose staged value satisfies ``chosen``."""
+    return reduce(
+        operator.add,
+        (
+            case((chosen(staging.c[type_.key]), type_.mask), else_=0)
+            for type_ in notification_registry.types
+        ),
+    )
+
+
+def _staged_values(section: str, table: Table, merge: bool) -> dict:
+    """Values for ``table``'s columns of a section, from the staged row.
+
+    With ``merge`` the fields a row does not provide keep the stored
+    values; otherwise (for new rows) they take the column defaults.
+    """
+    if section == "notifications":
+        enabled_mask = _staged_mask(lambda value: value)
+        set_mask = _staged_mask(lambda value: value.is_not(None))
+        if not merge:
+            return {"enabled_mask": enabled_mask, "set_mask": set_mask}
+        return {
+            "enabled_mask": table.c.enabled_mask.bitwise_and(
+                set_mask.bitwise_not()
+            ).bitwise_or(enabled_mask),
+            "set_mask": table.c.set_mask.bitwise_or(set_mask),
+        }
+    return {
+        field: func.coalesce(
+            staging.c[field], table.c[field] if merge else table.c[field].default.arg
+        )
+        for field in STAGED_FIELDS[section]
+    }
+
+
+async def _merge_staging(conn: AsyncConnection) -> None:
+    """Merge staged rows into the preference tables.
+
+    Existing rows only have the provided (non-NULL) fields overwritten;
+    new rows take column defaults for anything not provided.
+    """
+    for table, section in MERGE_TARGETS.items():
+        provided = _provided(section)
+        stamp = change_version(conn.dialect.name)
+        await conn.execute(
+            update(table)
+            .values(
+                {
+                    **_staged_values(section, table, merge=True),
+                    "version": table.c.version + 1,
+                    "change_version": stamp,
+                    "updated_at": func.now(),
+                }
+            )
+            .where(table.c.user_id == staging.c.user_id, provided)
+        )
+        values = _staged_values(section, table, merge=False)
+        await conn.execute(
+            insert(table).from_select(
+                ["user_id", *values, "change_version"],
+                select(staging.c.user_id, *values.values(), stamp).where(
+                    provided,
+                    ~exists().where(table.c.user_id == staging.c.user_id),
+                ),
+            )
+        )
+
+
+async def _merge_staging_documents(conn: AsyncConnection) -> None:
+    """Merge staged rows into the consolidated documents.
+
+    Same rules as ``_merge_staging``; a section's version is only bumped
+    when the row provides one of its fields.
+    """
+    document = UserPreferences.__table__
+    provided = {section: _provided(section) for section in DOCUMENT_COLUMNS}
+    merged, new = {}, {}
+    for section in DOCUMENT_COLUMNS:
+        merged.update(_staged_values(section, document, merge=True))
+        new.update(_staged_values(section, document, merge=False))
+    stamp = change_version(conn.dialect.name)
+    await conn.execute(
+        update(document)
+        .values(
+            {
+                **merged,
+                **{
+                    f"{section}_version": document.c[f"{section}_version"]
+                    + case((provided[section], 1), else_=0)
+                    for section in DOCUMENT_COLUMNS
+                },
+                "change_version": stamp,
+                "updated_at": func.now(),
+            }
+        )
+        .where(document.c.user_id == staging.c.user_id, or_(*provided.values()))
+    )
+    await conn.execute(
+        insert(document).from_select(
+            [
+                "user_id",
+                *new,
+                *(f"{section}_version" for section in DOCUMENT_COLUMNS),
+                "change_version",
+            ],
+            select(
+                staging.c.user_id,
+                *new.values(),
+                *(case((provided[section], 1), else_=0) for section in DOCUMENT_COLUMNS),
+                stamp,
+            ).where(
+                or_(*provided.values()),
+                ~exists().where(document.c.user_id == staging.c.user_id),
+            ),
+        )
+    )
+
+
+def _staged_changes(section: str, row: dict) -> dict:
+    """A staged row's column changes to a section, as a PUT would make."""
+    provided = {field: row[field] for field in STAGED_FIELDS[section] if row[field] is not None}
+    if section == "notifications":
+        enabled_mask, set_mask = notification_registry.masks(provided)
+        return {"enabled_mask": enabled_mask, "set_mask": set_mask} if set_mask else {}
+    return provided
+
+
+async def _merged_changes(
+    conn: AsyncConnection, rows: dict[str, dict], storage: str
+) -> list[PreferenceChange]:
+    """The changes a merge of the staged ``rows`` made, with new versions."""
+    changes = []
+    for table, section in MERGE_TARGETS.items():
+        if storage == "document":
+            table = UserPreferences.__table__
+            version = table.c[f"{section}_version"]
+        else:
+            version = table.c.version
+        result = await conn.execute(
+            select(table.c.user_id, version)
+            .join(staging, table.c.user_id == staging.c.user_id)
+            .where(_provided(section))
+        )
+        for user_id, new_version in result:
+            fields = _change_fields(section, _staged_changes(section, rows[user_id]))
+            changes.append(PreferenceChange(user_id, section, new_version, fields))
+    return changes
+
+
+async def import_preferences(
+    lines: AsyncIterator[str],
+    fmt: ImportFormat = "ndjson",
+    batch_size: int = 5000,
+    report: ImportReport | None = None,
+    progress: Callable[[ImportReport], None] | None = None,
+    bind: AsyncEngine = engine,
+    storage: str | None = None,
+    broker: ChangeBroker = change_broker,
+    outbox: OutboxRelay | None = outbox_relay,
+) -> ImportReport:
+    """Validate and load preference records in batches.
+
+    Each batch is validated, loaded into a temporary staging table (with
+    ``COPY`` on Postgres) and merged into the preference tables (or the
+    documents, per ``storage``) in its own transaction, so a failure only
+    loses the current batch. Invalid rows are counted and reported rather
+    than aborting the import. CSV records may span lines inside quoted
+    fields. If the input stops being readable (``ImportInputError``), the
+    rows read so far are still imported and the report is marked
+    incomplete.
+
+    Like single writes, each batch's changes are published once it
+    commits (so other workers drop their cached copies) and, with an
+    outbox relay, recorded as change events in its transaction.
+    """
+    report = report or ImportReport()
+    storage = storage or get_settings().preferences_storage
+
+    async with bind.connect() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+        await conn.run_sync(staging.create)
+        await conn.commit()
+
+        batch: dict[str, dict] = {}
+
+        async def flush() -> None:
+            if batch:
+                await _load_staging(conn, list(batch.values()))
+                if storage == "document":
+                    await _merge_staging_documents(conn)
+                else:
+                    await _merge_staging(conn)
+                if storage == "dual":
+                    await conn.execute(
+                        document_sync_statement(conn.dialect.name, select(staging.c.user_id))
+                    )
+                changes = await _merged_changes(conn, batch, storage)
+                if outbox is not None and changes:
+                    await conn.execute(
+                        insert(OutboxEvent), [outbox_values(change) for change in changes]
+                    )
+                await conn.commit()
+
+                for change in changes:
+                    preferences_cache.invalidate((change.section, change.user_id))
+                    broker.publish(change)
+                if outbox is not None and changes:
+                    outbox.wake()
+                report.imported += len(batch)
+                batch.clear()
+            if progress:
+                progress(report)
+
+        async def add(line_number: int, parse: Callable[[], dict]) -> None:
+            report.rows += 1
+            record = None
+            try:
+                record = parse()
+                row = validate_record(record)
+            except ValidationError as exc:
+                report.reject(line_number, record.get("user_id"), _describe(exc))
+                return
+            except ValueError as exc:
+                user_id = record.get("user_id") if isinstance(record, dict) else None
+                report.reject(line_number, user_id, str(exc))
+                return
+
+            # Later rows for the same user win within a batch
+            batch[row["user_id"]] = row
+            if len(batch) >= batch_size:
+                await flush()
+
+        def parse_json(line: str) -> dict:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            return record
+
+        # One reader over the whole input, handed a record's lines once
+        # they end outside a quoted field
+        feed = _CsvFeed()
+        reader = csv.reader(feed)
+        header = None
+
+        def read_csv() -> list[str]:
+            try:
+                return next(reader)
+            except csv.Error as exc:
+                raise ValueError(f"invalid CSV: {exc}") from None
+            finally:
+                feed.lines.clear()
+
+        line_number = 0
+        try:
+            async for line in lines:
+                line_number += 1
+                if fmt != "csv":
+                    if line.strip():
+                        await add(line_number, lambda: parse_json(line))
+                    continue
+                if not feed.lines and not line.strip():
+                    continue
+                feed.append(line_number, line)
+                if feed.quoted:
+                    # As the csv module would, cap how much a field can hold
+                    if feed.size > csv.field_size_limit():
+                        raise ImportInputError(
+                            f"quoted field from line {feed.first_line} is never closed"
+                        )
+                    continue
+                if header is None:
+                    try:
+                        header = read_csv()
+                    except ValueError as exc:
+                        raise ImportInputError(f"unreadable header: {exc}") from None
+                else:
+                    await add(feed.first_line, lambda: dict(zip(header, read_csv())))
+        except ImportInputError as exc:
+            report.stop(line_number + 1, str(exc))
+        if feed.quoted and report.complete:
+            report.rows += 1
+            report.reject(feed.first_line, None, "unterminated quoted field")
+
+        await flush()
+        await conn.execute(text(f"DROP TABLE IF EXISTS {staging.name}"))
+        await conn.commit()
+
+    report.elapsed = time.perf_counter() - report.started_at
+    logger.info(
+        "Preferences import finished",
+        format=fmt,
+        rows=report.rows,
+        imported=report.imported,
+        rejected=report.rejected,
+        seconds=round(report.elapsed, 3),
+        rows_per_second=round(report.rows_per_second),
+    )
+    return report
+
@@ -0,0 +1,86 @@
+"""In-process read cache for user preferences."""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from ..config import get_settings
+from ..metrics import CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+settings = get_settings()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a fixed TTL.
+
+    Keys are ``(section, user_id)`` tuples; the section is used as the
+    metrics label so label cardinality stays bounded.
+
+    Reads populate the cache with :meth:`fill`, passing the
+    :attr:`generation` observed before querying. Writes go through
+    :meth:`put` or :meth:`invalidate`, which bump the generation so that a
+    read which started before the write cannot overwrite the newer value
+    with what it loaded.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple[str, str]) -> Any | None:
+        """Return the cached value for a key, or None on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_HITS.labels(section=key[0]).inc()
+                return value
+            del self._entries[key]
+            CACHE_EVICTIONS.labels(reason="expired").inc()
+
+        CACHE_MISSES.labels(section=key[0]).inc()
+        return None
+
+    def fill(self, key: tuple[str, str], value: Any, generation: int) -> None:
+        """Cache a value loaded from the database by a read.
+
+        Skipped if any write happened since ``generation`` was observed.
+        """
+        if generation == self.generation:
+            self._store(key, value)
+
+    def put(self, key: tuple[str, str], value: Any) -> None:
+        """Replace a cached value after a committed write."""
+        self.generation += 1
+        self._store(key, value)
+
+    def invalidate(self, key: tuple[str, str]) -> None:
+        """Drop a cached value after a committed write."""
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every cached value."""
+        self.generation += 1
+        self._entries.clear()
+
+    def _store(self, key: tuple[str, str], value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            CACHE_EVICTIONS.labels(reason="size").inc()
+
+
+# Shared by every SettingsService in this process
+preferences_cache = TTLCache(
+    max_size=settings.cache_max_size,
+    ttl_seconds=settings.cache_ttl_seconds,
+)
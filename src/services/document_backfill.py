@@ -0,0 +1,61 @@
+"""Backfill of the consolidated preference documents from the tables."""
+import time
+from typing import Callable
+
+import structlog
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..database import engine
+from .settings_service import SECTION_MODELS, document_sync_statement
+
+logger = structlog.get_logger()
+
+
+async def backfill_documents(
+    batch_size: int = 5000,
+    progress: Callable[[int], None] | None = None,
+    bind: AsyncEngine = engine,
+) -> int:
+    """Bring every user's document up to date with the per-section tables.
+
+    Users are walked in user_id order, one transaction per batch, and only
+    sections whose table version is newer than the document's are copied,
+    so the backfill is safe to re-run while ``dual`` storage is live.
+    Returns the number of users visited.
+    """
+    started_at = time.perf_counter()
+    visited = 0
+    last = ""
+
+    async with bind.connect() as conn:
+        while True:
+            # Filter each branch so every table is walked by its primary key
+            user_ids = (
+                await conn.execute(
+                    union(
+                        *(
+                            select(model.user_id).where(model.user_id > last)
+                            for model in SECTION_MODELS.values()
+                        )
+                    )
+                    .order_by("user_id")
+                    .limit(batch_size)
+                )
+            ).scalars().all()
+            if not user_ids:
+                break
+
+            await conn.execute(document_sync_statement(conn.dialect.name, user_ids))
+            await conn.commit()
+            visited += len(user_ids)
+            last = user_ids[-1]
+            if progress:
+                progress(visited)
+
+    logger.info(
+        "Preference documents backfilled",
+        users=visited,
+        seconds=round(time.perf_counter() - started_at, 3),
+    )
+    return visited
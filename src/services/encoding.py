@@ -0,0 +1,116 @@
+"""Pre-encoded JSON bodies for preference responses.
+
+Responses are built by ``SettingsService`` from validated rows, so the
+routes send them as JSON bytes directly instead of having FastAPI
+re-validate them against ``response_model`` and encode them with the
+standard library. Default payloads, which most users get, and the
+constant notification ``items`` are encoded once at import time.
+"""
+import base64
+from typing import Literal, Sequence
+
+import numpy as np
+import orjson
+
+from ..schemas import ThemeSettingsResponse, UserSettingsResponse
+from .broker import PreferenceChange
+from .notification_types import notification_registry
+from .settings_service import Versioned
+
+# Shared by every notification settings response
+NOTIFICATION_ITEMS_JSON = orjson.dumps(
+    [item.model_dump() for item in notification_registry.items]
+)
+
+
+def _encode_notifications(preferences: dict[str, bool]) -> bytes:
+    return b"".join(
+        (
+            b'{"items":',
+            NOTIFICATION_ITEMS_JSON,
+            b',"preferences":',
+            orjson.dumps(preferences),
+            b"}",
+        )
+    )
+
+
+def encode_value(section: str, value) -> bytes:
+    """Encode a section's response model as its API JSON."""
+    if section == "notifications":
+        return _encode_notifications(value.preferences)
+    return orjson.dumps(value.model_dump(by_alias=True))
+
+
+# Section name -> body served to users who never saved it (version 0)
+DEFAULT_BODIES = {
+    "settings": encode_value("settings", UserSettingsResponse()),
+    "notifications": _encode_notifications(notification_registry.defaults),
+    "theme": encode_value("theme", ThemeSettingsResponse()),
+}
+
+
+def encode_section(section: str, versioned: Versioned) -> bytes:
+    """Encode a section, reusing the pre-encoded body for defaults."""
+    if versioned.version == 0:
+        return DEFAULT_BODIES[section]
+    return encode_value(section, versioned.value)
+
+
+# Body of /all for a user on defaults everywhere
+DEFAULT_ALL_BODY = b"{" + b",".join(
+    b'"%s":%s' % (section.encode(), body) for section, body in DEFAULT_BODIES.items()
+) + b"}"
+
+
+def encode_sections(sections: dict[str, Versioned]) -> bytes:
+    """Encode every section as an ``AllPreferencesResponse`` body."""
+    if not any(versioned.version for versioned in sections.values()):
+        return DEFAULT_ALL_BODY
+    return b"{" + b",".join(
+        b'"%s":%s' % (section.encode(), encode_section(section, versioned))
+        for section, versioned in sections.items()
+    ) + b"}"
+
+
+def encode_preferences(preferences: dict[str, bool]) -> bytes:
+    """Encode the body of a notification preferences update."""
+    return orjson.dumps({"preferences": preferences})
+
+
+DecisionFormat = Literal["bitmap", "pairs"]
+
+
+def encode_decisions(
+    allowed: np.ndarray, user_ids: Sequence[str], keys: Sequence[str], fmt: DecisionFormat
+) -> bytes:
+    """Encode should-notify decisions as a bitmap or the allowed pairs.
+
+    The bitmap is base64 of one bit per requested pair, least significant
+    bit first, so pair ``i`` is allowed when
+    ``bitmap[i // 8] >> (i % 8) & 1``.
+    """
+    if fmt == "bitmap":
+        return orjson.dumps(
+            {
+                "count": len(allowed),
+                "allowed": int(np.count_nonzero(allowed)),
+                "bitmap": base64.b64encode(
+                    np.packbits(allowed, bitorder="little")
+                ).decode(),
+            }
+        )
+    return orjson.dumps(
+        {
+            "allowed": [
+                [user_ids[index], keys[index]] for index in np.flatnonzero(allowed).tolist()
+            ]
+        }
+    )
+
+
+def encode_change(change: PreferenceChange) -> bytes:
+    """Encode a committed change as its stream event payload."""
+    return orjson.dumps(
+        {"section": change.section, "version": change.version, "changes": change.changes}
+    )
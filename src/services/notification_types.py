@@ -0,0 +1,108 @@
+"""Registry of the notification types users can toggle.
+
+Types are data, read once at import from ``notification_types.json`` (or
+the file named by ``notification_types_path``): a key, display label and
+description, the default for users who never chose, and a bit position.
+A user's choices are stored as two bitmasks over those positions:
+``set_mask`` has the types the user explicitly chose, and ``enabled_mask``
+those of them turned on. Any other type follows the registry's default,
+so adding a type is an entry in the file rather than a migration.
+
+Bit positions are stored data: never reuse or renumber one.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import NamedTuple
+
+from ..config import get_settings
+from ..schemas import NotificationItem
+
+DEFAULT_PATH = Path(__file__).with_name("notification_types.json")
+
+# Masks are stored in signed 64-bit columns
+MAX_BITS = 63
+
+
+class NotificationType(NamedTuple):
+    """One registered notification type."""
+
+    key: str
+    bit: int
+    label: str
+    description: str
+    default: bool
+
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
+
+class NotificationRegistry:
+    """The registered types, in display order, with their masks precomputed."""
+
+    def __init__(self, types: list[NotificationType]):
+        keys = [type_.key for type_ in types]
+        bits = [type_.bit for type_ in types]
+        if len(set(keys)) != len(keys):
+            raise ValueError("Notification type keys must be unique")
+        if len(set(bits)) != len(bits):
+            raise ValueError("Notification type bits must be unique")
+        if not all(0 <= bit < MAX_BITS for bit in bits):
+            raise ValueError(f"Notification type bits must be between 0 and {MAX_BITS - 1}")
+
+        self.types = tuple(types)
+        self.by_key = {type_.key: type_ for type_ in types}
+        self.items = [
+            NotificationItem(key=type_.key, label=type_.label, description=type_.description)
+            for type_ in types
+        ]
+        self.key_masks = {type_.key: type_.mask for type_ in types}
+        # Preferences of a user who never chose anything
+        self.defaults = {type_.key: type_.default for type_ in types}
+        self.default_mask = sum(type_.mask for type_ in types if type_.default)
+        # Changes whenever the types, their labels or defaults do, which
+        # changes notification responses without changing any stored row
+        self.fingerprint = hashlib.sha1(
+            json.dumps([type_._asdict() for type_ in types], sort_keys=True).encode()
+        ).hexdigest()[:8]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.by_key
+
+    @classmethod
+    def load(cls, path: str | Path) -> "NotificationRegistry":
+        """Read a registry file: a JSON list of type objects."""
+        with open(path, encoding="utf-8") as file:
+            entries = json.load(file)
+        return cls([NotificationType(**entry) for entry in entries])
+
+    def preferences(self, enabled_mask: int, set_mask: int) -> dict[str, bool]:
+        """A user's effective preference for every type."""
+        effective = enabled_mask & set_mask | self.default_mask & ~set_mask
+        return {type_.key: bool(effective & type_.mask) for type_ in self.types}
+
+    def chosen(self, enabled_mask: int, set_mask: int) -> dict[str, bool]:
+        """Only the types set in ``set_mask``, with their chosen values."""
+        return {
+            type_.key: bool(enabled_mask & type_.mask)
+            for type_ in self.types
+            if set_mask & type_.mask
+        }
+
+    def masks(self, preferences: dict[str, bool]) -> tuple[int, int]:
+        """Encode choices as ``(enabled_mask, set_mask)``, ignoring unknown keys."""
+        enabled_mask = set_mask = 0
+        for key, enabled in preferences.items():
+            type_ = self.by_key.get(key)
+            if type_ is not None:
+                set_mask |= type_.mask
+                if enabled:
+                    enabled_mask |= type_.mask
+        return enabled_mask, set_mask
+
+
+# Loaded once per process; a malformed file fails startup
+notification_registry = NotificationRegistry.load(
+    get_settings().notification_types_path or DEFAULT_PATH
+)
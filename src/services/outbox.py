@@ -0,0 +1,264 @@
+"""Transactional outbox of preference change events.
+
+``SettingsService`` inserts an ``OutboxEvent`` in the same transaction as
+each write, so an event exists exactly when its change committed. A relay
+task in every worker moves events from the table to a sink in batches,
+deleting them only once the sink accepted them: delivery is at least
+once, and a sink failure just leaves the batch for the next pass.
+
+Relays in different workers lock their batches with ``SKIP LOCKED``, so
+two workers can publish one user's events out of order; consumers should
+drop events whose ``version`` is not newer than what they hold.
+
+``HttpSink`` delivers batches to a webhook. To publish elsewhere (a
+message broker, say), subclass ``OutboxSink``: ``publish`` must only
+return once the sink has durably accepted the whole batch, and raise
+otherwise. It runs while the batch's rows are locked, so it should time
+out well within the database's lock and statement timeouts. Then add the
+sink to ``_configured_relay`` and the ``outbox_sink`` setting.
+"""
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import orjson
+import structlog
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..config import get_settings
+from ..database import async_session
+from ..metrics import (
+    OUTBOX_BACKLOG,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_PUBLISH_FAILURES,
+    OUTBOX_PUBLISH_LAG,
+)
+from ..models import OutboxEvent
+from .broker import PreferenceChange
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+
+class OutboxSink:
+    """Where published events go; a message broker in production."""
+
+    async def publish(self, events: list[dict]) -> None:
+        """Accept a batch of events, or raise to have it retried."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySink(OutboxSink):
+    """Keeps the latest ``max_events`` published events in :attr:`events`, for tests."""
+
+    def __init__(self, max_events: int = 10000):
+        self.events: deque[dict] = deque(maxlen=max_events)
+
+    async def publish(self, events: list[dict]) -> None:
+        self.events.extend(events)
+
+
+class FileSink(OutboxSink):
+    """Appends events to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    async def publish(self, events: list[dict]) -> None:
+        data = b"".join(orjson.dumps(event) + b"\n" for event in events)
+        await asyncio.to_thread(self._append, data)
+
+    def _append(self, data: bytes) -> None:
+        with self.path.open("ab") as file:
+            file.write(data)
+
+
+class HttpSink(OutboxSink):
+    """POSTs each batch to a URL as a JSON array of events.
+
+    Any response other than 2xx, or no response within ``timeout``
+    seconds, fails the batch so it is retried.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def publish(self, events: list[dict]) -> None:
+        response = await self._client.post(
+            self.url,
+            content=orjson.dumps(events),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def outbox_values(change: PreferenceChange) -> dict:
+    """Outbox row recording a change."""
+    return {
+        "user_id": change.user_id,
+        "section": change.section,
+        "version": change.version,
+        "changes": change.changes,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def outbox_insert(change: PreferenceChange):
+    """Statement recording a change in the outbox."""
+    return insert(OutboxEvent).values(outbox_values(change))
+
+
+def _created_at(event: OutboxEvent) -> datetime:
+    # SQLite hands timestamps back without their zone
+    if event.created_at.tzinfo is None:
+        return event.created_at.replace(tzinfo=timezone.utc)
+    return event.created_at
+
+
+def _payload(event: OutboxEvent) -> dict:
+    return {
+        "id": event.id,
+        "user_id": event.user_id,
+        "section": event.section,
+        "version": event.version,
+        "changes": event.changes,
+        "created_at": _created_at(event).isoformat(),
+    }
+
+
+class OutboxRelay:
+    """Publishes outbox events to a sink until stopped.
+
+    Polls every ``poll_seconds``, and right away when :meth:`wake` is
+    called after a local commit; a full batch is followed by the next one
+    without waiting. The backlog gauge is refreshed at most every
+    ``backlog_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        sink: OutboxSink,
+        batch_size: int,
+        poll_seconds: float,
+        session_factory: async_sessionmaker[AsyncSession] = async_session,
+        backlog_interval: float = 15.0,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.session_factory = session_factory
+        self.backlog_interval = backlog_interval
+        self._backlog_counted_at: float | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop relaying; events left in the table wait for the next start."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.sink.close()
+
+    async def _run(self) -> None:
+        while True:
+            # Cleared before the pass, so a commit during it triggers another
+            self._wakeup.clear()
+            try:
+                published = await self.relay_batch()
+            except Exception:
+                OUTBOX_PUBLISH_FAILURES.inc()
+                logger.warning("Outbox relay pass failed", exc_info=True)
+                published = 0
+            if published < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def relay_batch(self) -> int:
+        """Publish and delete the oldest batch of events; returns its size.
+
+        The sink is called while the batch's rows are locked, and they are
+        only deleted once it returns: publishing outside the transaction
+        would let another relay take the same events meanwhile, or lose
+        them if this worker died between deleting and publishing.
+        """
+        async with self.session_factory() as session:
+            events = (
+                await session.execute(
+                    select(OutboxEvent)
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).scalars().all()
+            if events:
+                # Locks are held until commit, so no other relay takes them
+                await self.sink.publish([_payload(event) for event in events])
+                await session.execute(
+                    delete(OutboxEvent).where(
+                        OutboxEvent.id.in_([event.id for event in events])
+                    )
+                )
+            await session.commit()
+
+            now = time.monotonic()
+            due = self._backlog_counted_at is None or (
+                now - self._backlog_counted_at >= self.backlog_interval
+            )
+            if due:
+                self._backlog_counted_at = now
+                OUTBOX_BACKLOG.set(
+                    (
+                        await session.execute(select(func.count()).select_from(OutboxEvent))
+                    ).scalar_one()
+                )
+
+        if events:
+            OUTBOX_BATCH_SIZE.observe(len(events))
+            now = datetime.now(timezone.utc)
+            for event in events:
+                OUTBOX_PUBLISH_LAG.observe((now - _created_at(event)).total_seconds())
+        return len(events)
+
+
+def _configured_relay() -> OutboxRelay | None:
+    if settings.outbox_sink == "off":
+        return None
+    if settings.outbox_sink == "memory":
+        sink = MemorySink(settings.outbox_memory_max_events)
+    elif settings.outbox_sink == "http":
+        sink = HttpSink(settings.outbox_http_url, settings.outbox_http_timeout_seconds)
+    else:
+        sink = FileSink(settings.outbox_file_path)
+    return OutboxRelay(
+        sink,
+        batch_size=settings.outbox_batch_size,
+        poll_seconds=settings.outbox_poll_seconds,
+        backlog_interval=settings.outbox_backlog_interval_seconds,
+    )
+
+
+# This process's relay, or None when change events are off
+outbox_relay = _configured_relay()
@@ -3,200 +3,1082 @@
 Associated Frontend Files:
   - web/app/src/pages/SettingsPage.tsx (main settings page)
 """
-from sqlalchemy import select
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, AsyncIterator, Collection, Iterable, NamedTuple, Sequence
+
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy import (
+    BigInteger,
+    Row,
+    String,
+    and_,
+    case,
+    cast,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import InterfaceError, OperationalError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import UserSettings, NotificationPreferences, ThemeSettings
+from ..config import get_settings
+from ..database import fall_back_to_primary, recent_writes, run_after_commit
+from ..instrumentation import db_operation
+from ..models import UserSettings, NotificationPreferences, ThemeSettings, UserPreferences
 from ..schemas import (
+    AllPreferencesResponse,
     UserSettingsResponse,
     UserSettingsUpdate,
     NotificationSettingsResponse,
     NotificationPreferencesUpdate,
-    NotificationItem,
+    PreferenceSection,
     ThemeSettingsResponse,
     ThemeSettingsUpdate,
 )
+from .broker import ChangeBroker, PreferenceChange, change_broker
+from .cache import TTLCache, preferences_cache
+from .notification_types import NotificationType, notification_registry
+from .outbox import OutboxRelay, outbox_insert, outbox_relay
+from .singleflight import SingleFlight, preferences_singleflight
+from .timezones import check_timezone, timezone_index
+
+
+class PreconditionFailedError(Exception):
+    """Raised when a conditional write's expected version is stale."""
+
+    def __init__(self, section: str, expected_version: int):
+        super().__init__(
+            f"{section} for this user is no longer at version {expected_version}"
+        )
+        self.section = section
+        self.expected_version = expected_version
+
+
+class Versioned(NamedTuple):
+    """A section's response together with the row version it was built from.
+
+    Version 0 means the user has no row and the response holds defaults.
+    """
+
+    version: int
+    value: Any
+
+
+class ChangeCursor(NamedTuple):
+    """Position in the changes feed: the last section a client received.
+
+    Changes are ordered by ``change_version``, then user_id and section.
+    """
+
+    change_version: int
+    user_id: str
+    section: str
+
+    def encode(self) -> str:
+        return f"{self.change_version}.{self.section}.{self.user_id}"
+
+    @classmethod
+    def decode(cls, cursor: str) -> "ChangeCursor":
+        """Parse an encoded cursor, raising ValueError if it is malformed."""
+        change_version, section, user_id = cursor.split(".", 2)
+        if not change_version.isdigit() or section not in SECTION_MODELS:
+            raise ValueError(f"Invalid change cursor {cursor!r}")
+        return cls(int(change_version), user_id, section)
+
+
+class ChangesPage(NamedTuple):
+    """A page of the changes feed.
+
+    ``cursor`` is the position to continue from: the last item's, or the
+    requested one when the page is empty.
+    """
+
+    items: list[dict]
+    cursor: ChangeCursor | None
+    has_more: bool
+
+
+def _user_settings_response(settings: UserSettings | None) -> UserSettingsResponse:
+    """Build the general settings response, falling back to defaults."""
+    if settings:
+        return UserSettingsResponse.model_validate(settings)
+    return UserSettingsResponse()
+
+
+def _notification_preferences(prefs: NotificationPreferences | None) -> dict[str, bool]:
+    """Every registered type's setting from a row's masks, or the defaults."""
+    if prefs:
+        return notification_registry.preferences(prefs.enabled_mask, prefs.set_mask)
+    return dict(notification_registry.defaults)
+
+
+def _notification_settings_response(
+    prefs: NotificationPreferences | None,
+) -> NotificationSettingsResponse:
+    """Build the notification settings response, falling back to defaults."""
+    return NotificationSettingsResponse(
+        items=notification_registry.items,
+        preferences=_notification_preferences(prefs),
+    )
+
+
+def _theme_settings_response(theme: ThemeSettings | None) -> ThemeSettingsResponse:
+    """Build the theme settings response, falling back to defaults."""
+    if theme:
+        return ThemeSettingsResponse(
+            mode=theme.mode,
+            accent_color=theme.accent_color,
+        )
+    return ThemeSettingsResponse()
+
+
+# Timezone of users who never saved general settings
+DEFAULT_TIMEZONE = UserSettingsResponse().timezone
+
+# Section name -> model storing it
+SECTION_MODELS = {
+    "settings": UserSettings,
+    "notifications": NotificationPreferences,
+    "theme": ThemeSettings,
+}
+
+
+# Section name -> builder of its API response from a row (or None)
+SECTION_RESPONSES = {
+    "settings": _user_settings_response,
+    "notifications": _notification_settings_response,
+    "theme": _theme_settings_response,
+}
+
+
+def _user_settings_changes(update: UserSettingsUpdate) -> dict:
+    return update.model_dump(exclude_none=True)
+
+
+def _notification_changes(update: NotificationPreferencesUpdate) -> dict:
+    # Keys of unregistered types are ignored
+    enabled_mask, set_mask = notification_registry.masks(update.preferences)
+    return {"enabled_mask": enabled_mask, "set_mask": set_mask} if set_mask else {}
+
+
+def _theme_changes(update: ThemeSettingsUpdate) -> dict:
+    changes = {}
+    if update.mode is not None:
+        changes["mode"] = update.mode
+    if update.accentColor is not None:
+        changes["accent_color"] = update.accentColor
+    return changes
+
+
+# Section name -> mapping of its update schema to column changes
+SECTION_CHANGES = {
+    "settings": _user_settings_changes,
+    "notifications": _notification_changes,
+    "theme": _theme_changes,
+}
+
+
+def _assignments(table, changes: dict) -> dict:
+    """SET clause applying a write's column changes to a stored row.
+
+    Notification masks are merged rather than overwritten: only the bits
+    of the types the write chose are replaced.
+    """
+    set_ = dict(changes)
+    if "set_mask" in changes:
+        set_["enabled_mask"] = table.c.enabled_mask.bitwise_and(
+            ~changes["set_mask"]
+        ).bitwise_or(changes["enabled_mask"])
+        set_["set_mask"] = table.c.set_mask.bitwise_or(changes["set_mask"])
+    return set_
 
 
-# Default notification items
-DEFAULT_NOTIFICATION_ITEMS = [
-    NotificationItem(
-        key="email",
-        label="Email Notifications",
-        description="Receive notifications via email",
-    ),
-    NotificationItem(
-        key="push",
-        label="Push Notifications",
-        description="Receive browser push notifications",
-    ),
-    NotificationItem(
-        key="assignments",
-        label="Assignment Updates",
-        description="Get notified when assignments change",
-    ),
-    NotificationItem(
-        key="skillUpdates",
-        label="Skill Updates",
-        description="Get notified about skill taxonomy changes",
-    ),
+def _notification_enabled(enabled_mask, set_mask, type_: NotificationType):
+    """Condition that a notification type is on, by choice or by default.
+
+    Constants are inlined rather than bound so the planner can match the
+    partial audience indexes (see ``models.notification_preferences``).
+    """
+    mask, zero = literal_column(str(type_.mask)), literal_column("0")
+    enabled = enabled_mask.bitwise_and(mask) != zero
+    if type_.default:
+        return or_(enabled, set_mask.bitwise_and(mask) == zero)
+    return enabled
+
+
+def _change_fields(section: str, changes: dict) -> dict:
+    """Key a write's column changes as in the section's API response."""
+    if section == "notifications":
+        return notification_registry.chosen(changes["enabled_mask"], changes["set_mask"])
+    return dict(changes)
+
+
+def _versioned(section: str, row) -> Versioned:
+    """Build a section's response and version from its row (or None)."""
+    return Versioned(row.version if row else 0, SECTION_RESPONSES[section](row))
+
+
+# Section name -> UserPreferences columns holding it
+DOCUMENT_COLUMNS = {
+    "settings": ("language", "timezone", "locale"),
+    "notifications": ("enabled_mask", "set_mask"),
+    "theme": ("mode", "accent_color"),
+}
+
+
+def _document_version(section: str):
+    return UserPreferences.__table__.c[f"{section}_version"]
+
+
+def _document_section(section: str, document: UserPreferences | None):
+    """The document as a section row, or None if the section was never saved."""
+    if document is not None and getattr(document, f"{section}_version"):
+        return document
+    return None
+
+
+def _document_versioned(section: str, document: UserPreferences | None) -> Versioned:
+    """Build a section's response and version from a user's document (or None)."""
+    row = _document_section(section, document)
+    return Versioned(
+        getattr(row, f"{section}_version") if row else 0,
+        SECTION_RESPONSES[section](row),
+    )
+
+
+def _section_payload(section: str, row) -> dict:
+    """Serialize one section of a user's preferences for bulk responses."""
+    if section == "settings":
+        return _user_settings_response(row).model_dump()
+    if section == "notifications":
+        return _notification_preferences(row)
+    return _theme_settings_response(row).model_dump(by_alias=True)
+
+
+# Fields of flat export records: one boolean per notification type
+# between the general and theme settings
+EXPORT_FIELDS = [
+    "user_id",
+    *DOCUMENT_COLUMNS["settings"],
+    *(type_.key for type_ in notification_registry.types),
+    *DOCUMENT_COLUMNS["theme"],
 ]
 
 
+def _export_columns(settings, notifications, theme) -> list:
+    """Columns of a flat export record after user_id, labelled by field.
+
+    Takes the table holding each section (the documents table for all
+    three with document storage); missing rows give the defaults.
+    """
+    def value(table, name: str):
+        column = table.c[name]
+        return func.coalesce(column, column.default.arg).label(name)
+
+    enabled_mask = func.coalesce(notifications.c.enabled_mask, 0)
+    set_mask = func.coalesce(notifications.c.set_mask, 0)
+    return [
+        *(value(settings, name) for name in DOCUMENT_COLUMNS["settings"]),
+        *(
+            _notification_enabled(enabled_mask, set_mask, type_).label(type_.key)
+            for type_ in notification_registry.types
+        ),
+        *(value(theme, name) for name in DOCUMENT_COLUMNS["theme"]),
+    ]
+
+
+# Dialect-specific INSERT constructs supporting ON CONFLICT ... DO UPDATE
+_UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+# Tables whose rows are stamped with the transaction that changed them
+CHANGE_TABLES = (
+    UserSettings.__table__,
+    NotificationPreferences.__table__,
+    ThemeSettings.__table__,
+    UserPreferences.__table__,
+)
+
+
+@lru_cache
+def change_version(dialect_name: str):
+    """Value to stamp on rows the current transaction writes.
+
+    On Postgres this is the transaction id, so a reader can tell from its
+    snapshot which changes have settled (see ``_settled_before``). SQLite
+    has a single writer, and one more than the highest stamp will do.
+    Built once per dialect, since every write embeds it.
+
+    The dialects' upserts are never in SQLAlchemy's compiled cache, so
+    the SQLite query (an index lookup per table) is rendered to SQL here
+    once rather than compiled again with every write.
+    """
+    if dialect_name == "postgresql":
+        return cast(cast(func.pg_current_xact_id(), String), BigInteger)
+    latest = union_all(
+        *(select(func.max(table.c.change_version).label("stamp")) for table in CHANGE_TABLES)
+    ).subquery()
+    stamp = select(func.coalesce(func.max(latest.c.stamp), 0) + 1).scalar_subquery()
+    rendered = stamp.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    return literal_column(str(rendered), BigInteger)
+
+
+def _settled_before(dialect_name: str):
+    """Query for the stamp below which every change has committed or aborted.
+
+    Transaction ids are handed out before commit, so a transaction still
+    running may commit a lower stamp than one already visible; everything
+    below the oldest running transaction is final. None on SQLite, where a
+    stamp is only taken by the single writer.
+    """
+    if dialect_name != "postgresql":
+        return None
+    return select(
+        cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), String), BigInteger)
+    )
+
+
+def document_sync_statement(dialect_name: str, user_ids):
+    """Statement copying users' table rows into their documents.
+
+    ``user_ids`` is a list or a subquery of user_ids. A section is only
+    overwritten where the tables hold a newer version than the document,
+    so the statement can be re-run at any time during a migration.
+    """
+    document = UserPreferences.__table__
+    users = union(
+        *(
+            select(model.user_id).where(model.user_id.in_(user_ids))
+            for model in SECTION_MODELS.values()
+        )
+    ).subquery()
+
+    columns = {}
+    source = select(users.c.user_id).select_from(users)
+    for section, model in SECTION_MODELS.items():
+        table = model.__table__
+        source = source.outerjoin(table, table.c.user_id == users.c.user_id)
+        for column in DOCUMENT_COLUMNS[section]:
+            columns[column] = func.coalesce(table.c[column], document.c[column].default.arg)
+        columns[f"{section}_version"] = func.coalesce(table.c.version, 0)
+    columns["change_version"] = change_version(dialect_name)
+    # SQLite needs a WHERE to tell the upsert clause apart from a join's ON
+    source = source.add_columns(*columns.values()).where(true())
+
+    insert = _UPSERT_INSERTS[dialect_name]
+    stmt = insert(document).from_select(["user_id", *columns], source)
+    newer = {
+        section: stmt.excluded[f"{section}_version"] > _document_version(section)
+        for section in SECTION_MODELS
+    }
+    set_ = {"updated_at": func.now(), "change_version": stmt.excluded.change_version}
+    for section in SECTION_MODELS:
+        for column in (*DOCUMENT_COLUMNS[section], f"{section}_version"):
+            set_[column] = case(
+                (newer[section], stmt.excluded[column]), else_=document.c[column]
+            )
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"], set_=set_, where=or_(*newer.values())
+    )
+
+
+def _forget_remote_change(change: PreferenceChange | None) -> None:
+    """Drop what this process cached for a write another worker committed.
+
+    None means changes may have been missed, so everything is dropped.
+    """
+    if change is None:
+        preferences_cache.clear()
+    else:
+        preferences_cache.invalidate((change.section, change.user_id))
+
+
+change_broker.on_remote_change(_forget_remote_change)
+
+
 class SettingsService:
     """Service for managing user settings."""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        cache: TTLCache = preferences_cache,
+        singleflight: SingleFlight = preferences_singleflight,
+        storage: str | None = None,
+        broker: ChangeBroker = change_broker,
+        outbox: OutboxRelay | None = outbox_relay,
+    ):
         self.db = db
+        self.cache = cache
+        self.singleflight = singleflight
+        self.broker = broker
+        # Writes record change events only when a relay will publish them
+        self.outbox = outbox
+        self.storage = storage or get_settings().preferences_storage
+        # Reads pinned to the primary after a write skip the cache and do
+        # not share queries with replica reads
+        self.read_your_writes = db.info.get("read_your_writes", False)
 
-    async def get_user_settings(self, user_id: str) -> UserSettingsResponse:
-        """Get user's general settings."""
-        result = await self.db.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
+    def _cached(self, key: tuple) -> Versioned | None:
+        return None if self.read_your_writes else self.cache.get(key)
+
+    def _fill(self, key: tuple, value: Versioned, generation: int) -> None:
+        # A replica may still lag behind a write another worker just evicted
+        # the key for, and its row would then stay cached for the whole TTL
+        if "replica" not in self.db.info:
+            self.cache.fill(key, value, generation)
+
+    def _flight_key(self, *key) -> tuple:
+        return (*key, "primary") if self.read_your_writes else key
+
+    async def _read(self, stmt):
+        """Execute a read, retrying on the primary if the replica fails."""
+        try:
+            return await self.db.execute(stmt)
+        except (OperationalError, InterfaceError, OSError):
+            if not await fall_back_to_primary(self.db):
+                raise
+        return await self.db.execute(stmt)
+
+    async def _stream(self, stmt, batch_size: int, scalars: bool = False):
+        """Open a server-side cursor, retrying on the primary if the replica fails.
+
+        Only opening the cursor is retried: a failure after rows have been
+        handed out propagates.
+        """
+        stream = self.db.stream_scalars if scalars else self.db.stream
+        try:
+            return await stream(stmt, execution_options={"yield_per": batch_size})
+        except (OperationalError, InterfaceError, OSError):
+            if not await fall_back_to_primary(self.db):
+                raise
+        return await stream(stmt, execution_options={"yield_per": batch_size})
+
+    async def _load_document(self, user_id: str) -> UserPreferences | None:
+        """The user's document, or None if there is none (or no documents)."""
+        if self.storage == "tables":
+            return None
+        result = await self._read(
+            select(UserPreferences).where(UserPreferences.user_id == user_id)
         )
-        settings = result.scalar_one_or_none()
+        return result.scalar_one_or_none()
 
-        if settings:
-            return UserSettingsResponse.model_validate(settings)
+    def _use_document(self, document: UserPreferences | None) -> bool:
+        # While migrating, users without a document are read from the tables
+        return document is not None or self.storage == "document"
 
-        # Return defaults
-        return UserSettingsResponse()
+    @db_operation
+    async def get_section(self, user_id: str, section: PreferenceSection) -> Versioned:
+        """Get one section's response and version, from the cache if possible.
 
-    async def update_user_settings(
-        self, user_id: str, update: UserSettingsUpdate
-    ) -> UserSettingsResponse:
-        """Update user's general settings."""
-        result = await self.db.execute(
-            select(UserSettings).where(UserSettings.user_id == user_id)
+        Concurrent misses for the same user and section share one query.
+        """
+        cached = self._cached((section, user_id))
+        if cached is not None:
+            return cached
+        return await self.singleflight.do(
+            self._flight_key(section, user_id),
+            lambda: self._load_section(user_id, section),
         )
-        settings = result.scalar_one_or_none()
 
-        if not settings:
-            # Create new settings
-            settings = UserSettings(
-                user_id=user_id,
-                language=update.language or "en",
-                timezone=update.timezone or "UTC",
-                locale=update.locale or "en-US",
-            )
-            self.db.add(settings)
+    async def _load_section(self, user_id: str, section: PreferenceSection) -> Versioned:
+        generation = self.cache.generation
+        document = await self._load_document(user_id)
+        if self._use_document(document):
+            value = _document_versioned(section, document)
         else:
-            # Update existing
-            if update.language is not None:
-                settings.language = update.language
-            if update.timezone is not None:
-                settings.timezone = update.timezone
-            if update.locale is not None:
-                settings.locale = update.locale
-
-        await self.db.flush()
-        return UserSettingsResponse.model_validate(settings)
+            model = SECTION_MODELS[section]
+            result = await self._read(select(model).where(model.user_id == user_id))
+            value = _versioned(section, result.scalar_one_or_none())
+        self._fill((section, user_id), value, generation)
+        return value
 
-    async def get_notification_settings(self, user_id: str) -> NotificationSettingsResponse:
-        """Get user's notification preferences."""
-        result = await self.db.execute(
-            select(NotificationPreferences).where(
-                NotificationPreferences.user_id == user_id
+    @db_operation
+    async def get_section_version(self, user_id: str, section: PreferenceSection) -> int:
+        """Get a section's current version without loading the full row."""
+        cached = self._cached((section, user_id))
+        if cached is not None:
+            return cached.version
+        return await self.singleflight.do(
+            self._flight_key(section, user_id, "version"),
+            lambda: self._load_section_version(user_id, section),
+        )
+
+    async def _load_section_version(self, user_id: str, section: PreferenceSection) -> int:
+        if self.storage != "tables":
+            result = await self._read(
+                select(_document_version(section)).where(UserPreferences.user_id == user_id)
             )
+            version = result.scalar_one_or_none()
+            if version is not None or self.storage == "document":
+                return version or 0
+
+        model = SECTION_MODELS[section]
+        result = await self._read(
+            select(model.version).where(model.user_id == user_id)
         )
-        prefs = result.scalar_one_or_none()
-
-        if prefs:
-            preferences = {
-                "email": prefs.email_enabled,
-                "push": prefs.push_enabled,
-                "assignments": prefs.assignments_enabled,
-                "skillUpdates": prefs.skill_updates_enabled,
-            }
+        return result.scalar_one_or_none() or 0
+
+    @db_operation
+    async def put_section(
+        self,
+        user_id: str,
+        section: PreferenceSection,
+        update: BaseModel,
+        expected_version: int | None = None,
+    ) -> Versioned:
+        """Apply a section's update schema and return its new state.
+
+        With ``expected_version`` the write only applies if the stored row
+        is still at that version (0 meaning no row yet), otherwise
+        ``PreconditionFailedError`` is raised. Once the surrounding
+        transaction commits, the cache is refreshed and the change is
+        published to the user's streams; with an outbox relay, the change
+        event is written in the same transaction. A timezone zoneinfo does
+        not know raises ``InvalidTimezoneError`` before anything is written.
+        """
+        if section == "settings" and update.timezone is not None:
+            check_timezone(update.timezone)
+        changes = SECTION_CHANGES[section](update)
+        if self.storage == "document":
+            row = await self._write_document(user_id, section, changes, expected_version)
         else:
-            # Return defaults
-            preferences = {
-                "email": False,
-                "push": True,
-                "assignments": False,
-                "skillUpdates": True,
-            }
+            row = await self._write(SECTION_MODELS[section], user_id, changes, expected_version)
+        if row is None:
+            raise PreconditionFailedError(section, expected_version)
 
-        return NotificationSettingsResponse(
-            items=DEFAULT_NOTIFICATION_ITEMS,
-            preferences=preferences,
-        )
+        if self.storage == "document":
+            value = _document_versioned(section, row)
+        else:
+            value = _versioned(section, row)
+            if self.storage == "dual":
+                await self.db.execute(
+                    document_sync_statement(self.db.get_bind().dialect.name, [user_id])
+                )
+
+        change = None
+        if changes:
+            change = PreferenceChange(
+                user_id, section, value.version, _change_fields(section, changes)
+            )
+            if self.outbox is not None:
+                await self.db.execute(outbox_insert(change))
+
+        def committed():
+            self.cache.put((section, user_id), value)
+            recent_writes.mark(user_id)
+            if change is not None:
+                self.broker.publish(change)
+                if self.outbox is not None:
+                    self.outbox.wake()
+
+        run_after_commit(self.db, committed)
+        return value
+
+    async def _write(
+        self, model, user_id: str, changes: dict, expected_version: int | None = None
+    ) -> Row | None:
+        """Write a user's row in one statement and return it.
+
+        Without ``expected_version`` this is an upsert: only the columns in
+        ``changes`` are overwritten on conflict, and a new row takes the
+        model's column defaults for everything else. With it, the row is
+        only inserted (version 0) or updated (version N) if it is still at
+        that version; otherwise None is returned.
+        """
+        table = model.__table__
+        dialect_name = self.db.get_bind().dialect.name
+        set_ = _assignments(table, changes)
+        if changes:
+            set_["version"] = table.c.version + 1
+            set_["change_version"] = change_version(dialect_name)
+            set_["updated_at"] = func.now()
+
+        if expected_version:
+            stmt = (
+                update(table)
+                .where(table.c.user_id == user_id, table.c.version == expected_version)
+                # Nothing to change, but the row still has to be returned
+                .values(set_ or {"user_id": table.c.user_id})
+            )
+        else:
+            insert = _UPSERT_INSERTS[dialect_name]
+            stmt = insert(table).values(
+                user_id=user_id, **changes, change_version=change_version(dialect_name)
+            )
+            if expected_version == 0:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["user_id"])
+            else:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["user_id"],
+                    # DO UPDATE even without changes so RETURNING yields the row
+                    set_=set_ or {"user_id": stmt.excluded.user_id},
+                )
+
+        result = await self.db.execute(stmt.returning(*table.c))
+        return result.one_or_none()
+
+    async def _write_document(
+        self, user_id: str, section: str, changes: dict, expected_version: int | None = None
+    ) -> Row | None:
+        """Write one section of a user's document and return the row.
+
+        Same contract as ``_write``, with the section's version column in
+        place of the row version.
+        """
+        table = UserPreferences.__table__
+        version = _document_version(section)
+        dialect_name = self.db.get_bind().dialect.name
+        set_ = _assignments(table, changes)
+        if changes:
+            set_[version.name] = version + 1
+            set_["change_version"] = change_version(dialect_name)
+            set_["updated_at"] = func.now()
+
+        if expected_version:
+            stmt = (
+                update(table)
+                .where(table.c.user_id == user_id, version == expected_version)
+                .values(set_ or {"user_id": table.c.user_id})
+            )
+        else:
+            insert = _UPSERT_INSERTS[dialect_name]
+            stmt = insert(table).values(
+                user_id=user_id,
+                **changes,
+                **{version.name: 1},
+                change_version=change_version(dialect_name),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                # The row may exist for another section, so "no row yet"
+                # means this section's version is still 0
+                set_=set_ or {
+                    version.name: case((version == 0, 1), else_=version),
+                    "change_version": case(
+                        (version == 0, stmt.excluded.change_version),
+                        else_=table.c.change_version,
+                    ),
+                },
+                where=(version == 0) if expected_version == 0 else None,
+            )
+
+        result = await self.db.execute(stmt.returning(*table.c))
+        return result.one_or_none()
+
+    async def get_user_settings(self, user_id: str) -> UserSettingsResponse:
+        """Get user's general settings."""
+        return (await self.get_section(user_id, "settings")).value
+
+    async def update_user_settings(
+        self,
+        user_id: str,
+        update: UserSettingsUpdate,
+        expected_version: int | None = None,
+    ) -> UserSettingsResponse:
+        """Update user's general settings."""
+        return (await self.put_section(user_id, "settings", update, expected_version)).value
+
+    async def get_notification_settings(self, user_id: str) -> NotificationSettingsResponse:
+        """Get user's notification preferences."""
+        return (await self.get_section(user_id, "notifications")).value
 
     async def update_notification_settings(
-        self, user_id: str, update: NotificationPreferencesUpdate
+        self,
+        user_id: str,
+        update: NotificationPreferencesUpdate,
+        expected_version: int | None = None,
     ) -> dict[str, bool]:
         """Update user's notification preferences."""
-        result = await self.db.execute(
-            select(NotificationPreferences).where(
-                NotificationPreferences.user_id == user_id
+        written = await self.put_section(user_id, "notifications", update, expected_version)
+        return written.value.preferences
+
+    async def get_theme_settings(self, user_id: str) -> ThemeSettingsResponse:
+        """Get user's theme settings."""
+        return (await self.get_section(user_id, "theme")).value
+
+    async def update_theme_settings(
+        self,
+        user_id: str,
+        update: ThemeSettingsUpdate,
+        expected_version: int | None = None,
+    ) -> ThemeSettingsResponse:
+        """Update user's theme settings."""
+        return (await self.put_section(user_id, "theme", update, expected_version)).value
+
+    @db_operation
+    async def get_all_sections(self, user_id: str) -> dict[str, Versioned]:
+        """Get every section with its version, in at most one round trip."""
+        cached = [self._cached((section, user_id)) for section in SECTION_MODELS]
+        if all(value is not None for value in cached):
+            return dict(zip(SECTION_MODELS, cached))
+        return await self.singleflight.do(
+            self._flight_key("all", user_id), lambda: self._load_all_sections(user_id)
+        )
+
+    async def _load_all_sections(self, user_id: str) -> dict[str, Versioned]:
+        # Outer join all three tables onto the requested user_id so that
+        # missing rows come back as None and fall back to defaults.
+        generation = self.cache.generation
+        document = await self._load_document(user_id)
+        if self._use_document(document):
+            # One primary key lookup covers every section
+            sections = {
+                section: _document_versioned(section, document) for section in SECTION_MODELS
+            }
+            for section, value in sections.items():
+                self._fill((section, user_id), value, generation)
+            return sections
+
+        user = select(literal(user_id, String).label("user_id")).subquery()
+        result = await self._read(
+            select(UserSettings, NotificationPreferences, ThemeSettings)
+            .select_from(user)
+            .outerjoin(UserSettings, UserSettings.user_id == user.c.user_id)
+            .outerjoin(
+                NotificationPreferences,
+                NotificationPreferences.user_id == user.c.user_id,
             )
+            .outerjoin(ThemeSettings, ThemeSettings.user_id == user.c.user_id)
         )
-        prefs = result.scalar_one_or_none()
-
-        if not prefs:
-            prefs = NotificationPreferences(user_id=user_id)
-            self.db.add(prefs)
-
-        # Update preferences from the map
-        if "email" in update.preferences:
-            prefs.email_enabled = update.preferences["email"]
-        if "push" in update.preferences:
-            prefs.push_enabled = update.preferences["push"]
-        if "assignments" in update.preferences:
-            prefs.assignments_enabled = update.preferences["assignments"]
-        if "skillUpdates" in update.preferences:
-            prefs.skill_updates_enabled = update.preferences["skillUpdates"]
-
-        await self.db.flush()
-
-        return {
-            "email": prefs.email_enabled,
-            "push": prefs.push_enabled,
-            "assignments": prefs.assignments_enabled,
-            "skillUpdates": prefs.skill_updates_enabled,
+        sections = {
+            section: _versioned(section, row)
+            for section, row in zip(SECTION_MODELS, result.one())
         }
+        for section, value in sections.items():
+            self._fill((section, user_id), value, generation)
+        return sections
 
-    async def get_theme_settings(self, user_id: str) -> ThemeSettingsResponse:
-        """Get user's theme settings."""
-        result = await self.db.execute(
-            select(ThemeSettings).where(ThemeSettings.user_id == user_id)
+    async def get_all_preferences(self, user_id: str) -> AllPreferencesResponse:
+        """Get general, notification and theme settings in one round trip."""
+        sections = await self.get_all_sections(user_id)
+        return AllPreferencesResponse(
+            **{section: versioned.value for section, versioned in sections.items()}
         )
-        theme = result.scalar_one_or_none()
 
-        if theme:
-            return ThemeSettingsResponse(
-                mode=theme.mode,
-                accent_color=theme.accent_color,
+    @db_operation
+    async def iter_preferences_batch(
+        self,
+        user_ids: Iterable[str],
+        sections: Iterable[PreferenceSection] | None = None,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[list[dict]]:
+        """Yield preferences for many users, one list per chunk of user_ids.
+
+        Each chunk costs one ``WHERE user_id IN (...)`` query per requested
+        section (a single one with document storage); users without a row
+        get the defaults. Duplicate user_ids are returned once.
+        """
+        sections = [s for s in SECTION_MODELS if sections is None or s in sections]
+        user_ids = list(dict.fromkeys(user_ids))
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            rows_by_section = {}
+            if self.storage == "document":
+                result = await self._read(
+                    select(UserPreferences).where(UserPreferences.user_id.in_(chunk))
+                )
+                documents = result.scalars().all()
+                for section in sections:
+                    rows_by_section[section] = {
+                        document.user_id: document
+                        for document in documents
+                        if _document_section(section, document) is not None
+                    }
+            else:
+                for section in sections:
+                    model = SECTION_MODELS[section]
+                    result = await self._read(
+                        select(model).where(model.user_id.in_(chunk))
+                    )
+                    rows_by_section[section] = {
+                        row.user_id: row for row in result.scalars()
+                    }
+
+            yield [
+                {
+                    "user_id": user_id,
+                    **{
+                        section: _section_payload(section, rows.get(user_id))
+                        for section, rows in rows_by_section.items()
+                    },
+                }
+                for user_id in chunk
+            ]
+
+    @db_operation
+    async def iter_notification_audience(
+        self, key: str, batch_size: int = 5000
+    ) -> AsyncIterator[list[str]]:
+        """Yield the user_ids opted into a notification channel, in batches.
+
+        Rows are read through a server-side cursor, so memory stays flat
+        however many users match. When the channel is on by default, users
+        this service knows about (a row in any table) but who never saved
+        notification preferences are included too.
+        """
+        type_ = notification_registry.by_key[key]
+        if self.storage == "document":
+            # Unsaved sections have empty masks, so the defaults apply
+            stmt = select(UserPreferences.user_id).where(
+                _notification_enabled(
+                    UserPreferences.enabled_mask, UserPreferences.set_mask, type_
+                )
+            )
+        else:
+            stmt = select(NotificationPreferences.user_id).where(
+                _notification_enabled(
+                    NotificationPreferences.enabled_mask, NotificationPreferences.set_mask, type_
+                )
             )
+            if type_.default:
+                # Disjoint branches, so UNION ALL needs no de-duplication pass
+                no_prefs = ~(
+                    select(NotificationPreferences.user_id)
+                    .where(NotificationPreferences.user_id == UserSettings.user_id)
+                    .exists()
+                )
+                theme_only = (
+                    ~select(NotificationPreferences.user_id)
+                    .where(NotificationPreferences.user_id == ThemeSettings.user_id)
+                    .exists()
+                ) & (
+                    ~select(UserSettings.user_id)
+                    .where(UserSettings.user_id == ThemeSettings.user_id)
+                    .exists()
+                )
+                stmt = union_all(
+                    stmt,
+                    select(UserSettings.user_id).where(no_prefs),
+                    select(ThemeSettings.user_id).where(theme_only),
+                )
 
-        # Return defaults
-        return ThemeSettingsResponse()
+        result = await self._stream(stmt, batch_size, scalars=True)
+        async for user_ids in result.partitions():
+            yield list(user_ids)
 
-    async def update_theme_settings(
-        self, user_id: str, update: ThemeSettingsUpdate
-    ) -> ThemeSettingsResponse:
-        """Update user's theme settings."""
-        result = await self.db.execute(
-            select(ThemeSettings).where(ThemeSettings.user_id == user_id)
+    @db_operation
+    async def iter_users_at_local_hours(
+        self, hours: Collection[int], batch_size: int = 5000, now: datetime | None = None
+    ) -> AsyncIterator[list[str]]:
+        """Yield the user_ids whose local time is in one of ``hours`` (0-23).
+
+        The zones at a matching UTC offset come from the timezone index, so
+        users are found through the timezone column's index rather than by
+        converting every row. As for the audience stream, users this service
+        knows about but who never saved general settings are on the default
+        timezone. Timezones zoneinfo does not know never match.
+        """
+        zones = timezone_index.zones_at_local_hours(hours, now)
+        if not zones:
+            return
+        if self.storage == "document":
+            # Unsaved sections hold the default timezone
+            stmt = select(UserPreferences.user_id).where(UserPreferences.timezone.in_(zones))
+        else:
+            stmt = select(UserSettings.user_id).where(UserSettings.timezone.in_(zones))
+            if DEFAULT_TIMEZONE in zones:
+                # Disjoint branches, so UNION ALL needs no de-duplication pass
+                notifications_only = ~(
+                    select(UserSettings.user_id)
+                    .where(UserSettings.user_id == NotificationPreferences.user_id)
+                    .exists()
+                )
+                theme_only = (
+                    ~select(UserSettings.user_id)
+                    .where(UserSettings.user_id == ThemeSettings.user_id)
+                    .exists()
+                ) & (
+                    ~select(NotificationPreferences.user_id)
+                    .where(NotificationPreferences.user_id == ThemeSettings.user_id)
+                    .exists()
+                )
+                stmt = union_all(
+                    stmt,
+                    select(NotificationPreferences.user_id).where(notifications_only),
+                    select(ThemeSettings.user_id).where(theme_only),
+                )
+
+        result = await self._stream(stmt, batch_size, scalars=True)
+        async for user_ids in result.partitions():
+            yield list(user_ids)
+
+    @db_operation
+    async def should_notify(
+        self, user_ids: Sequence[str], keys: Sequence[str], chunk_size: int = 5000
+    ) -> np.ndarray:
+        """Decide whether each (user_ids[i], keys[i]) pair may be notified.
+
+        Returns a boolean array aligned with the pairs. Each distinct
+        user's masks are loaded once, ``chunk_size`` users per
+        ``WHERE user_id IN (...)`` query, and every pair is then decided
+        with array operations; users without a row get the type defaults.
+        Keys must be registered types.
+        """
+        codes: dict[str, int] = {}
+        user_codes = np.fromiter(
+            (codes.setdefault(user_id, len(codes)) for user_id in user_ids),
+            dtype=np.intp,
+            count=len(user_ids),
+        )
+        key_masks = notification_registry.key_masks
+        type_masks = np.fromiter(
+            (key_masks[key] for key in keys), dtype=np.int64, count=len(keys)
         )
-        theme = result.scalar_one_or_none()
 
-        if not theme:
-            theme = ThemeSettings(
-                user_id=user_id,
-                mode=update.mode or "system",
-                accent_color=update.accentColor or "#3b82f6",
+        # Empty masks, as for users without a row, mean "all defaults"
+        enabled_mask = np.zeros(len(codes), dtype=np.int64)
+        set_mask = np.zeros(len(codes), dtype=np.int64)
+        model = UserPreferences if self.storage == "document" else NotificationPreferences
+        users = list(codes)
+        for start in range(0, len(users), chunk_size):
+            result = await self._read(
+                select(model.user_id, model.enabled_mask, model.set_mask).where(
+                    model.user_id.in_(users[start:start + chunk_size])
+                )
             )
-            self.db.add(theme)
+            rows = result.all()
+            if rows:
+                found, enabled, chosen = zip(*rows)
+                index = np.fromiter(
+                    (codes[user_id] for user_id in found), dtype=np.intp, count=len(rows)
+                )
+                enabled_mask[index] = enabled
+                set_mask[index] = chosen
+
+        effective = enabled_mask & set_mask | notification_registry.default_mask & ~set_mask
+        return effective[user_codes] & type_masks != 0
+
+    @db_operation
+    async def iter_export_rows(self, batch_size: int = 5000) -> AsyncIterator[list[dict]]:
+        """Yield every known user's merged preferences as flat records.
+
+        Records are keyed by ``EXPORT_FIELDS``, ordered by user_id, and read
+        through a server-side cursor in batches of ``batch_size``.
+        """
+        if self.storage == "document":
+            document = UserPreferences.__table__
+            stmt = select(
+                document.c.user_id, *_export_columns(document, document, document)
+            ).order_by(document.c.user_id)
         else:
-            if update.mode is not None:
-                theme.mode = update.mode
-            if update.accentColor is not None:
-                theme.accent_color = update.accentColor
+            users = union(
+                select(UserSettings.user_id),
+                select(NotificationPreferences.user_id),
+                select(ThemeSettings.user_id),
+            ).subquery()
+            stmt = (
+                select(
+                    users.c.user_id,
+                    *_export_columns(
+                        UserSettings.__table__,
+                        NotificationPreferences.__table__,
+                        ThemeSettings.__table__,
+                    ),
+                )
+                .select_from(users)
+                .outerjoin(UserSettings, UserSettings.user_id == users.c.user_id)
+                .outerjoin(
+                    NotificationPreferences,
+                    NotificationPreferences.user_id == users.c.user_id,
+                )
+                .outerjoin(ThemeSettings, ThemeSettings.user_id == users.c.user_id)
+                .order_by(users.c.user_id)
+            )
 
-        await self.db.flush()
+        result = await self._stream(stmt, batch_size)
+        async for rows in result.mappings().partitions():
+            yield [dict(row) for row in rows]
 
-        return ThemeSettingsResponse(
-            mode=theme.mode,
-            accent_color=theme.accent_color,
+    @db_operation
+    async def get_changes(self, after: ChangeCursor | None, limit: int) -> ChangesPage:
+        """Get up to ``limit`` sections changed after a cursor, oldest first.
+
+        Each item is a section's current version and value; a section
+        changed several times since the cursor appears once. Every table
+        is read with one range scan of its ``change_version`` index, and
+        on Postgres only changes below the oldest running transaction are
+        returned, so a later write can never land behind a cursor already
+        handed out. With document storage, every saved section of a
+        changed document is returned.
+        """
+        dialect_name = self.db.get_bind().dialect.name
+        settled = _settled_before(dialect_name)
+        if settled is not None:
+            # Taken once so the per-table reads agree on it
+            settled = (await self._read(settled)).scalar_one()
+
+        def newer(table, inclusive: bool):
+            position = tuple_(table.c.change_version, table.c.user_id)
+            conditions = []
+            if after is not None:
+                start = tuple_(after.change_version, after.user_id)
+                conditions.append(position >= start if inclusive else position > start)
+            if settled is not None:
+                conditions.append(table.c.change_version < settled)
+            return and_(true(), *conditions)
+
+        candidates = []
+        if self.storage == "document":
+            # Two extra rows: one to tell whether there is a next page, one
+            # in case the cursor's own document has no sections left
+            result = await self._read(
+                select(UserPreferences)
+                .where(newer(UserPreferences.__table__, inclusive=True))
+                .order_by(UserPreferences.change_version, UserPreferences.user_id)
+                .limit(limit + 2)
+            )
+            for document in result.scalars():
+                for section in SECTION_MODELS:
+                    version = getattr(document, f"{section}_version")
+                    if version:
+                        position = ChangeCursor(document.change_version, document.user_id, section)
+                        candidates.append((position, version, document))
+        else:
+            # The tables hold every change, also with dual storage
+            for section, model in SECTION_MODELS.items():
+                # A row at the cursor's own position comes after it only if
+                # its section sorts after the cursor's
+                inclusive = after is not None and section > after.section
+                result = await self._read(
+                    select(model)
+                    .where(newer(model.__table__, inclusive))
+                    .order_by(model.change_version, model.user_id)
+                    .limit(limit + 1)
+                )
+                candidates.extend(
+                    (ChangeCursor(row.change_version, row.user_id, section), row.version, row)
+                    for row in result.scalars()
+                )
+
+        if after is not None:
+            candidates = [candidate for candidate in candidates if candidate[0] > after]
+        candidates.sort(key=lambda candidate: candidate[0])
+        page = candidates[:limit]
+        return ChangesPage(
+            items=[
+                {
+                    "user_id": position.user_id,
+                    "section": position.section,
+                    "version": version,
+                    "value": _section_payload(position.section, row),
+                }
+                for position, version, row in page
+            ],
+            cursor=page[-1][0] if page else after,
+            has_more=len(candidates) > limit,
         )
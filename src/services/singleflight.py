@@ -0,0 +1,62 @@
+"""Single-flight coalescing of concurrent identical reads."""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from ..metrics import SINGLEFLIGHT_COALESCED
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Lets concurrent calls for the same key share one in-flight call.
+
+    The first caller for a key (the leader) runs the query; callers that
+    arrive while it is running wait for and share its result or exception
+    instead of checking out their own connection. Keys are tuples whose
+    first element is used as the metrics label.
+
+    Only use this for reads: followers receive whatever the leader's
+    session saw.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` for ``key``, or join the call already running for it."""
+        while (future := self._calls.get(key)) is not None:
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader was cancelled (e.g. its client disconnected);
+                # take over unless this caller is being cancelled as well.
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            SINGLEFLIGHT_COALESCED.labels(section=key[0]).inc()
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unshared failure is not logged twice
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+# Shared by every SettingsService in this process
+preferences_singleflight = SingleFlight()
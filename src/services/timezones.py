@@ -0,0 +1,133 @@
+"""Timezone validation and the index of zones by current UTC offset.
+
+Scheduled sends ask for the users whose local time is in some hour
+window. Instead of converting every user's timezone, zones are grouped
+by their current UTC offset; a window then matches the zones of the
+offsets whose local time falls inside it, and users are found through
+the index on their timezone column.
+
+The grouping only changes when a zone enters or leaves daylight saving
+time, so each zone's next transition is tracked and the zone is
+regrouped once it has passed.
+"""
+import heapq
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Collection, Iterable
+from zoneinfo import ZoneInfo, available_timezones
+
+# How far ahead (in minutes) a zone's next transition is looked for;
+# zones without one are simply checked again after that long
+TRANSITION_HORIZON = 31 * 24 * 60
+_STEP = 24 * 60
+
+
+class InvalidTimezoneError(ValueError):
+    """Raised for a timezone name zoneinfo does not know."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Unknown timezone '{name}'")
+        self.timezone = name
+
+
+@lru_cache(maxsize=1)
+def known_timezones() -> frozenset[str]:
+    """Names of every zone zoneinfo can load, read from disk once."""
+    return frozenset(available_timezones())
+
+
+def check_timezone(name: str) -> str:
+    """Return ``name`` if it is a known zone, else raise ``InvalidTimezoneError``."""
+    if name not in known_timezones():
+        raise InvalidTimezoneError(name)
+    return name
+
+
+def window_hours(start: int, end: int) -> set[int]:
+    """Local hours (0-23) of the window [start, end).
+
+    A window ending at or before its start wraps past midnight, so 22-6
+    holds the hours from 22:00 to 05:59.
+    """
+    return {hour % 24 for hour in range(start, end if end > start else end + 24)}
+
+
+def _offset(zone: ZoneInfo, minute: int) -> int:
+    """UTC offset of ``zone``, in minutes, at a Unix time given in minutes."""
+    return int(datetime.fromtimestamp(minute * 60, zone).utcoffset().total_seconds()) // 60
+
+
+def next_transition(zone: ZoneInfo, minute: int) -> tuple[int, int]:
+    """The zone's offset at ``minute`` and the first minute it differs.
+
+    Times are Unix minutes. Days are stepped through up to the horizon,
+    then the changing day is bisected; without a transition in the
+    horizon, its end is returned.
+    """
+    offset = _offset(zone, minute)
+    end = minute + TRANSITION_HORIZON
+    low = minute
+    while low < end:
+        high = min(low + _STEP, end)
+        if _offset(zone, high) != offset:
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _offset(zone, middle) == offset:
+                    low = middle
+                else:
+                    high = middle
+            return offset, high
+        low = high
+    return offset, end
+
+
+class TimezoneIndex:
+    """Zones grouped by their current UTC offset in minutes.
+
+    Zones are regrouped lazily: :meth:`refresh` recomputes only those
+    whose next transition has passed, so between transitions it costs a
+    heap peek. Nothing is computed until the first refresh.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        # Offset in minutes -> zones currently at that offset
+        self.buckets: dict[int, set[str]] = {}
+        self._offsets: dict[str, int] = {}
+        # (Unix minute the zone's offset may next change, zone); a sorted
+        # list is a valid heap
+        self._due = [(0, name) for name in sorted(names)]
+
+    def refresh(self, now: datetime) -> None:
+        """Regroup the zones whose offset may have changed by ``now``."""
+        minute = int(now.timestamp()) // 60
+        while self._due and self._due[0][0] <= minute:
+            _, name = heapq.heappop(self._due)
+            offset, changes_at = next_transition(ZoneInfo(name), minute)
+            previous = self._offsets.get(name)
+            if previous != offset:
+                if previous is not None:
+                    self.buckets[previous].discard(name)
+                    if not self.buckets[previous]:
+                        del self.buckets[previous]
+                self.buckets.setdefault(offset, set()).add(name)
+                self._offsets[name] = offset
+            heapq.heappush(self._due, (changes_at, name))
+
+    def zones_at_local_hours(
+        self, hours: Collection[int], now: datetime | None = None
+    ) -> list[str]:
+        """Zones whose local time at ``now`` is in one of ``hours`` (0-23)."""
+        now = now or datetime.now(timezone.utc)
+        self.refresh(now)
+        utc = now.astimezone(timezone.utc)
+        minute_of_day = utc.hour * 60 + utc.minute
+        return sorted(
+            zone
+            for offset, zones in self.buckets.items()
+            if (minute_of_day + offset) // 60 % 24 in hours
+            for zone in zones
+        )
+
+
+# Shared by every SettingsService in this process
+timezone_index = TimezoneIndex(known_timezones())
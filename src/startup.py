@@ -0,0 +1,152 @@
+"""Startup checks, connection pool warm-up and startup timing.
+
+Instead of ``create_all`` (which reflects every table on each boot), the
+service reads the single row of ``alembic_version`` and compares it with
+the revisions this code knows about.
+"""
+import asyncio
+import time
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .config import get_settings
+from .database import engine, replicas
+from .metrics import STARTUP_DURATION
+from .models.notification_preferences import AUDIENCE_INDEX_BITS
+from .services.notification_types import NotificationRegistry
+
+settings = get_settings()
+logger = structlog.get_logger()
+
+# Migration revisions in order; append each new file in
+# migrations/versions here. The last one is the schema this code expects.
+SCHEMA_REVISIONS = ("001", "002", "003", "004", "005", "006", "007", "008", "009", "010")
+SCHEMA_HEAD = SCHEMA_REVISIONS[-1]
+
+
+class SchemaVersionError(RuntimeError):
+    """Raised when the database has not been migrated to ``SCHEMA_HEAD``."""
+
+
+class AudienceIndexError(RuntimeError):
+    """Raised when the registry changed the default of an indexed type."""
+
+
+class StartupTimer:
+    """Wall time of each startup phase, measured from the previous mark."""
+
+    def __init__(self, started_at: float):
+        self.phases: dict[str, float] = {}
+        self._last = started_at
+
+    def mark(self, phase: str, at: float | None = None) -> None:
+        """End ``phase`` now, or at the ``time.perf_counter()`` value ``at``."""
+        at = time.perf_counter() if at is None else at
+        self.phases[phase] = at - self._last
+        self._last = at
+
+    def report(self) -> None:
+        """Log the breakdown and export it as ``STARTUP_DURATION``."""
+        for phase, seconds in self.phases.items():
+            STARTUP_DURATION.labels(phase=phase).set(seconds)
+        logger.info(
+            "Startup complete",
+            total_ms=round(sum(self.phases.values()) * 1000, 1),
+            **{f"{phase}_ms": round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+        )
+
+
+async def check_schema_revision(engine: AsyncEngine) -> None:
+    """Fail unless the database is migrated to at least ``SCHEMA_HEAD``.
+
+    A revision this code does not know is assumed to come from a newer
+    release during a rollout (migrations run first and only add to the
+    schema), so it is logged rather than refused.
+    """
+    try:
+        async with engine.connect() as conn:
+            revision = (
+                await conn.execute(text("SELECT version_num FROM alembic_version"))
+            ).scalar_one_or_none()
+    except DBAPIError as exc:
+        # The table is missing (never migrated) or unreadable
+        raise SchemaVersionError(
+            f"Could not read the schema revision ({exc.orig}); "
+            "run `alembic upgrade head`"
+        ) from exc
+
+    if revision == SCHEMA_HEAD:
+        return
+    if revision in SCHEMA_REVISIONS:
+        raise SchemaVersionError(
+            f"Database schema is at revision {revision}, expected {SCHEMA_HEAD}; "
+            "run `alembic upgrade head`"
+        )
+    if revision is None:
+        raise SchemaVersionError("alembic_version is empty; run `alembic upgrade head`")
+    logger.warning(
+        "Database schema is newer than this release",
+        revision=revision,
+        expected=SCHEMA_HEAD,
+    )
+
+
+def check_audience_indexes(registry: NotificationRegistry) -> None:
+    """Fail if a registered type's default differs from its audience index.
+
+    The partial audience indexes (``AUDIENCE_INDEX_BITS``, built by
+    migration 010) are over the rows a type is on for, which depends on
+    its default. Audience queries for a type whose default changed would
+    no longer match its index, so that needs a migration rebuilding it.
+    """
+    changed = [
+        type_.key
+        for type_ in registry.types
+        if type_.bit in AUDIENCE_INDEX_BITS and type_.default != AUDIENCE_INDEX_BITS[type_.bit]
+    ]
+    if changed:
+        raise AudienceIndexError(
+            f"Default of {', '.join(changed)} differs from its audience index; "
+            "add a migration rebuilding the index and update AUDIENCE_INDEX_BITS"
+        )
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int) -> None:
+    """Open ``connections`` pooled connections at once and return them.
+
+    Connecting concurrently costs about one handshake instead of one per
+    connection, and the first requests then find them in the pool.
+    """
+    opened = await asyncio.gather(
+        *(engine.connect().start() for _ in range(connections)),
+        return_exceptions=True,
+    )
+    await asyncio.gather(
+        *(conn.close() for conn in opened if not isinstance(conn, BaseException))
+    )
+    for result in opened:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def warm_up_pools() -> None:
+    """Fill the primary's and every replica's pool, all concurrently.
+
+    A replica that cannot be reached is marked failed, as a failed read
+    would, instead of failing startup.
+    """
+    connections = settings.database_pool_size
+
+    async def warm_up_replica(replica: AsyncEngine) -> None:
+        try:
+            await warm_up_pool(replica, connections)
+        except (DBAPIError, OSError):
+            replicas.mark_failed(replica)
+
+    await asyncio.gather(
+        warm_up_pool(engine, connections),
+        *(warm_up_replica(replica) for replica in replicas.engines),
+    )
@@ -0,0 +1,20 @@
+import os
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+# Point the module-level engines at SQLite before anything imports src
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """A fresh in-memory database with every table."""
+    from src.database import Base
+
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
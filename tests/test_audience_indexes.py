@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import Base
+from src.models import NotificationPreferences, UserPreferences
+from src.models.notification_preferences import AUDIENCE_INDEX_BITS
+from src.services.notification_types import NotificationRegistry, notification_registry
+from src.services.settings_service import _notification_enabled
+from src.startup import AudienceIndexError, check_audience_indexes
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("model", [NotificationPreferences, UserPreferences])
+async def test_audience_queries_use_the_partial_indexes(model):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for type_ in notification_registry.types:
+            stmt = select(model.user_id).where(
+                _notification_enabled(model.enabled_mask, model.set_mask, type_)
+            )
+            sql = str(stmt.compile(conn.sync_connection))
+            plan = (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")).all()
+            assert f"ix_{model.__tablename__}_audience_bit{type_.bit}" in plan[0][3]
+    await engine.dispose()
+
+
+def test_indexed_defaults_match_the_registry():
+    defaults = {type_.bit: type_.default for type_ in notification_registry.types}
+    assert {bit: defaults[bit] for bit in AUDIENCE_INDEX_BITS} == AUDIENCE_INDEX_BITS
+    check_audience_indexes(notification_registry)
+
+
+def test_changed_default_of_an_indexed_type_fails_startup():
+    types = [
+        type_._replace(default=not type_.default) if type_.key == "push" else type_
+        for type_ in notification_registry.types
+    ]
+    with pytest.raises(AudienceIndexError, match="push"):
+        check_audience_indexes(NotificationRegistry(types))
+
+    # Types without an index may have any default
+    added = types[:1] + [types[0]._replace(key="digest", bit=10, default=True)]
+    check_audience_indexes(NotificationRegistry(added))
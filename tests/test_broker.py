@@ -0,0 +1,131 @@
+import asyncio
+
+import orjson
+import pytest
+
+from src.services.broker import (
+    MAX_NOTIFY_BYTES,
+    ChangeBroker,
+    LocalBackend,
+    PostgresBackend,
+    PreferenceChange,
+    notify_payloads,
+)
+
+
+def change(user_id: str = "u1", version: int = 1) -> PreferenceChange:
+    return PreferenceChange(user_id, "theme", version, {"mode": "dark"})
+
+
+async def drain(subscription) -> list:
+    received = []
+    while True:
+        try:
+            received.append(await asyncio.wait_for(subscription.get(), 0.01))
+        except asyncio.TimeoutError:
+            return received
+
+
+@pytest.mark.asyncio
+async def test_changes_fan_out_to_every_stream_of_the_user():
+    broker = ChangeBroker(LocalBackend(), queue_size=10)
+    with broker.subscribe("u1") as first, broker.subscribe("u1") as second, \
+            broker.subscribe("u2") as other:
+        broker.publish(change("u1"))
+
+        assert await drain(first) == [change("u1")]
+        assert await drain(second) == [change("u1")]
+        assert await drain(other) == []
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_is_told_to_resync_when_its_queue_fills():
+    broker = ChangeBroker(LocalBackend(), queue_size=2)
+    with broker.subscribe("u1") as subscription:
+        for version in (1, 2, 3):
+            broker.publish(change(version=version))
+
+        # The queued changes were dropped for a single resync marker
+        assert await drain(subscription) == [None]
+
+        broker.publish(change(version=4))
+        assert await drain(subscription) == [change(version=4)]
+
+
+@pytest.mark.asyncio
+async def test_closed_streams_stop_receiving():
+    broker = ChangeBroker(LocalBackend(), queue_size=10)
+    with broker.subscribe("u1"):
+        pass
+    assert broker._subscriptions == {}
+    broker.publish(change())
+
+
+@pytest.mark.asyncio
+async def test_remote_changes_reach_listeners_and_streams():
+    broker = ChangeBroker(LocalBackend(), queue_size=10)
+    seen = []
+    broker.on_remote_change(seen.append)
+    with broker.subscribe("u1") as subscription:
+        broker.publish(change(version=1))
+        broker.receive(change(version=2))
+
+        assert seen == [change(version=2)]
+        assert await drain(subscription) == [change(version=1), change(version=2)]
+
+
+@pytest.mark.asyncio
+async def test_resync_reaches_every_stream_and_listener():
+    broker = ChangeBroker(LocalBackend(), queue_size=10)
+    seen = []
+    broker.on_remote_change(seen.append)
+    with broker.subscribe("u1") as first, broker.subscribe("u2") as second:
+        broker.publish(change("u1"))
+        broker.resync()
+
+        assert seen == [None]
+        assert await drain(first) == [None]
+        assert await drain(second) == [None]
+
+
+def test_notify_payloads_fit_and_round_trip():
+    changes = [change(f"user-{i:06d}", version=i) for i in range(500)]
+    payloads = list(notify_payloads(changes))
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) <= MAX_NOTIFY_BYTES for payload in payloads)
+    decoded = [PreferenceChange(*item) for payload in payloads for item in orjson.loads(payload)]
+    assert decoded == changes
+
+
+class _Connection:
+    def get_server_pid(self) -> int:
+        return 100
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_skips_its_own_notifications():
+    backend = PostgresBackend("postgresql://unused")
+    broker = ChangeBroker(backend, queue_size=10)
+    seen = []
+    broker.on_remote_change(seen.append)
+    (payload,) = notify_payloads([change(version=7)])
+
+    backend._on_notification(_Connection(), 100, backend.channel, payload)
+    assert seen == []
+
+    backend._on_notification(_Connection(), 200, backend.channel, payload)
+    assert seen == [change(version=7)]
+
+
+@pytest.mark.asyncio
+async def test_postgres_backend_only_queues_once_connected():
+    backend = PostgresBackend("postgresql://unused")
+    broker = ChangeBroker(backend, queue_size=10)
+
+    with broker.subscribe("u1") as subscription:
+        for version in range(1, 1001):
+            broker.publish(change(version=version))
+        assert backend._pending == []
+        # Still delivered to this process's streams
+        assert (await drain(subscription))[-1] == change(version=1000)
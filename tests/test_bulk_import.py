@@ -0,0 +1,104 @@
+import gzip
+
+import pytest
+from sqlalchemy import select
+
+from src.models import OutboxEvent, UserSettings
+from src.services.broker import ChangeBroker, LocalBackend
+from src.services.bulk_import import import_preferences, iter_lines
+from src.services.cache import preferences_cache
+from src.services.outbox import MemorySink, OutboxRelay
+from src.services.settings_service import Versioned
+
+
+async def chunks_of(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def languages(engine) -> dict[str, str]:
+    async with engine.connect() as conn:
+        rows = await conn.execute(select(UserSettings.user_id, UserSettings.language))
+        return dict(rows.all())
+
+
+@pytest.mark.asyncio
+async def test_csv_fields_may_span_lines(engine):
+    body = b'user_id,language,accent_color\nu1,en,"#fff"\n"u\n2",de,\n"u3","not a\n""language""",\n'
+    report = await import_preferences(
+        iter_lines(chunks_of(body)), "csv", bind=engine, storage="tables"
+    )
+
+    assert (report.rows, report.imported, report.rejected) == (3, 2, 1)
+    assert report.errors[0]["line"] == 5
+    assert report.errors[0]["user_id"] == "u3"
+    assert await languages(engine) == {"u1": "en", "u\n2": "de"}
+
+
+@pytest.mark.asyncio
+async def test_unterminated_csv_field_is_rejected(engine):
+    body = b'user_id,language\nu1,en\n"u2,de\n'
+    report = await import_preferences(iter_lines(chunks_of(body)), "csv", bind=engine)
+
+    assert (report.imported, report.rejected, report.complete) == (1, 1, True)
+    assert report.errors[0]["line"] == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        (gzip.compress(b'{"user_id": "u1", "language": "en"}\n' * 3)[:-12], "truncated"),
+        (gzip.compress(b'{"user_id": "u1"}\n')[:10] + b"\xff" * 20, "not valid gzip"),
+    ],
+)
+async def test_corrupt_gzip_stops_the_import(engine, body, error):
+    report = await import_preferences(
+        iter_lines(chunks_of(body), gzip=True), bind=engine, storage="tables"
+    )
+
+    assert not report.complete
+    assert error in report.errors[-1]["error"]
+
+
+@pytest.mark.asyncio
+async def test_rows_before_invalid_utf8_are_imported(engine):
+    body = b'{"user_id": "u1", "language": "en"}\n{"user_id": "u2", "language": "\xe9"}\n'
+    report = await import_preferences(iter_lines(chunks_of(body)), bind=engine, storage="tables")
+
+    assert (report.imported, report.complete) == (1, False)
+    assert report.errors == [{"line": 2, "user_id": None, "error": report.errors[0]["error"]}]
+    assert "UTF-8" in report.errors[0]["error"]
+    assert await languages(engine) == {"u1": "en"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+async def test_imported_changes_are_published_and_recorded(engine, storage):
+    broker = ChangeBroker(LocalBackend(), queue_size=10)
+    outbox = OutboxRelay(MemorySink(), batch_size=10, poll_seconds=1)
+    preferences_cache.put(("theme", "u1"), Versioned(1, "cached"))
+    body = (
+        b'{"user_id": "u1", "mode": "dark", "push": false}\n'
+        b'{"user_id": "u2", "language": "de"}\n'
+    )
+
+    with broker.subscribe("u1") as subscription:
+        await import_preferences(
+            iter_lines(chunks_of(body)),
+            bind=engine,
+            storage=storage,
+            broker=broker,
+            outbox=outbox,
+        )
+        received = {(await subscription.get()).section for _ in range(2)}
+
+    assert received == {"notifications", "theme"}
+    assert preferences_cache.get(("theme", "u1")) is None
+    async with engine.connect() as conn:
+        events = (await conn.execute(select(OutboxEvent))).all()
+    assert sorted((e.user_id, e.section, e.version, e.changes) for e in events) == [
+        ("u1", "notifications", 1, {"push": False}),
+        ("u1", "theme", 1, {"mode": "dark"}),
+        ("u2", "settings", 1, {"language": "de"}),
+    ]
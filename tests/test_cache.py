@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.config import Settings
+from src.database import Base
+from src.models import ThemeSettings
+from src.services.broker import PreferenceChange, change_broker
+from src.services.cache import TTLCache, preferences_cache
+from src.services.settings_service import SettingsService, Versioned
+
+
+def test_cache_is_off_for_several_workers_without_a_shared_broker():
+    assert Settings(database_url="sqlite+aiosqlite://", web_concurrency=2).cache_max_size == 0
+    assert Settings(database_url="sqlite+aiosqlite://", web_concurrency=1).cache_max_size > 0
+
+    shared = Settings(database_url="postgresql+asyncpg://db/prefs", web_concurrency=2)
+    assert shared.broker_backend == "postgres"
+    assert shared.cache_max_size > 0
+
+
+def test_writes_from_other_workers_evict_cached_entries():
+    preferences_cache.put(("theme", "u1"), Versioned(1, "cached"))
+    preferences_cache.put(("theme", "u2"), Versioned(1, "cached"))
+
+    change_broker.receive(PreferenceChange("u1", "theme", 2, {"mode": "dark"}))
+    assert preferences_cache.get(("theme", "u1")) is None
+    assert preferences_cache.get(("theme", "u2")) is not None
+
+    change_broker.resync()
+    assert len(preferences_cache) == 0
+
+
+async def _theme_database(version: int):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(ThemeSettings).values(user_id="u1", mode="dark", version=version)
+        )
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_lagging_replica_reads_are_not_cached():
+    primary, replica = await _theme_database(2), await _theme_database(1)
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    cache.put(("theme", "u1"), Versioned(1, "cached"))
+    # Another worker wrote version 2
+    cache.invalidate(("theme", "u1"))
+
+    async with AsyncSession(replica) as session:
+        session.info["replica"] = replica
+        stale = await SettingsService(session, cache=cache, storage="tables").get_section(
+            "u1", "theme"
+        )
+    assert stale.version == 1
+    assert cache.get(("theme", "u1")) is None
+
+    async with AsyncSession(primary) as session:
+        current = await SettingsService(session, cache=cache, storage="tables").get_section(
+            "u1", "theme"
+        )
+    assert current.version == 2
+    assert cache.get(("theme", "u1")).version == 2
+
+    await primary.dispose()
+    await replica.dispose()
@@ -0,0 +1,157 @@
+import random
+
+import pytest
+from sqlalchemy import literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import ThemeSettings, UserPreferences, UserSettings
+from src.schemas import NotificationPreferencesUpdate, ThemeSettingsUpdate, UserSettingsUpdate
+from src.services import settings_service
+from src.services.broker import ChangeBroker, LocalBackend
+from src.services.cache import TTLCache
+from src.services.settings_service import SECTION_MODELS, SettingsService
+
+UPDATES = {
+    "settings": lambda n: UserSettingsUpdate(language=f"l{n % 90 + 10}"),
+    "notifications": lambda n: NotificationPreferencesUpdate(preferences={"email": n % 2 == 0}),
+    "theme": lambda n: ThemeSettingsUpdate(mode=("light", "dark", "system")[n % 3]),
+}
+
+
+def service(session: AsyncSession, storage: str) -> SettingsService:
+    return SettingsService(
+        session,
+        cache=TTLCache(max_size=0, ttl_seconds=0),
+        storage=storage,
+        broker=ChangeBroker(LocalBackend(), queue_size=10),
+        outbox=None,
+    )
+
+
+async def write(engine, storage: str, user_id: str, section: str, n: int) -> int:
+    async with AsyncSession(engine) as session:
+        written = await service(session, storage).put_section(
+            user_id, section, UPDATES[section](n)
+        )
+        await session.commit()
+    return written.version
+
+
+async def poll(engine, storage: str, cursor, limit: int, between_pages=None):
+    """Follow the feed from ``cursor`` until it has nothing more."""
+    items = []
+    while True:
+        async with AsyncSession(engine) as session:
+            page = await service(session, storage).get_changes(cursor, limit)
+        items.extend(page.items)
+        cursor = page.cursor
+        if not page.has_more:
+            return items, cursor
+        if between_pages is not None:
+            await between_pages()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+async def test_paging_through_interleaved_writes_returns_each_change_once(engine, storage):
+    rng = random.Random(3)
+    latest: dict[tuple[str, str], int] = {}
+    mirrored: dict[tuple[str, str], int] = {}
+    writes = 0
+
+    async def write_some(count: int) -> None:
+        nonlocal writes
+        for _ in range(count):
+            user_id, section = f"u{rng.randrange(6)}", rng.choice(list(UPDATES))
+            writes += 1
+            latest[(user_id, section)] = await write(engine, storage, user_id, section, writes)
+
+    cursor = None
+    for _ in range(5):
+        await write_some(8)
+        # A write between each of the first pages, then let the poll catch up
+        interleaved = iter([1] * 6)
+        items, cursor = await poll(
+            engine,
+            storage,
+            cursor,
+            limit=2,
+            between_pages=lambda: write_some(next(interleaved, 0)),
+        )
+        for item in items:
+            key = (item["user_id"], item["section"])
+            if storage == "document" and item["version"] == mirrored.get(key):
+                # A changed document brings its unchanged sections along
+                continue
+            # Never a change the consumer already has
+            assert item["version"] > mirrored.get(key, 0), key
+            mirrored[key] = item["version"]
+
+    items, cursor = await poll(engine, storage, cursor, limit=2)
+    for item in items:
+        mirrored[(item["user_id"], item["section"])] = item["version"]
+    assert mirrored == latest
+    # Caught up: nothing more until the next write
+    assert (await poll(engine, storage, cursor, limit=2))[0] == []
+
+
+@pytest.mark.asyncio
+async def test_sqlite_stamps_increase_across_tables(engine):
+    stamps = []
+    for n, (user_id, section) in enumerate(
+        [("a", "theme"), ("b", "settings"), ("a", "notifications"), ("a", "theme")]
+    ):
+        await write(engine, "dual", user_id, section, n)
+        async with engine.connect() as conn:
+            section_stamp = (
+                await conn.execute(
+                    select(SECTION_MODELS[section].change_version).where(
+                        SECTION_MODELS[section].user_id == user_id
+                    )
+                )
+            ).scalar_one()
+            document_stamp = (
+                await conn.execute(
+                    select(UserPreferences.change_version).where(UserPreferences.user_id == user_id)
+                )
+            ).scalar_one()
+        # Each statement of the write takes one more than any stamp before it
+        stamps += [section_stamp, document_stamp]
+
+    assert stamps == list(range(1, 9))
+
+
+@pytest.mark.asyncio
+async def test_changes_from_running_transactions_hold_the_feed_back(engine, monkeypatch):
+    for n, user_id in enumerate(["a", "b", "c"]):
+        await write(engine, "tables", user_id, "theme", n)
+    # "b" stands for a transaction that took its stamp before "c" but has
+    # not committed; Postgres reports its id as the snapshot's xmin
+    async with engine.begin() as conn:
+        stamps = dict(
+            (await conn.execute(select(ThemeSettings.user_id, ThemeSettings.change_version))).all()
+        )
+    settled = stamps["b"]
+    monkeypatch.setattr(settings_service, "_settled_before", lambda dialect: select(literal(settled)))
+
+    items, cursor = await poll(engine, "tables", None, limit=10)
+    assert [item["user_id"] for item in items] == ["a"]
+
+    # Once it has committed, neither it nor what followed is skipped
+    settled = stamps["c"] + 1
+    items, cursor = await poll(engine, "tables", cursor, limit=10)
+    assert [item["user_id"] for item in items] == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_sections_sharing_a_stamp_are_split_across_pages(engine):
+    await write(engine, "tables", "a", "theme", 0)
+    await write(engine, "tables", "a", "settings", 1)
+    # One transaction wrote both sections
+    async with engine.begin() as conn:
+        for model in (UserSettings, ThemeSettings):
+            await conn.execute(update(model).values(change_version=7))
+
+    first, cursor = await poll(engine, "tables", None, limit=1)
+    assert len(first) == 2
+    assert [item["section"] for item in first] == ["settings", "theme"]
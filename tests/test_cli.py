@@ -0,0 +1,38 @@
+import argparse
+
+import pytest
+
+from src.cli import _import
+from src.database import Base, engine
+from src.services.broker import BrokerBackend, change_broker
+
+
+class RecordingBackend(BrokerBackend):
+    def __init__(self):
+        self.calls = []
+
+    async def connect(self) -> None:
+        self.calls.append("connect")
+
+    def publish(self, change) -> None:
+        self.calls.append((change.user_id, change.section))
+
+    async def close(self) -> None:
+        self.calls.append("close")
+
+
+@pytest.mark.asyncio
+async def test_import_publishes_through_a_connected_broker(tmp_path, monkeypatch):
+    backend = RecordingBackend()
+    backend.start(change_broker)
+    monkeypatch.setattr(change_broker, "backend", backend)
+    path = tmp_path / "preferences.ndjson"
+    path.write_text('{"user_id": "u1", "mode": "dark"}\n{"user_id": "u2", "language": "de"}\n')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    await _import(argparse.Namespace(input=str(path), gzip=False, format="ndjson", batch_size=10))
+
+    assert backend.calls[0] == "connect"
+    assert backend.calls[-1] == "close"
+    assert sorted(backend.calls[1:-1]) == [("u1", "theme"), ("u2", "settings")]
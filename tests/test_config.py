@@ -0,0 +1,34 @@
+import pytest
+from pydantic import ValidationError
+
+from src.config import Settings
+
+POSTGRES = "postgresql+asyncpg://db/prefs"
+
+
+def test_pools_leave_room_for_the_broker_connection():
+    settings = Settings(
+        database_url=POSTGRES, web_concurrency=4, database_max_connections=40
+    )
+    assert settings.broker_backend == "postgres"
+    # 10 per worker, one of them the broker's
+    assert settings.database_pool_size + settings.database_max_overflow == 9
+
+    local = Settings(
+        database_url=POSTGRES,
+        web_concurrency=4,
+        database_max_connections=40,
+        broker_backend="local",
+    )
+    assert local.database_pool_size + local.database_max_overflow == 10
+
+
+def test_cap_without_room_for_a_pooled_connection_is_rejected():
+    with pytest.raises(ValidationError):
+        Settings(database_url=POSTGRES, web_concurrency=4, database_max_connections=4)
+    Settings(
+        database_url=POSTGRES,
+        web_concurrency=4,
+        database_max_connections=4,
+        broker_backend="local",
+    )
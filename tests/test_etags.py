@@ -0,0 +1,29 @@
+import pytest
+from fastapi import HTTPException
+
+from src.routes.settings import _expected_version, make_etag
+from src.services.notification_types import (
+    NotificationRegistry,
+    NotificationType,
+    notification_registry,
+)
+
+
+def test_registry_changes_change_the_fingerprint():
+    types = [NotificationType("email", 0, "Email", "Emails", True)]
+    changed = [types[0]._replace(default=False)]
+
+    assert NotificationRegistry(types).fingerprint == NotificationRegistry(types).fingerprint
+    assert NotificationRegistry(types).fingerprint != NotificationRegistry(changed).fingerprint
+
+
+def test_notification_etags_from_another_registry_match_no_version(monkeypatch):
+    etag = make_etag("notifications", 3)
+    assert _expected_version(etag, "notifications") == 3
+    assert _expected_version(make_etag("theme", 3), "theme") == 3
+
+    monkeypatch.setattr(notification_registry, "fingerprint", "00000000")
+    assert make_etag("notifications", 3) != etag
+    with pytest.raises(HTTPException) as raised:
+        _expected_version(etag, "notifications")
+    assert raised.value.status_code == 412
@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from src.config import get_settings
+from src.routes.settings import INTERNAL_SCOPE, require_internal_caller
+
+settings = get_settings()
+
+
+def token(scope: str, secret: str = settings.jwt_secret) -> str:
+    claims = {"sub": "dispatcher", "scope": scope}
+    return "Bearer " + jwt.encode(claims, secret, algorithm=settings.jwt_algorithm)
+
+
+@pytest.mark.asyncio
+async def test_service_token_with_the_internal_scope_is_accepted():
+    assert await require_internal_caller(token(f"openid {INTERNAL_SCOPE}")) == "dispatcher"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "authorization, status_code",
+    [
+        (None, 401),
+        ("Bearer", 401),
+        ("Basic dXNlcjpwYXNz", 401),
+        (token(INTERNAL_SCOPE, secret="someone-else"), 401),
+        (token("openid"), 403),
+    ],
+)
+async def test_other_callers_are_rejected(authorization, status_code):
+    with pytest.raises(HTTPException) as raised:
+        await require_internal_caller(authorization)
+    assert raised.value.status_code == status_code
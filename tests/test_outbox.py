@@ -0,0 +1,72 @@
+import httpx
+import orjson
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database import Base
+from src.metrics import OUTBOX_BACKLOG
+from src.models import OutboxEvent
+from src.services.broker import PreferenceChange
+from src.services.outbox import HttpSink, MemorySink, OutboxRelay, outbox_values
+
+
+@pytest_asyncio.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(OutboxEvent),
+            [
+                outbox_values(PreferenceChange(f"u{n}", "theme", 1, {"mode": "dark"}))
+                for n in range(3)
+            ],
+        )
+    yield async_sessionmaker(engine)
+    await engine.dispose()
+
+
+def backlog() -> float:
+    return OUTBOX_BACKLOG._value.get()
+
+
+@pytest.mark.asyncio
+async def test_backlog_is_counted_at_most_once_per_interval(session_factory):
+    sink = MemorySink(max_events=2)
+    relay = OutboxRelay(sink, 1, 1, session_factory, backlog_interval=60)
+
+    assert await relay.relay_batch() == 1
+    assert backlog() == 2
+    assert await relay.relay_batch() == 1
+    assert backlog() == 2
+
+    relay.backlog_interval = 0
+    assert await relay.relay_batch() == 1
+    assert backlog() == 0
+    # Only the latest events are kept
+    assert [event["user_id"] for event in sink.events] == ["u1", "u2"]
+
+
+@pytest.mark.asyncio
+async def test_events_the_webhook_rejects_are_kept(session_factory):
+    posted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        posted.append(request)
+        return httpx.Response(503 if len(posted) == 1 else 204)
+
+    sink = HttpSink("http://events.test/preferences", timeout=1)
+    sink._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    relay = OutboxRelay(sink, 10, 1, session_factory)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await relay.relay_batch()
+    assert await relay.relay_batch() == 3
+    assert await relay.relay_batch() == 0
+    await relay.stop()
+
+    assert posted[0].content == posted[1].content
+    assert [event["user_id"] for event in orjson.loads(posted[1].content)] == ["u0", "u1", "u2"]
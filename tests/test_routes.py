@@ -0,0 +1,136 @@
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import get_settings
+from src.main import app
+from src.routes.settings import get_db, get_user_read_db
+from src.schemas import AllPreferencesResponse
+from src.services.cache import preferences_cache
+
+PREFIX = "/api/v1/user-preferences"
+SECTIONS = {"settings": "", "notifications": "/notifications", "theme": "/theme"}
+
+# Writes per user, in order; "never-saved" only ever reads defaults
+WRITES = {
+    "everything": [
+        ("settings", {"language": "de", "timezone": "Europe/Berlin"}),
+        ("notifications", {"email": True, "push": False}),
+        ("theme", {"mode": "dark", "accentColor": "#112233"}),
+        ("notifications", {"push": True, "unregistered": True}),
+        ("settings", {"locale": "de-DE"}),
+    ],
+    "theme-only": [("theme", {"mode": "light"})],
+    "notifications-only": [("notifications", {"skillUpdates": False})],
+    "never-saved": [],
+}
+
+
+@pytest_asyncio.fixture
+async def client(engine):
+    async def session():
+        async with AsyncSession(engine) as session:
+            yield session
+            if session.in_transaction():
+                await session.commit()
+
+    app.dependency_overrides = {get_db: session, get_user_read_db: session}
+    preferences_cache.clear()
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+    app.dependency_overrides = {}
+    preferences_cache.clear()
+
+
+def use_storage(monkeypatch, storage: str) -> None:
+    monkeypatch.setattr(get_settings(), "preferences_storage", storage)
+    # Cached responses were read with the previous storage
+    preferences_cache.clear()
+
+
+async def put(client, user_id: str, section: str, body: dict, **headers) -> httpx.Response:
+    if section == "notifications":
+        body = {"preferences": body}
+    return await client.put(
+        PREFIX + SECTIONS[section], json=body, headers={"X-User-ID": user_id, **headers}
+    )
+
+
+async def read_everything(client) -> dict:
+    """Every user's sections and /all, with their ETags."""
+    responses = {}
+    for user_id in WRITES:
+        for name, path in [*SECTIONS.items(), ("all", "/all")]:
+            response = await client.get(PREFIX + path, headers={"X-User-ID": user_id})
+            assert response.status_code == 200
+            responses[user_id, name] = (response.headers["ETag"], response.json())
+    return responses
+
+
+async def write_everything(client) -> None:
+    for user_id, writes in WRITES.items():
+        for section, body in writes:
+            assert (await put(client, user_id, section, body)).status_code == 200
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["dual", "document"])
+async def test_storage_modes_serve_what_table_storage_does(
+    engine, client, monkeypatch, storage
+):
+    use_storage(monkeypatch, "tables")
+    await write_everything(client)
+    expected = await read_everything(client)
+
+    # Written in table storage, read while migrating
+    if storage == "dual":
+        use_storage(monkeypatch, storage)
+        assert await read_everything(client) == expected
+
+    async with engine.begin() as conn:
+        for table in ("user_settings", "notification_preferences", "theme_settings"):
+            await conn.exec_driver_sql(f"DELETE FROM {table}")
+    use_storage(monkeypatch, storage)
+    await write_everything(client)
+    assert await read_everything(client) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+@pytest.mark.parametrize("section", list(SECTIONS))
+async def test_put_with_a_stale_if_match_is_rejected(client, monkeypatch, storage, section):
+    use_storage(monkeypatch, storage)
+    body = dict(WRITES["everything"])[section]
+    first = await put(client, "u1", section, body)
+    second = await put(client, "u1", section, body, **{"If-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+    stale = await put(client, "u1", section, body, **{"If-Match": first.headers["ETag"]})
+    assert stale.status_code == 412
+    assert stale.json()["detail"]["error"]["code"] == "PRECONDITION_FAILED"
+    # The rejected write changed nothing
+    current = await client.get(PREFIX + SECTIONS[section], headers={"X-User-ID": "u1"})
+    assert current.headers["ETag"] == second.headers["ETag"]
+
+    # Nothing saved yet matches no version
+    ahead = await put(client, "u2", section, body, **{"If-Match": first.headers["ETag"]})
+    assert ahead.status_code == 412
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+async def test_all_matches_the_section_endpoints(client, monkeypatch, storage):
+    use_storage(monkeypatch, storage)
+    await write_everything(client)
+    # Read twice so the second round is served from the cache
+    for _ in range(2):
+        responses = await read_everything(client)
+        for user_id in WRITES:
+            body = responses[user_id, "all"][1]
+            assert body == {name: responses[user_id, name][1] for name in SECTIONS}
+            # What FastAPI would have sent for the response model
+            assert body == AllPreferencesResponse.model_validate(body).model_dump(by_alias=True)
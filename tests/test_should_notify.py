@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schemas import NotificationPreferencesUpdate
+from src.services.broker import ChangeBroker, LocalBackend
+from src.services.cache import TTLCache
+from src.services.notification_types import notification_registry
+from src.services.settings_service import SettingsService
+
+KEYS = [type_.key for type_ in notification_registry.types]
+
+# Saves per user, in order; later saves only replace the keys they name
+CHOICES = {
+    "never-saved": [],
+    "all-false": [{key: False for key in KEYS}],
+    "all-true": [{key: True for key in KEYS}],
+    "push-off": [{"push": False}],
+    "email-on-then-push-off": [{"email": True}, {"push": False}],
+    "push-off-then-on": [{"push": False}, {"push": True}],
+}
+
+
+def service(session: AsyncSession, storage: str) -> SettingsService:
+    return SettingsService(
+        session,
+        cache=TTLCache(max_size=0, ttl_seconds=0),
+        storage=storage,
+        broker=ChangeBroker(LocalBackend(), queue_size=10),
+        outbox=None,
+    )
+
+
+def expected(user_id: str, key: str) -> bool:
+    """Brute force: the user's last explicit choice, else the type's default."""
+    chosen = {}
+    for choice in CHOICES[user_id]:
+        chosen.update(choice)
+    return chosen.get(key, notification_registry.defaults[key])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+async def test_unset_types_follow_defaults_and_explicit_choices_win(engine, storage):
+    async with AsyncSession(engine) as session:
+        for user_id, choices in CHOICES.items():
+            for choice in choices:
+                await service(session, storage).put_section(
+                    user_id, "notifications", NotificationPreferencesUpdate(preferences=choice)
+                )
+        await session.commit()
+
+    pairs = [(user_id, key) for user_id in [*CHOICES, "unknown"] for key in KEYS]
+    # Repeated users and keys, in no particular order, and chunks smaller
+    # than the number of users
+    pairs = pairs[::-1] + pairs
+    async with AsyncSession(engine) as session:
+        allowed = await service(session, storage).should_notify(
+            [user_id for user_id, _ in pairs], [key for _, key in pairs], chunk_size=4
+        )
+
+    assert allowed.tolist() == [
+        expected(user_id, key) if user_id in CHOICES else notification_registry.defaults[key]
+        for user_id, key in pairs
+    ]
+    decided = dict(zip(pairs, allowed.tolist()))
+    # An explicit false overrides a true default, an unset type keeps it
+    assert notification_registry.defaults["push"] is True
+    assert decided[("all-false", "push")] is False
+    assert decided[("never-saved", "push")] is True
+    assert decided[("email-on-then-push-off", "skillUpdates")] is True
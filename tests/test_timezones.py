@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.schemas import ThemeSettingsUpdate, UserSettingsUpdate
+from src.services import settings_service
+from src.services.broker import ChangeBroker, LocalBackend
+from src.services.cache import TTLCache
+from src.services.settings_service import DEFAULT_TIMEZONE, SettingsService
+from src.services.timezones import TimezoneIndex, window_hours
+
+# Whole, half and three-quarter hour offsets, both hemispheres' daylight
+# saving time, Lord Howe's half-hour shift and Dublin's negative one
+ZONES = [
+    "UTC",
+    "Europe/London",
+    "Europe/Berlin",
+    "Europe/Dublin",
+    "America/New_York",
+    "America/Los_Angeles",
+    "America/Santiago",
+    "Asia/Kolkata",
+    "Asia/Kathmandu",
+    "Asia/Tokyo",
+    "Australia/Lord_Howe",
+    "Pacific/Chatham",
+    "Pacific/Kiritimati",
+]
+
+
+def local_hour(zone: str, now: datetime) -> int:
+    return now.astimezone(ZoneInfo(zone)).hour
+
+
+def offsets(now: datetime) -> dict[int, set[str]]:
+    """Brute force: group every zone by its UTC offset at ``now``."""
+    buckets: dict[int, set[str]] = {}
+    for zone in ZONES:
+        offset = int(now.astimezone(ZoneInfo(zone)).utcoffset().total_seconds()) // 60
+        buckets.setdefault(offset, set()).add(zone)
+    return buckets
+
+
+@pytest.mark.parametrize(
+    "start, end, hours",
+    [
+        (9, 17, set(range(9, 17))),
+        (22, 6, {22, 23, 0, 1, 2, 3, 4, 5}),
+        (23, 24, {23}),
+        (0, 1, {0}),
+        (5, 5, set(range(24))),
+    ],
+)
+def test_windows_ending_before_their_start_wrap_past_midnight(start, end, hours):
+    assert window_hours(start, end) == hours
+
+
+@pytest.mark.parametrize(
+    "first, last",
+    [
+        # Europe, then Santiago, Chatham and Lord Howe (by half an hour)
+        (datetime(2024, 3, 30, tzinfo=timezone.utc), datetime(2024, 4, 8, tzinfo=timezone.utc)),
+        # Europe, then North America
+        (datetime(2024, 10, 25, tzinfo=timezone.utc), datetime(2024, 11, 5, tzinfo=timezone.utc)),
+    ],
+)
+def test_refreshed_index_matches_a_scan_of_every_zone(first, last):
+    index = TimezoneIndex(ZONES)
+    now = first
+    while now < last:
+        index.refresh(now)
+        assert index.buckets == offsets(now), now
+        for start, end in [(22, 6), (9, 10)]:
+            hours = window_hours(start, end)
+            assert index.zones_at_local_hours(hours, now) == sorted(
+                zone for zone in ZONES if local_hour(zone, now) in hours
+            )
+        now += timedelta(minutes=23)
+
+
+def test_zone_moves_bucket_at_the_transition_minute():
+    # New York springs forward at 07:00 UTC on 10 March 2024
+    transition = datetime(2024, 3, 10, 7, tzinfo=timezone.utc)
+    index = TimezoneIndex(["America/New_York"])
+
+    index.refresh(transition - timedelta(minutes=1))
+    assert index.buckets == {-300: {"America/New_York"}}
+    index.refresh(transition)
+    assert index.buckets == {-240: {"America/New_York"}}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("storage", ["tables", "dual", "document"])
+@pytest.mark.parametrize("start, end", [(22, 6), (23, 1), (6, 22), (0, 24)])
+async def test_users_at_local_hours_match_a_scan_of_every_user(
+    engine, monkeypatch, storage, start, end
+):
+    monkeypatch.setattr(settings_service, "timezone_index", TimezoneIndex(ZONES))
+    async with AsyncSession(engine) as session:
+        service = SettingsService(
+            session,
+            cache=TTLCache(max_size=0, ttl_seconds=0),
+            storage=storage,
+            broker=ChangeBroker(LocalBackend(), queue_size=10),
+            outbox=None,
+        )
+        for zone in ZONES:
+            await service.put_section(zone, "settings", UserSettingsUpdate(timezone=zone))
+        # Never saved general settings, so on the default timezone
+        await service.put_section("theme-only", "theme", ThemeSettingsUpdate(mode="dark"))
+        await session.commit()
+        timezones = {zone: zone for zone in ZONES} | {"theme-only": DEFAULT_TIMEZONE}
+
+        hours = window_hours(start, end)
+        # Just before and after midnight UTC, across New York's transition
+        for now in [
+            datetime(2024, 3, 9, 23, 59, tzinfo=timezone.utc),
+            datetime(2024, 3, 10, 0, 30, tzinfo=timezone.utc),
+            datetime(2024, 3, 10, 7, 0, tzinfo=timezone.utc),
+        ]:
+            found = [
+                user_id
+                async for user_ids in service.iter_users_at_local_hours(hours, now=now)
+                for user_id in user_ids
+            ]
+            assert sorted(found) == sorted(
+                user_id for user_id, zone in timezones.items() if local_hour(zone, now) in hours
+            ), now